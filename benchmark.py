@@ -0,0 +1,384 @@
+"""
+Benchmark suite for the pictool.
+
+This script times every plugin against the images in the folder 'images' and against
+synthetic images of 1, 10 and 50 megapixels.  For each image and plugin it measures
+the time to read the image, to process it and to save it, along with the peak memory
+(resident set size) at the end of each of those steps.  Cheap plugins like mono spend
+most of their time reading and saving, so it is important to see the steps separately.
+
+Each measurement runs in a fresh process, so that the peak memory of one measurement
+does not hide the peak memory of the next.  The results are printed as a table and
+saved as JSON, so that runs from different commits can be compared:
+
+    python3 benchmark.py --output=before.json
+    (change the code)
+    python3 benchmark.py --output=after.json --compare=before.json
+
+The options are:
+
+    --engine=NAME       The plug-in engine (python or numpy; default numpy)
+    --sizes=1,10,50     The sizes of the synthetic images in megapixels (0 for none)
+    --bundled=False     Leave out the images in the folder 'images'
+    --cases=a,b,...     Only run the named cases (see CASES)
+    --repeat=N          Run each measurement N times and keep the fastest
+    --output=FILE       The JSON file for the results (default benchmark.json)
+    --compare=FILE      A previous JSON file to compare the results against
+
+    --startup=False     Leave out the startup time
+
+The startup time is the time for 'python3 pictool.py --help' beyond the time to start
+Python itself, measured with python3 -X importtime to show the slowest imports.  It
+should stay below STARTUP_LIMIT, and --help must not import any of HEAVY_MODULES.
+
+The python engine processes pixels one at a time, so it is very slow on the largest
+synthetic images.  Use --sizes to leave them out.
+
+Author: Michael Dickey
+Date: Oct 18 2026
+"""
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+
+# The benchmark cases: the case name, the plugin name and the plugin options
+CASES = [
+    ('dered', 'dered', {}),
+    ('grey', 'mono', {}),
+    ('sepia', 'mono', {'sepia':True}),
+    ('flip-horizontal', 'flip', {}),
+    ('flip-vertical', 'flip', {'vertical':True}),
+    ('transpose', 'transpose', {}),
+    ('rotate-left', 'rotate', {}),
+    ('rotate-right', 'rotate', {'right':True}),
+    ('vignette', 'vignette', {}),
+    ('blur-1', 'blur', {'radius':1}),
+    ('blur-5', 'blur', {'radius':5}),
+    ('blur-30', 'blur', {'radius':30}),
+    ('pixellate', 'pixellate', {}),
+    ('sharpen', 'convolve', {'kernel':'sharpen'}),
+    ('edge', 'convolve', {'kernel':'edge'}),
+    ('gaussian-3', 'gaussian', {'radius':3}),
+    ('gaussian-30', 'gaussian', {'radius':30}),
+    ('pixellate-16x4', 'pixellate', {'step_x':16,'step_y':4}),
+]
+
+# The folder of bundled images
+IMAGES = 'images'
+
+# The folder containing this script (image names are relative to it)
+HOME = os.path.dirname(os.path.abspath(__file__))
+
+# The most time (in seconds) that pictool should take to start, beyond Python itself
+STARTUP_LIMIT = 0.050
+
+# The modules that pictool --help should not import
+HEAVY_MODULES = ['numpy','PIL','introcs','multiprocessing']
+
+
+def peak_memory():
+    """
+    Returns the peak resident set size of this process in bytes.
+    """
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, but macOS reports bytes
+    return peak if sys.platform == 'darwin' else peak*1024
+
+
+def synthetic_image(megapixels, folder):
+    """
+    Returns the name of a synthetic PNG image with the given number of megapixels.
+
+    The image is a smooth color gradient with some noise, so that it compresses like
+    a photograph rather than like a flat color.  It has a 4:3 aspect ratio, and is
+    saved in the given folder (it is only created if it is not already there).
+
+    Parameter megapixels: The image size in millions of pixels
+    Precondition: megapixels is an int > 0
+
+    Parameter folder: The folder to save the image in
+    Precondition: folder is a string naming a folder
+    """
+    import numpy
+    from PIL import Image as CoreImage
+    file = os.path.join(folder,'synthetic-'+str(megapixels)+'mp.png')
+    if os.path.exists(file):
+        return file
+
+    width  = int((megapixels*1000000*4/3)**0.5)
+    height = (megapixels*1000000)//width
+    rows = numpy.linspace(0,255,height)[:,numpy.newaxis]
+    cols = numpy.linspace(0,255,width)[numpy.newaxis,:]
+    noise = numpy.random.default_rng(megapixels).integers(0,32,(height,width,4))
+    array = numpy.empty((height,width,4),dtype=numpy.uint8)
+    array[:,:,0] = (rows+noise[:,:,0]) % 256
+    array[:,:,1] = (cols+noise[:,:,1]) % 256
+    array[:,:,2] = ((rows+cols)/2+noise[:,:,2]) % 256
+    array[:,:,3] = 255
+    CoreImage.fromarray(array,'RGBA').save(file,'PNG')
+    return file
+
+
+def measure(task):
+    """
+    Returns the measurements for one image and one case as a dictionary.
+
+    The task is a tuple (file, case, plugin, options, engine).  The image is read
+    with pictool.read_image, processed with the plugin and saved with
+    pictool.save_image to a temporary file.  The result has the times of each step
+    in seconds (read, process and save), and the peak memory in bytes at the end of
+    each step (rss_read, rss_process and rss_save).  If anything fails, the result
+    has the key 'error' instead.
+
+    This function is meant to run in a fresh process (see run_case).
+
+    Parameter task: The measurement to make
+    Precondition: task is a tuple (string, string, string, dictionary, string)
+    """
+    file, case, plugin, options, engine = task
+    sys.path.insert(0,HOME)
+    import pictool
+
+    result = {'image':os.path.relpath(file,HOME), 'case':case, 'engine':engine}
+    command = pictool.lookup_command(plugin,options,engine)
+    if type(command) == str:
+        result['error'] = command
+        return result
+
+    output = tempfile.NamedTemporaryFile(suffix='.png',delete=False)
+    output.close()
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(log):
+            start = time.perf_counter()
+            buffer = pictool.read_image(file)
+            result['read'] = time.perf_counter()-start
+            result['rss_read'] = peak_memory()
+            if buffer is None:
+                raise IOError('could not read '+repr(file))
+            result['pixels'] = len(buffer)*len(buffer[0])
+
+            start = time.perf_counter()
+            command(buffer,**options)
+            result['process'] = time.perf_counter()-start
+            result['rss_process'] = peak_memory()
+
+            start = time.perf_counter()
+            if not pictool.save_image(buffer,output.name):
+                raise IOError('could not save '+repr(output.name))
+            result['save'] = time.perf_counter()-start
+            result['rss_save'] = peak_memory()
+    except Exception as error:
+        result['error'] = repr(error)
+    finally:
+        os.remove(output.name)
+    return result
+
+
+def run_case(task, repeat=1):
+    """
+    Returns the measurements for one image and one case, each step at its fastest.
+
+    Each repetition runs in a new process (see measure), so the peak memory is the
+    peak for that measurement alone.  The times are the fastest over all repetitions.
+
+    Parameter task: The measurement to make
+    Precondition: task is a tuple as described in measure
+
+    Parameter repeat: The number of repetitions
+    Precondition: repeat is an int > 0
+    """
+    context = multiprocessing.get_context('spawn')
+    best = None
+    for count in range(repeat):
+        with context.Pool(1) as pool:
+            result = pool.apply(measure,(task,))
+        if best is None or 'error' in result:
+            best = result
+        elif not 'error' in best:
+            for key in ['read','process','save']:
+                best[key] = min(best[key],result[key])
+        if 'error' in result:
+            break
+    return best
+
+
+def measure_startup(repeat=5):
+    """
+    Returns the startup measurements for pictool as a dictionary.
+
+    The result has the fastest time in seconds for 'python3 pictool.py --help' over
+    repeat runs (help), the fastest time for python3 to start and do nothing (python),
+    and the difference between them (startup).  It also has the slowest imports of
+    pictool as a list of [module, seconds] pairs (imports), and the HEAVY_MODULES that
+    were imported (heavy), both from python3 -X importtime.
+
+    Parameter repeat: The number of runs to time
+    Precondition: repeat is an int > 0
+    """
+    import subprocess
+    script = os.path.join(HOME,'pictool.py')
+    result = {}
+    for (key, command) in [('python',['-c','pass']), ('help',[script,'--help'])]:
+        best = None
+        for count in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable]+command,stdout=subprocess.DEVNULL,check=True)
+            elapsed = time.perf_counter()-start
+            best = elapsed if best is None else min(best,elapsed)
+        result[key] = best
+    result['startup'] = max(0.0,result['help']-result['python'])
+
+    # Lines look like 'import time:  self [us] | cumulative | imported package'
+    text = subprocess.run([sys.executable,'-X','importtime',script,'--help'],
+                          stdout=subprocess.DEVNULL,stderr=subprocess.PIPE,text=True).stderr
+    imports = []
+    for line in text.splitlines()[1:]:
+        fields = line.split('|')
+        if line.startswith('import time:') and len(fields) == 3:
+            name = fields[2].strip()
+            imports.append([name,int(fields[1])/1e6])
+    names = set([name for (name, seconds) in imports])
+    result['heavy'] = [name for name in HEAVY_MODULES if name in names]
+    imports.sort(key=lambda item : -item[1])
+    result['imports'] = imports[:10]
+    return result
+
+
+def show_startup(result, previous=None):
+    """
+    Prints the startup measurements.
+
+    If previous is not None, this also shows the startup time relative to the startup
+    time in previous.
+
+    Parameter result: The startup measurements (see measure_startup)
+    Precondition: result is a dictionary
+
+    Parameter previous: The earlier startup measurements
+    Precondition: previous is a dictionary or None
+    """
+    line = 'Startup: %.1f ms (pictool --help %.1f ms, python %.1f ms)' % (
+            result['startup']*1000,result['help']*1000,result['python']*1000)
+    if previous is not None and previous['startup'] > 0:
+        line += '  %5.2fx' % (result['startup']/previous['startup'])
+    print(line)
+    for (name, seconds) in result['imports'][:5]:
+        print('    %-30s %8.1f ms' % (name.strip(),seconds*1000))
+    if result['startup'] > STARTUP_LIMIT:
+        print('WARNING: startup is slower than %d ms' % (STARTUP_LIMIT*1000))
+    if result['heavy']:
+        print('WARNING: --help imports '+', '.join(result['heavy']))
+    print()
+
+
+def current_commit():
+    """
+    Returns the git commit of this code, or None if it is not known.
+    """
+    import subprocess
+    try:
+        text = subprocess.run(['git','rev-parse','HEAD'],cwd=HOME,capture_output=True,text=True)
+        return text.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def show(result, previous=None):
+    """
+    Prints one line of the results table.
+
+    If previous is not None, the line also shows the total time relative to the total
+    time in previous (e.g. 0.50x is twice as fast).
+
+    Parameter result: The measurements (see measure)
+    Precondition: result is a dictionary
+
+    Parameter previous: The earlier measurements for the same image and case
+    Precondition: previous is a dictionary or None
+    """
+    name = result['image']+' '+result['case']
+    if 'error' in result:
+        print('%-45s %s' % (name,result['error']))
+        return
+
+    line = '%-45s %8.3f %8.3f %8.3f %8.1f' % (name,result['read'],result['process'],
+                                            result['save'],result['rss_save']/1e6)
+    if previous is not None and not 'error' in previous:
+        before = previous['read']+previous['process']+previous['save']
+        after  = result['read']+result['process']+result['save']
+        line += '  %5.2fx' % (after/before)
+    print(line)
+
+
+def main():
+    """
+    Runs the benchmark suite with the options on the command line.
+    """
+    sys.path.insert(0,HOME)
+    import pictool
+    args = sys.argv[:]
+    options = pictool.extract_options(args)
+    engine  = options.get('engine','numpy')
+    sizes   = str(options.get('sizes','1,10,50')).split(',')
+    sizes   = [int(size) for size in sizes if int(size) > 0]
+    repeat  = options.get('repeat',1)
+    output  = options.get('output','benchmark.json')
+    names   = options.get('cases')
+    cases   = CASES if names is None else [case for case in CASES if case[0] in names.split(',')]
+
+    files = []
+    if options.get('bundled',True):
+        folder = os.path.join(HOME,IMAGES)
+        files += [os.path.join(folder,name) for name in sorted(os.listdir(folder))
+                  if name.endswith('.png')]
+    scratch = tempfile.mkdtemp(prefix='pictool-benchmark-')
+    for size in sizes:
+        print('Creating a '+str(size)+' megapixel image',flush=True)
+        files.append(synthetic_image(size,scratch))
+
+    previous = {}
+    before = {}
+    if 'compare' in options:
+        with open(options['compare']) as stream:
+            before = json.load(stream)
+        for result in before['results']:
+            previous[(result['image'],result['case'])] = result
+
+    startup = None
+    if options.get('startup',True):
+        startup = measure_startup(max(5,repeat))
+        show_startup(startup,before.get('startup'))
+
+    print('%-45s %8s %8s %8s %8s' % ('image case','read','process','save','peak MB'))
+    results = []
+    for file in files:
+        for (case, plugin, plugin_options) in cases:
+            result = run_case((file,case,plugin,plugin_options,engine),repeat)
+            if result['image'].startswith('..') or os.path.isabs(result['image']):
+                result['image'] = os.path.basename(file)
+            show(result,previous.get((result['image'],case)))
+            results.append(result)
+
+    report = {'commit':current_commit(), 'date':time.strftime('%Y-%m-%d %H:%M:%S'),
+              'python':sys.version.split()[0], 'engine':engine, 'startup':startup,
+              'results':results}
+    with open(output,'w') as stream:
+        json.dump(report,stream,indent=1)
+    print('Saved results to '+repr(output))
+
+    for size in sizes:
+        os.remove(os.path.join(scratch,'synthetic-'+str(size)+'mp.png'))
+    os.rmdir(scratch)
+
+
+# Script code
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,428 @@
+"""
+Convolution engine for the pictool.
+
+Many image effects replace each pixel with a weighted sum of the pixels around it.
+The weights form a small grid called a kernel, centered on the pixel.  A blur has
+positive weights that add up to 1, sharpening weighs the pixel itself more than its
+neighbors, and edge detection has weights that add up to 0, so that flat areas become
+black.  This module applies any kernel to an image, so each effect is just a kernel
+(see KERNELS and gaussian_weights) instead of another loop over the pixels.
+
+Entry (i,j) of a kernel with 2r+1 rows and 2s+1 columns weighs the pixel i-r rows below
+and j-s columns to the right of the pixel being computed.  (Strictly, this is what is
+called correlation; convolution would flip the kernel first.)
+
+There are two ways to compute the sums.  The direct way adds up a shifted copy of the
+image for every weight, so its cost grows with the size of the kernel.  But if every
+row of the kernel is a multiple of the same row (as for a box or Gaussian blur), the
+kernel is separable: it is the product of a column and a row of weights, and the image
+can be filtered by the column and then by the row, which takes rows+columns shifted
+copies instead of rows*columns.  The other way uses the fast Fourier transform (see
+numpy.fft), which turns the sums into one multiplication per pixel.  Its cost does not
+depend on the size of the kernel, but it is slower for small kernels.  A kernel with
+more than FFT_TAPS shifted copies is computed with the FFT.  Run this module as a
+script to see where the two ways cross over.
+
+The weights of a kernel are divided by their total, so that the kernel does not make
+the image brighter or darker (the box kernel averages its 9 pixels).  Near the edges,
+part of the kernel is outside of the image.  As in plugins.blur, only the pixels
+inside the image are used, and the sum is divided by the total of the weights that
+were used instead.  So a blur averages the pixels that are there.  The weights of a
+kernel like edge detection add up to 0, so they cannot be divided by their total.
+For these kernels, the weights that are outside of the image are moved to the center
+pixel instead.  Either way, an area of one color stays that color up to the edges
+(or becomes black, for a kernel whose weights add up to 0).
+
+Author: Michael Dickey
+Date: Oct 18 2026
+"""
+import numpy
+import pixelbuffer
+
+
+# The kernels that can be given by name
+KERNELS = {
+    'box':     [[1,1,1],[1,1,1],[1,1,1]],
+    'sharpen': [[0,-1,0],[-1,5,-1],[0,-1,0]],
+    'edge':    [[-1,-1,-1],[-1,8,-1],[-1,-1,-1]],
+    'emboss':  [[-2,-1,0],[-1,1,1],[0,1,2]],
+}
+
+# The number of shifted copies of the image above which the FFT is faster (measured
+# with benchmark on a 2000 x 2000 image; see the module docstring)
+FFT_TAPS = 16
+
+# The largest singular value ratio for a kernel to count as separable
+SEPARABLE_TOLERANCE = 1e-9
+
+# The results are snapped to multiples of 1/ROUND_GRID before they are rounded, so that
+# the tiny float errors of each way of computing them (see correlator) are removed
+ROUND_GRID = 1 << 20
+
+
+def parse(text):
+    """
+    Returns the kernel described by text, as a 2d numpy array of floats.
+
+    The text is either the name of a kernel in KERNELS, or the rows of the kernel
+    separated by '/' (or ';'), with the weights in each row separated by commas.  For
+    example, the sharpen kernel is '0,-1,0/-1,5,-1/0,-1,0'.  The kernel must have an
+    odd number of rows and columns, so that it has a center.
+
+    This function raises a ValueError if text is not a valid kernel.
+
+    Parameter text: The kernel description
+    Precondition: text is a string
+    """
+    if text in KERNELS:
+        return numpy.array(KERNELS[text],dtype=numpy.float64)
+
+    rows = [row.split(',') for row in text.replace(';','/').split('/')]
+    if len(set([len(row) for row in rows])) != 1:
+        raise ValueError('the rows of kernel '+repr(text)+' have different lengths')
+    try:
+        kernel = numpy.array([[float(value) for value in row] for row in rows])
+    except ValueError:
+        raise ValueError(repr(text)+' is not a kernel name or a list of rows of numbers')
+    if kernel.shape[0] % 2 == 0 or kernel.shape[1] % 2 == 0:
+        raise ValueError('kernel '+repr(text)+' must have an odd number of rows and columns')
+    if not numpy.isfinite(kernel).all():
+        raise ValueError('kernel '+repr(text)+' has a weight that is not a number')
+    return kernel
+
+
+def gaussian_weights(radius, sigma=None):
+    """
+    Returns the 2*radius+1 weights of a 1-d Gaussian blur, as a numpy array.
+
+    The weights add up to 1.  The kernel of the 2-d blur is the product of a column
+    and a row of these weights, so it is separable.
+
+    Parameter radius: The number of weights on each side of the center
+    Precondition: radius is an int > 0
+
+    Parameter sigma: The standard deviation (None for radius/3)
+    Precondition: sigma is a number > 0 or None
+    """
+    sigma = radius/3 if sigma is None else sigma
+    offsets = numpy.arange(-radius,radius+1,dtype=numpy.float64)
+    weights = numpy.exp(-offsets*offsets/(2*sigma*sigma))
+    return weights/weights.sum()
+
+
+def separate(kernel):
+    """
+    Returns a tuple (column, row) of 1-d weights whose product is kernel, or None.
+
+    The kernel is separable if it has rank 1, which is found from its singular values
+    (see numpy.linalg.svd).
+
+    Parameter kernel: The kernel
+    Precondition: kernel is a 2d numpy array of floats
+    """
+    if kernel.shape[0] == 1:
+        return (numpy.ones(1),kernel[0].copy())
+    elif kernel.shape[1] == 1:
+        return (kernel[:,0].copy(),numpy.ones(1))
+    u, s, vt = numpy.linalg.svd(kernel)
+    if s[0] == 0 or s[1] > s[0]*SEPARABLE_TOLERANCE:
+        return None
+    scale = numpy.sqrt(s[0])
+    return (u[:,0]*scale,vt[0]*scale)
+
+
+def _correlate_axis(data, weights, axis):
+    """
+    Returns data filtered by the 1-d weights along the given axis, the direct way.
+
+    Pixels outside of data count as 0.
+
+    Parameter data: The values to filter
+    Precondition: data is a 2d numpy array of floats
+
+    Parameter weights: The weights, centered on each value
+    Precondition: weights is a 1d numpy array with an odd length
+
+    Parameter axis: The axis to filter along
+    Precondition: axis is 0 or 1
+    """
+    if axis == 1:
+        return _correlate_axis(data.T,weights,0).T
+    radius = len(weights)//2
+    size   = data.shape[0]
+    result = numpy.zeros_like(data)
+    for pos in range(len(weights)):
+        shift = pos-radius
+        if weights[pos] == 0 or abs(shift) >= size:
+            continue
+        # Each value gets the weighted value shift rows below it
+        target = slice(max(-shift,0),size-max(shift,0))
+        source = slice(max(shift,0),size+min(shift,0))
+        result[target] += weights[pos]*data[source]
+    return result
+
+
+def _correlate_direct(data, kernel):
+    """
+    Returns data filtered by the 2-d kernel, the direct way.
+
+    Pixels outside of data count as 0.
+
+    Parameter data: The values to filter
+    Precondition: data is a 2d numpy array of floats
+
+    Parameter kernel: The kernel
+    Precondition: kernel is a 2d numpy array with an odd number of rows and columns
+    """
+    height, width = data.shape
+    rows, cols = kernel.shape[0]//2, kernel.shape[1]//2
+    result = numpy.zeros_like(data)
+    for i in range(kernel.shape[0]):
+        for j in range(kernel.shape[1]):
+            down, right = i-rows, j-cols
+            if kernel[i,j] == 0 or abs(down) >= height or abs(right) >= width:
+                continue
+            target = (slice(max(-down,0),height-max(down,0)),slice(max(-right,0),width-max(right,0)))
+            source = (slice(max(down,0),height+min(down,0)),slice(max(right,0),width+min(right,0)))
+            result[target] += kernel[i,j]*data[source]
+    return result
+
+
+def _fast_size(size):
+    """
+    Returns the smallest int >= size with no prime factors but 2, 3 and 5.
+
+    The FFT is much faster for these sizes.
+
+    Parameter size: The least size
+    Precondition: size is an int > 0
+    """
+    best = None
+    power2 = 1
+    while power2 < 2*size:
+        power3 = power2
+        while power3 < 2*size:
+            power5 = power3
+            while power5 < size:
+                power5 *= 5
+            if best is None or power5 < best:
+                best = power5
+            power3 *= 3
+        power2 *= 2
+    return best
+
+
+class _FFTFilter(object):
+    """
+    An instance filters 2-d arrays of one size with one kernel, using the FFT.
+
+    The transform of the kernel is computed once, and reused for every channel.
+    """
+
+    def __init__(self, shape, kernel):
+        """
+        Initializes a filter for arrays of the given shape.
+
+        Parameter shape: The shape of the arrays to filter
+        Precondition: shape is a tuple (height, width) of ints > 0
+
+        Parameter kernel: The kernel
+        Precondition: kernel is a 2d numpy array with an odd number of rows and columns
+        """
+        self._shape = shape
+        self._rows = kernel.shape[0]//2
+        self._cols = kernel.shape[1]//2
+        self._size = (_fast_size(shape[0]+kernel.shape[0]-1),
+                      _fast_size(shape[1]+kernel.shape[1]-1))
+        # Correlation is convolution with the flipped kernel
+        self._kernel = numpy.fft.rfft2(kernel[::-1,::-1],self._size)
+
+    def __call__(self, data):
+        """
+        Returns data filtered by the kernel (with 0 outside of data).
+
+        Parameter data: The values to filter
+        Precondition: data is a 2d numpy array of floats with the shape of this filter
+        """
+        spectrum = numpy.fft.rfft2(data,self._size)
+        result = numpy.fft.irfft2(spectrum*self._kernel,self._size)
+        return result[self._rows:self._rows+self._shape[0],self._cols:self._cols+self._shape[1]]
+
+
+def correlator(shape, kernel, method=None):
+    """
+    Returns a function that filters a 2d array of the given shape by kernel.
+
+    Pixels outside of the array count as 0.  The method is 'direct', 'separable' or
+    'fft'.  If it is None, the method is 'separable' if the kernel is separable and
+    'direct' otherwise, unless that needs more than FFT_TAPS shifted copies, in which
+    case it is 'fft'.
+
+    Parameter shape: The shape of the arrays to filter
+    Precondition: shape is a tuple (height, width) of ints > 0
+
+    Parameter kernel: The kernel, or a tuple (column, row) of 1-d weights
+    Precondition: kernel is a 2d numpy array with an odd number of rows and columns,
+    or a tuple of two 1d numpy arrays with odd lengths
+
+    Parameter method: The way to compute the sums (None to choose)
+    Precondition: method is one of 'direct', 'separable', 'fft' or None
+    """
+    if type(kernel) == tuple:
+        factors = kernel
+        kernel = numpy.outer(factors[0],factors[1])
+    else:
+        factors = separate(kernel)
+
+    if method is None:
+        if factors is not None:
+            taps = len(factors[0])+len(factors[1])
+            method = 'separable'
+        else:
+            taps = kernel.size
+            method = 'direct'
+        if taps > FFT_TAPS:
+            method = 'fft'
+    assert method in ['direct','separable','fft'], repr(method)+' is not a method'
+    assert method != 'separable' or factors is not None, 'the kernel is not separable'
+
+    if method == 'fft':
+        return _FFTFilter(shape,kernel)
+    elif method == 'separable':
+        column, row = factors
+        return lambda data : _correlate_axis(_correlate_axis(data,column,0),row,1)
+    return lambda data : _correlate_direct(data,kernel)
+
+
+def filter_array(array, kernel, channels=4, method=None):
+    """
+    Filters the first channels of the array by kernel, in place.
+
+    The edges are handled as described in the module docstring, and the results are
+    rounded to the nearest int from 0 to 255.  The direct, separable and FFT ways each
+    have their own float errors, which could round a result that is exactly halfway
+    between two ints (common for kernels of ints) up one way and down another.  So the
+    results are snapped to multiples of 1/ROUND_GRID first, which removes the errors,
+    and the result does not depend on the method.
+
+    Parameter array: The pixels
+    Precondition: array is a numpy array of uint8 with shape height x width x 4
+
+    Parameter kernel: The kernel (see correlator)
+    Precondition: kernel is a 2d numpy array or a tuple (column, row) of 1d arrays
+
+    Parameter channels: The number of channels to filter (3 leaves alpha alone)
+    Precondition: channels is 3 or 4
+
+    Parameter method: The way to compute the sums (see correlator)
+    Precondition: method is one of 'direct', 'separable', 'fft' or None
+    """
+    shape  = array.shape[:2]
+    filter = correlator(shape,kernel,method)
+    factors = kernel if type(kernel) == tuple else separate(kernel)
+    total = kernel[0].sum()*kernel[1].sum() if type(kernel) == tuple else kernel.sum()
+
+    # The total of the weights inside the image, for every pixel
+    if factors is None:
+        used = filter(numpy.ones(shape))
+    else:
+        # The totals of a separable kernel are the products of totals of its factors
+        column = _correlate_axis(numpy.ones((shape[0],1)),factors[0],0)
+        row    = _correlate_axis(numpy.ones((1,shape[1])),factors[1],1)
+        used   = column*row
+
+    scale = None
+    if abs(total) > 1e-12:
+        scale = numpy.ones(shape)
+        inside = numpy.abs(used) > 1e-12
+        scale[inside] = 1/used[inside]
+
+    for channel in range(channels):
+        data   = array[:,:,channel].astype(numpy.float64)
+        result = filter(data)
+        if scale is not None:
+            result *= scale
+        else:
+            # The weights outside of the image are moved to the center pixel
+            result -= used*data
+        # Snap to the grid, so a value that is exactly halfway rounds the same every way
+        result *= ROUND_GRID
+        numpy.rint(result,out=result)
+        result /= ROUND_GRID
+        array[:,:,channel] = numpy.clip(numpy.rint(result),0,255)
+
+
+def apply(image, kernel, channels=4, method=None):
+    """
+    Returns True after filtering the image by kernel.
+
+    This works on both kinds of image buffer.  A table of RGB objects is copied into
+    an array, filtered and copied back.
+
+    Parameter image: The image buffer
+    Precondition: image is a PixelBuffer or a 2d table of RGB objects
+
+    Parameter kernel: The kernel (see correlator)
+    Precondition: kernel is a 2d numpy array or a tuple (column, row) of 1d arrays
+
+    Parameter channels: The number of channels to filter (3 leaves alpha alone)
+    Precondition: channels is 3 or 4
+
+    Parameter method: The way to compute the sums (see correlator)
+    Precondition: method is one of 'direct', 'separable', 'fft' or None
+    """
+    if isinstance(image,pixelbuffer.PixelBuffer):
+        filter_array(image.array,kernel,channels,method)
+        return True
+
+    array = numpy.array([[pixel.rgba() for pixel in row] for row in image],dtype=numpy.uint8)
+    filter_array(array,kernel,channels,method)
+    names = ('red','green','blue','alpha')[:channels]
+    for (row, values) in zip(image,array.tolist()):
+        for (pixel, rgba) in zip(row,values):
+            for channel in range(channels):
+                setattr(pixel,names[channel],rgba[channel])
+    return True
+
+
+def benchmark(size=2000):
+    """
+    Prints the time to filter an image with kernels of increasing size, in each way.
+
+    The image is a random size x size image, and only one channel is filtered.  The
+    first table uses Gaussian kernels, comparing the separable and FFT ways; the second
+    uses random (not separable) kernels, comparing the direct and FFT ways.  The column
+    taps is the number of shifted copies the separable or direct way needs, to compare
+    with FFT_TAPS.
+
+    Parameter size: The image width and height
+    Precondition: size is an int > 0
+    """
+    import time
+    source = numpy.random.default_rng(0).integers(0,256,(size,size,4),dtype=numpy.uint8)
+
+    def timed(kernel, method):
+        array = source.copy()
+        start = time.perf_counter()
+        filter_array(array,kernel,1,method)
+        return time.perf_counter()-start
+
+    print('gaussian radius   taps   separable        fft')
+    for radius in [1,2,3,5,8,12,16,24,32,48]:
+        weights = gaussian_weights(radius)
+        kernel  = (weights,weights)
+        print('%15d %6d %10.3fs %9.3fs' % (radius,4*radius+2,timed(kernel,'separable'),
+                                            timed(kernel,'fft')))
+
+    print()
+    print('random kernel     taps      direct        fft')
+    generator = numpy.random.default_rng(1)
+    for width in [3,5,7,9,11,15]:
+        kernel = generator.random((width,width))
+        print('%11dx%-3d %6d %10.3fs %9.3fs' % (width,width,width*width,timed(kernel,'direct'),
+                                               timed(kernel,'fft')))
+
+
+# Script code
+if __name__ == '__main__':
+    benchmark()
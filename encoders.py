@@ -0,0 +1,355 @@
+"""
+Output encoders for the pictool.
+
+Most of the time it takes to save a PNG file is spent compressing it with zlib.  That
+is worth it for a finished image, but not for the files in the middle of a workflow,
+which are read again right away.  This module writes images in several formats, so
+that the user can choose between small files and fast ones:
+
+    png     Compressed, with the zlib level and PNG filter set by --compress-level
+            and --png-filter (level 1 is several times faster than the default 6)
+    ppm     Uncompressed binary RGB (the netpbm format P6); the alpha is dropped
+    pam     Uncompressed binary RGBA (the netpbm format P7)
+    raw     Uncompressed RGBA, after a 12 byte header: RAW_MAGIC and then the width
+            and height as little-endian 32-bit ints
+    npy     Uncompressed RGBA as a numpy array (see numpy.save), height x width x 4
+
+The uncompressed formats are just a header followed by the pixels, so they are
+written as fast as the disk allows.  The format of a file is chosen from its suffix
+(see SUFFIXES), unless it is given with --format.  Files with any other suffix are
+PNG files, as they have always been.
+
+Every format can be written one band of rows at a time (see create), so they can all
+be used when pictool streams an image.
+
+The uncompressed formats can also be read back without decoding them at all (see
+load).  The pixels of the file are memory-mapped (see the module mmap), so they are
+only read from disk when they are used, and are never copied.  The format of a file
+to read is found from its first bytes (see detect), not its suffix.
+
+Author: Michael Dickey
+Date: Oct 18 2026
+"""
+import os
+import struct
+
+
+# The output formats, by the suffix of the output file
+SUFFIXES = {'.png':'png', '.ppm':'ppm', '.pam':'pam', '.rgba':'raw', '.npy':'npy'}
+
+# The supported output formats
+FORMATS = ['png','ppm','pam','raw','npy']
+
+# The PNG filters that can be chosen (see pngstream.FILTERS)
+PNG_FILTERS = ['none','sub','up','average','paeth','adaptive']
+
+# The first bytes of a raw file
+RAW_MAGIC = b'RGBA'
+
+# The layout of the header of a raw file: RAW_MAGIC, width and height
+RAW_HEADER = '<4sII'
+
+# The most bytes of a header that detect will read
+HEADER_LIMIT = 4096
+
+
+def format_of(file, format=None):
+    """
+    Returns the format to write the given file in.
+
+    If format is None, the format is chosen from the suffix of file (see SUFFIXES),
+    and is 'png' for any suffix not in SUFFIXES.
+
+    Parameter file: The file name
+    Precondition: file is a string
+
+    Parameter format: The format asked for (or None)
+    Precondition: format is one of FORMATS or None
+    """
+    if format is not None:
+        return format
+    return SUFFIXES.get(os.path.splitext(file)[1].lower(),'png')
+
+
+def suffix_of(format):
+    """
+    Returns the usual suffix of a file in the given format.
+
+    Parameter format: The format
+    Precondition: format is one of FORMATS
+    """
+    for key in SUFFIXES:
+        if SUFFIXES[key] == format:
+            return key
+    return '.png'
+
+
+def header(format, width, height):
+    """
+    Returns the header of an uncompressed file of the given size, as bytes.
+
+    Parameter format: The format
+    Precondition: format is one of FORMATS other than 'png'
+
+    Parameter width: The image width
+    Precondition: width is an int > 0
+
+    Parameter height: The image height
+    Precondition: height is an int > 0
+    """
+    if format == 'ppm':
+        return b'P6\n%d %d\n255\n' % (width,height)
+    elif format == 'pam':
+        return (b'P7\nWIDTH %d\nHEIGHT %d\nDEPTH 4\nMAXVAL 255\nTUPLTYPE RGB_ALPHA\nENDHDR\n'
+                % (width,height))
+    elif format == 'raw':
+        return struct.pack(RAW_HEADER,RAW_MAGIC,width,height)
+    elif format == 'npy':
+        import io
+        import numpy
+        data = io.BytesIO()
+        numpy.lib.format.write_array_header_1_0(data,{'descr':'|u1', 'fortran_order':False,
+                                                      'shape':(height,width,4)})
+        return data.getvalue()
+    raise ValueError('unknown format '+repr(format))
+
+
+class RawWriter(object):
+    """
+    An instance writes an uncompressed image file a band of rows at a time.
+
+    This has the same attributes and methods as pngstream.PNGWriter.  The header is
+    written when the file is created, and each band of rows is written as it is given,
+    without being copied unless it has to be (to drop the alpha of a PPM file, or if
+    the rows are not contiguous in memory).
+
+    Attribute width: The image width
+    Invariant: width is an int > 0
+
+    Attribute height: The image height
+    Invariant: height is an int > 0
+
+    Attribute row: The number of rows written so far
+    Invariant: row is an int between 0 and height, inclusive
+    """
+
+    def __init__(self, file, width, height, format):
+        """
+        Creates the given file and writes its header.
+
+        Parameter file: The image file to write
+        Precondition: file is a string
+
+        Parameter width: The image width
+        Precondition: width is an int > 0
+
+        Parameter height: The image height
+        Precondition: height is an int > 0
+
+        Parameter format: The format
+        Precondition: format is one of FORMATS other than 'png'
+        """
+        self.width  = width
+        self.height = height
+        self.row = 0
+        self._channels = 3 if format == 'ppm' else 4
+        self._file = file
+        self._stream = open(file,'wb')
+        self._stream.write(header(format,width,height))
+
+    def write(self, rows):
+        """
+        Writes the given rows.
+
+        Parameter rows: The next rows of the image
+        Precondition: rows is a numpy array of uint8 with shape rows x width x 4
+        """
+        import numpy
+        assert self.row+rows.shape[0] <= self.height, 'too many rows written to file'
+        data = numpy.ascontiguousarray(rows[:,:,:self._channels])
+        self._stream.write(memoryview(data).cast('B'))
+        self.row += rows.shape[0]
+
+    def close(self):
+        """
+        Closes the file.
+        """
+        assert self.row == self.height, 'file closed before all rows were written'
+        self._stream.close()
+
+    def discard(self):
+        """
+        Closes and removes the file, without finishing it.
+        """
+        self._stream.close()
+        try:
+            os.remove(self._file)
+        except OSError:
+            pass
+
+
+def create(file, width, height, encoding=None):
+    """
+    Returns a writer for the given file, which writes a band of rows at a time.
+
+    The value encoding is a dictionary with the keys 'format' (one of FORMATS, or
+    None to use the suffix of file), 'level' (the zlib compression level for PNG
+    files, or None for 6) and 'filter' (one of PNG_FILTERS, or None for 'up').  A
+    missing key is the same as None.  The writer is a pngstream.PNGWriter for PNG
+    files, and a RawWriter otherwise.
+
+    Parameter file: The image file to write
+    Precondition: file is a string
+
+    Parameter width: The image width
+    Precondition: width is an int > 0
+
+    Parameter height: The image height
+    Precondition: height is an int > 0
+
+    Parameter encoding: The encoder settings
+    Precondition: encoding is a dictionary as described above (or None)
+    """
+    encoding = {} if encoding is None else encoding
+    format = format_of(file,encoding.get('format'))
+    if format != 'png':
+        return RawWriter(file,width,height,format)
+
+    import pngstream
+    level  = encoding.get('level')
+    filter = encoding.get('filter')
+    return pngstream.PNGWriter(file,width,height,6 if level is None else level,
+                               'up' if filter is None else filter)
+
+
+def _netpbm_header(data):
+    """
+    Returns a tuple (channels, width, height, offset) for the PPM or PAM header data.
+
+    The value offset is the position of the first pixel.  This function returns None
+    if data does not start with a header for an 8-bit PPM (P6) or PAM (P7) file with
+    3 or 4 channels.
+
+    Parameter data: The start of the file
+    Precondition: data is a bytes object
+    """
+    if data.startswith(b'P6'):
+        # Three numbers (width, height and maximum) separated by whitespace or comments
+        values = []
+        pos = 2
+        while len(values) < 3:
+            while pos < len(data) and (data[pos:pos+1].isspace() or data[pos:pos+1] == b'#'):
+                if data[pos:pos+1] == b'#':
+                    pos = data.find(b'\n',pos)
+                    if pos < 0:
+                        return None
+                pos += 1
+            start = pos
+            while pos < len(data) and data[pos:pos+1].isdigit():
+                pos += 1
+            if start == pos:
+                return None
+            values.append(int(data[start:pos]))
+        # Exactly one whitespace byte follows the maximum
+        if pos >= len(data) or not data[pos:pos+1].isspace() or values[2] != 255:
+            return None
+        return (3,values[0],values[1],pos+1)
+
+    if data.startswith(b'P7\n'):
+        end = data.find(b'ENDHDR\n')
+        if end < 0:
+            return None
+        fields = {}
+        for line in data[3:end].split(b'\n'):
+            words = line.split()
+            if len(words) == 2 and not line.startswith(b'#'):
+                fields[words[0]] = words[1]
+        try:
+            width  = int(fields[b'WIDTH'])
+            height = int(fields[b'HEIGHT'])
+            depth  = int(fields[b'DEPTH'])
+            maxval = int(fields[b'MAXVAL'])
+        except (KeyError, ValueError):
+            return None
+        if not depth in [3,4] or maxval != 255:
+            return None
+        return (depth,width,height,end+7)
+    return None
+
+
+def detect(file):
+    """
+    Returns a tuple (channels, width, height, offset) if file is uncompressed; None otherwise.
+
+    A file is uncompressed if it is a raw, PAM or npy file with 4 channels, or a PPM
+    (or PAM) file with 3 channels, all with 8 bits per channel.  The pixels are the
+    height x width x channels bytes starting at position offset in the file.  This
+    function only reads the header of the file.  It returns None (rather than raising
+    an error) if the file cannot be read or is too short for its header.
+
+    Parameter file: The image file to check
+    Precondition: file is a string
+    """
+    try:
+        with open(file,'rb') as stream:
+            data = stream.read(HEADER_LIMIT)
+            size = os.fstat(stream.fileno()).st_size
+    except OSError:
+        return None
+
+    result = None
+    if data.startswith(RAW_MAGIC) and len(data) >= struct.calcsize(RAW_HEADER):
+        magic, width, height = struct.unpack_from(RAW_HEADER,data)
+        result = (4,width,height,struct.calcsize(RAW_HEADER))
+    elif data.startswith(b'\x93NUMPY'):
+        import io
+        import numpy
+        stream = io.BytesIO(data)
+        try:
+            version = numpy.lib.format.read_magic(stream)
+            if version == (1,0):
+                shape, fortran, dtype = numpy.lib.format.read_array_header_1_0(stream)
+            else:
+                shape, fortran, dtype = numpy.lib.format.read_array_header_2_0(stream)
+        except (ValueError, SyntaxError, EOFError):
+            return None
+        if dtype == numpy.uint8 and not fortran and len(shape) == 3 and shape[2] == 4:
+            result = (4,shape[1],shape[0],stream.tell())
+    else:
+        result = _netpbm_header(data)
+
+    if result is None:
+        return None
+    channels, width, height, offset = result
+    if width <= 0 or height <= 0 or size < offset+width*height*channels:
+        return None
+    return result
+
+
+def load(file):
+    """
+    Returns the pixels of an uncompressed file, or None if file is not uncompressed.
+
+    The result is a numpy array of uint8 with shape height x width x 4.  For a file
+    with 4 channels, it is a copy-on-write memory map of the file (see numpy.memmap):
+    nothing is read until the pixels are used, and changing them does not change the
+    file.  A file with 3 channels has no alpha, so its pixels are copied into a new
+    array with an alpha of 255.
+
+    Parameter file: The image file to read
+    Precondition: file is a string
+    """
+    info = detect(file)
+    if info is None:
+        return None
+
+    import numpy
+    channels, width, height, offset = info
+    data = numpy.memmap(file,dtype=numpy.uint8,mode='c',offset=offset,
+                        shape=(height,width,channels))
+    if channels == 4:
+        return data
+    result = numpy.empty((height,width,4),dtype=numpy.uint8)
+    result[:,:,:3] = data
+    result[:,:,3] = 255
+    return result
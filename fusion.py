@@ -0,0 +1,347 @@
+"""
+Fusion of point-wise pipeline stages for the pictool.
+
+A pipeline like "mono | vignette | dered" runs each stage over the whole image before
+starting the next one.  Each stage reads and writes every pixel, so for a large image
+(too big for the processor cache) a chain of N stages costs N trips through memory.
+
+Some commands only look at one pixel at a time.  Their results for a block of rows do
+not depend on any other rows, so a chain of them can be run block by block instead:
+run every stage on the first few rows, then every stage on the next few rows, and so
+on.  Each block is small enough to stay in the cache while all the stages run, so the
+chain costs one trip through memory, however long it is.  This module compiles runs
+of those commands in a pipeline into a single fused stage that does exactly that.
+
+The point-wise commands are the functions in vectorized.py named in POINTWISE.  The
+stages are also composed where they can be.  Tone curves (like dered) are composed
+into one table per channel, and folded into the mono stages next to them, so a chain
+of mono and dered stages does the work of a single stage (unless a mono follows a
+sepia mono).  Stages that depend on the position of the pixel (like vignette) are not
+tone curves, so they still run one after the other on each block, and the time of a
+chain grows with the number of them.
+The fused stage gives exactly the same results as running the stages one at a time.
+
+Run this module as a script to compare fused and unfused chains of increasing length.
+
+Author: Michael Dickey
+Date: Oct 18 2026
+"""
+import lut
+import numpy
+import pixelbuffer
+import vectorized
+
+
+# The number of pixels in each block of rows
+BLOCK_PIXELS = 1 << 14
+
+# The point-wise stages that are a tone curve for each color channel (see lut.apply)
+CURVES = {'dered':(lut.constant(0),None,None)}
+
+
+def fusable(stage):
+    """
+    Returns True if the pipeline stage can be part of a fused stage; False otherwise.
+
+    Parameter stage: The pipeline stage
+    Precondition: stage is a (name, command, options) tuple
+    """
+    name, command, options = stage
+    return name in vectorized.POINTWISE and command is getattr(vectorized,name)
+
+
+def _table(entry):
+    """
+    Returns the full 256-entry table for an entry of a step (see compile_chain).
+
+    Parameter entry: The table entry
+    Precondition: entry is None (no change), a number (a constant), or a numpy array
+    of 256 values
+    """
+    if entry is None:
+        return numpy.arange(256)
+    if numpy.ndim(entry) == 0:
+        return numpy.full(256,entry)
+    return entry
+
+
+def _entry(table):
+    """
+    Returns the simplest entry for the given 256-entry table (see _table).
+
+    Parameter table: The table
+    Precondition: table is a numpy array of 256 values
+    """
+    if (table == numpy.arange(256)).all():
+        return None
+    if (table == table[0]).all():
+        return table[0]
+    return table
+
+
+def _add_curves(steps, tables):
+    """
+    Adds a stage that applies a tone curve to each color channel to the list steps.
+
+    The curves are composed with a curve step or a brightness step at the end of
+    steps, so the new stage costs nothing when the chain runs.
+
+    Parameter steps: The steps compiled so far
+    Precondition: steps is a list of steps (see compile_chain)
+
+    Parameter tables: The tone curves for red, green and blue
+    Precondition: tables is a list of three entries (see _table) of uint8 values
+    """
+    last = steps[-1] if steps else None
+    if last is not None and last[0] in ('curves','brightness'):
+        before = last[1] if last[0] == 'curves' else last[3]
+        after  = []
+        for channel in range(3):
+            if tables[channel] is None:
+                after.append(before[channel])
+            else:
+                table = _table(tables[channel]).astype(numpy.uint8)
+                after.append(_entry(table[_table(before[channel])]))
+        steps[-1] = last[:-1]+(after,) if last[0] == 'brightness' else ('curves',after)
+    else:
+        steps.append(('curves',tables))
+
+
+def _add_mono(steps, sepia):
+    """
+    Adds a mono stage (see vectorized.mono) to the list steps.
+
+    Tone curves just before the stage become the brightness contribution tables of
+    red, green and blue (so the products are the same floats).  If the step before is
+    greyscale brightness, all three channels are a function of one value 0..255, so
+    the stage becomes a tone curve of that value.
+
+    Parameter steps: The steps compiled so far
+    Precondition: steps is a list of steps (see compile_chain)
+
+    Parameter sepia: Whether to use sepia tone instead of greyscale
+    Precondition: sepia is a bool
+    """
+    assert sepia == True or sepia == False, "Sepia must be 'True' or 'False'"
+    scales = vectorized.SEPIA if sepia else (1.0,1.0,1.0)
+
+    last = steps[-1] if steps else None
+    if last is not None and last[0] == 'brightness' and last[2] == (1.0,1.0,1.0):
+        values = [_table(entry) for entry in last[3]]
+        bright = (vectorized.BRIGHTNESS[0]*values[0] + vectorized.BRIGHTNESS[1]*values[1]
+                  + vectorized.BRIGHTNESS[2]*values[2])
+        after  = [_entry((scales[channel]*bright).astype(numpy.uint8))
+                  for channel in range(3)]
+        steps[-1] = last[:-1]+(after,)
+        return
+
+    parts = [None,None,None]
+    if last is not None and last[0] == 'curves':
+        steps.pop()
+        for channel in range(3):
+            if last[1][channel] is not None:
+                parts[channel] = vectorized.BRIGHTNESS[channel]*_table(last[1][channel])
+                parts[channel] = _entry(parts[channel])
+    steps.append(('brightness',parts,tuple(scales),[None,None,None]))
+
+
+def _run_curves(array, tables):
+    """
+    Applies a curve step (see compile_chain) to the pixels in array.
+
+    Parameter array: The pixels
+    Precondition: array is a numpy array of uint8 with shape height x width x 4
+
+    Parameter tables: The tone curves for red, green and blue
+    Precondition: tables is a list of three entries (see _table) of uint8 values
+    """
+    for channel in range(3):
+        if tables[channel] is None:
+            continue
+        if numpy.ndim(tables[channel]) == 0:
+            array[:,:,channel] = tables[channel]
+        else:
+            array[:,:,channel] = tables[channel][array[:,:,channel]]
+
+
+def _run_brightness(array, parts, scales, tables):
+    """
+    Applies a brightness step (see compile_chain) to the pixels in array.
+
+    This is vectorized.mono with the products looked up in parts (when they are not
+    None) and the results looked up in tables.  Channels with the same scale and table
+    are only computed once.
+
+    Parameter array: The pixels
+    Precondition: array is a numpy array of uint8 with shape height x width x 4
+
+    Parameter parts: The brightness contributions of red, green and blue
+    Precondition: parts is a list of three entries (see _table) of floats
+
+    Parameter scales: The scale of the brightness for red, green and blue
+    Precondition: scales is a tuple of three floats
+
+    Parameter tables: The tone curves applied after the scales
+    Precondition: tables is a list of three entries (see _table) of uint8 values
+    """
+    bright = None
+    for channel in range(3):
+        if parts[channel] is None:
+            part = vectorized.BRIGHTNESS[channel]*array[:,:,channel]
+        elif numpy.ndim(parts[channel]) == 0:
+            part = parts[channel]
+        else:
+            part = parts[channel][array[:,:,channel]]
+        bright = part if bright is None else bright+part
+
+    done = {}
+    for channel in range(3):
+        key = (scales[channel],id(tables[channel]))
+        if key not in done:
+            value = bright if scales[channel] == 1 else scales[channel]*bright
+            value = numpy.asarray(value).astype(numpy.uint8)
+            table = tables[channel]
+            if table is not None:
+                value = table if numpy.ndim(table) == 0 else table[value]
+            done[key] = value
+        array[:,:,channel] = done[key]
+
+
+def compile_chain(chain):
+    """
+    Returns a plug-in function that runs a chain of point-wise stages in one pass.
+
+    The chain is first compiled into a list of steps, composing stages where it can:
+
+        ('curves', tables)
+            A tone curve for each color channel (see lut.apply).  Stages that are tone
+            curves (like dered) are composed into one table per channel, so any number
+            of them costs one lookup per channel.
+        ('brightness', parts, scales, tables)
+            A mono stage, with the tone curves before it folded into the brightness
+            contributions, and the curves after it folded into tables.  A mono after
+            a greyscale mono is folded into tables as well.
+        ('stage', command, options)
+            Any other stage, run as it is.
+
+    Each entry of a table is None (no change), a constant, or a numpy array of 256
+    values.  Stages that depend on the position of the pixel (like vignette) cannot be
+    tone curves, so each one is still a step of its own, as is a mono after a sepia
+    mono (its channels depend on more than one value).  So the time taken grows with
+    the number of those stages, but not with the number of tone curves.
+
+    The function processes its image in blocks of about BLOCK_PIXELS pixels, running
+    every step on a block before moving to the next block.  Each block is a PixelBuffer
+    with a band (see pixelbuffer.extent), so stages like vignette know where the block
+    is in the full image.  The results are exactly the same as running the stages one
+    at a time.  The function returns True if any stage modified the image, and its
+    attribute steps is the list of steps.
+
+    Parameter chain: The stages to fuse
+    Precondition: chain is a non-empty list of (name, command, options) tuples, each
+    of which is fusable
+    """
+    steps = []
+    for (name, command, options) in chain:
+        if name in CURVES:
+            _add_curves(steps,[None if table is None else
+                               _entry(numpy.array(table,dtype=numpy.uint8))
+                               for table in CURVES[name]])
+        elif name == 'mono':
+            _add_mono(steps,options.get('sepia',False))
+        else:
+            steps.append(('stage',command,options))
+
+    def fused(image):
+        array = image.array
+        top, total = pixelbuffer.extent(image)
+        step = max(BLOCK_PIXELS//array.shape[1],1)
+        modified = False
+        for start in range(0,array.shape[0],step):
+            block = array[start:start+step]
+            for item in steps:
+                if item[0] == 'curves':
+                    _run_curves(block,item[1])
+                    modified = True
+                elif item[0] == 'brightness':
+                    _run_brightness(block,*item[1:])
+                    modified = True
+                elif item[1](pixelbuffer.PixelBuffer(block,(top+start,total)),**item[2]):
+                    modified = True
+        return modified
+
+    fused.__name__ = '+'.join([stage[0] for stage in chain])
+    fused.steps = steps
+    return fused
+
+
+def fuse(pipeline):
+    """
+    Returns a copy of pipeline with each run of point-wise stages fused into one stage.
+
+    A run of two or more consecutive fusable stages is replaced by a single stage
+    (see compile_chain) named by joining the stage names with '+'.  All other stages
+    are unchanged.
+
+    Parameter pipeline: The pipeline stages
+    Precondition: pipeline is a list of (name, command, options) tuples
+    """
+    result = []
+    chain  = []
+    for stage in pipeline+[None]:
+        if stage is not None and fusable(stage):
+            chain.append(stage)
+            continue
+
+        if len(chain) == 1:
+            result.append(chain[0])
+        elif len(chain) > 1:
+            fused = compile_chain(chain)
+            result.append((fused.__name__,fused,{}))
+        chain = []
+        if stage is not None:
+            result.append(stage)
+    return result
+
+
+def benchmark(size=4000, longest=8):
+    """
+    Prints the time to run chains of 1 to longest point-wise stages, fused and unfused.
+
+    The image is a random size x size image.  The first chains cycle through the
+    stages mono, dered and mono with sepia, which compile to a single step however
+    long the chain is.  The second chains cycle through mono, vignette and dered, and
+    each vignette is a step of its own (see compile_chain).
+
+    Parameter size: The image width and height
+    Precondition: size is an int > 0
+
+    Parameter longest: The longest chain to time
+    Precondition: longest is an int > 0
+    """
+    import time
+    cycles = [[('mono',vectorized.mono,{}),('dered',vectorized.dered,{}),
+               ('mono',vectorized.mono,{'sepia':True})],
+              [('mono',vectorized.mono,{}),('vignette',vectorized.vignette,{}),
+               ('dered',vectorized.dered,{})]]
+    source = numpy.random.default_rng(0).integers(0,256,(size,size,4),dtype=numpy.uint8)
+
+    for cycle in cycles:
+        print('stages    unfused      fused   (cycle: %s)' %
+              ', '.join([stage[0]+(' sepia' if stage[2] else '') for stage in cycle]))
+        for length in range(1,longest+1):
+            chain = [cycle[pos % len(cycle)] for pos in range(length)]
+            times = []
+            for pipeline in [chain,[(None,compile_chain(chain),{})]]:
+                image = pixelbuffer.PixelBuffer(source.copy())
+                start = time.perf_counter()
+                for (name, command, options) in pipeline:
+                    command(image,**options)
+                times.append(time.perf_counter()-start)
+            print('%6d %9.3fs %9.3fs' % (length,times[0],times[1]))
+        print()
+
+
+# Script code
+if __name__ == '__main__':
+    benchmark()
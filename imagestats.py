@@ -0,0 +1,101 @@
+"""
+Image statistics for the pictool.
+
+This module measures an image without printing its pixels: the histogram of each
+channel, the smallest, largest and average value of each channel, and the number of
+different colors.  It is used by the plugin stats, to look at large images that are
+far too big to display pixel by pixel.
+
+Everything is measured in one pass over the pixels, a band of BAND_PIXELS pixels at
+a time (so the memory needed does not depend on the image size).  Each band adds to
+the 256-value histogram of each channel (see numpy.bincount), and the smallest,
+largest and average values are found from the histograms at the end.  The colors
+are counted by marking each RGB value in a table of 2**24 flags (16 MB), which is
+much faster than sorting the pixels.  Colors that only differ in alpha are the same
+color; the number of different alpha values comes from the alpha histogram.
+
+Author: Michael Dickey
+Date: Oct 18 2026
+"""
+import numpy
+
+
+# The (approximate) number of pixels in a band
+BAND_PIXELS = 1 << 20
+
+# The names of the channels, in order
+CHANNELS = ('red','green','blue','alpha')
+
+
+def measure(array):
+    """
+    Returns a dictionary with the statistics of the given pixels.
+
+    The dictionary has the keys
+        width, height   The image size
+        histogram       A 4 x 256 numpy array, counting the pixels with each value
+                        of each channel (in the order of CHANNELS)
+        min, max, mean  Lists with the smallest, largest and average value of each
+                        channel
+        colors          The number of different RGB colors
+        alphas          The number of different alpha values
+
+    Parameter array: The pixels
+    Precondition: array is a numpy array of uint8 with shape height x width x 4,
+    with height and width > 0
+    """
+    height, width = array.shape[:2]
+    histogram = numpy.zeros((4,256),dtype=numpy.int64)
+    marks = numpy.zeros(1 << 24,dtype=bool)
+
+    rows = max(BAND_PIXELS//width,1)
+    for top in range(0,height,rows):
+        band = numpy.ascontiguousarray(array[top:top+rows])
+        for channel in range(4):
+            histogram[channel] += numpy.bincount(band[:,:,channel].ravel(),minlength=256)
+        # The first three bytes of a pixel (as a little-endian 32-bit int) are its color
+        marks[band.view('<u4').ravel() & 0xFFFFFF] = True
+
+    values = numpy.arange(256)
+    result = {'width':width, 'height':height, 'histogram':histogram}
+    result['min']  = [int(numpy.flatnonzero(counts)[0]) for counts in histogram]
+    result['max']  = [int(numpy.flatnonzero(counts)[-1]) for counts in histogram]
+    result['mean'] = [float(counts @ values)/(width*height) for counts in histogram]
+    result['colors'] = int(numpy.count_nonzero(marks))
+    result['alphas'] = int(numpy.count_nonzero(histogram[3]))
+    return result
+
+
+def summary(result, bins=16):
+    """
+    Returns the statistics (see measure) as text to print.
+
+    The histograms are shown with bins groups of values, each as the percentage of the
+    pixels in that group.
+
+    Parameter result: The statistics
+    Precondition: result is a dictionary returned by measure
+
+    Parameter bins: The number of groups of values in each histogram
+    Precondition: bins is an int that divides 256
+    """
+    width, height = result['width'], result['height']
+    total = width*height
+    lines = ['Size: %d x %d (%d pixels)' % (width,height,total),
+             'RGB colors: %d different' % result['colors'],
+             'Alpha values: %d different' % result['alphas'],
+             '',
+             '%-6s %5s %5s %8s' % ('','min','max','mean')]
+    for pos in range(4):
+        lines.append('%-6s %5d %5d %8.2f' % (CHANNELS[pos],result['min'][pos],
+                                             result['max'][pos],result['mean'][pos]))
+
+    size = 256//bins
+    lines.append('')
+    lines.append('Histogram (%% of pixels with values 0-%d, %d-%d, ...):' %
+                 (size-1,size,2*size-1))
+    groups = result['histogram'].reshape(4,bins,size).sum(axis=2)
+    for pos in range(4):
+        percents = ' '.join(['%5.1f' % (100*count/total) for count in groups[pos]])
+        lines.append('%-6s %s' % (CHANNELS[pos],percents))
+    return '\n'.join(lines)
@@ -0,0 +1,246 @@
+"""
+Instrumentation for the pictool.
+
+This module keeps the timers and counters that pictool.py uses to report where the
+time goes when it processes an image: decoding the file, converting it to an image
+buffer, verifying the buffer, running the plugins, encoding and writing the file.
+It also has the progress hook that the loading and saving functions report to, and
+optional profilers (cProfile or a simple sampling profiler) for the plugins.
+
+Instrumentation is off by default, and then the timers and counters do nothing.  The
+progress hook is separate: it does nothing unless a callback has been set with
+set_progress.  Functions should only report progress a few times per image (for
+example, once per row), never from inside a per-pixel loop.
+
+Author: Michael Dickey
+Date: Oct 18 2026
+"""
+import contextlib
+import time
+
+
+# Whether the timers and counters are recording
+_enabled = False
+
+# The total time for each timer name, in seconds
+_timers = {}
+
+# The total for each counter name
+_counters = {}
+
+# The profiler results, if a profiler was used
+_profile = None
+
+# The progress callback (or None)
+_progress = None
+
+
+def enable(value=True):
+    """
+    Turns the timers and counters on (or off if value is False).
+
+    Turning them on also clears all previous measurements.
+
+    Parameter value: Whether to record measurements
+    Precondition: value is a bool
+    """
+    global _enabled
+    _enabled = value
+    if value:
+        reset()
+
+
+def enabled():
+    """
+    Returns True if the timers and counters are recording; False otherwise.
+    """
+    return _enabled
+
+
+def reset():
+    """
+    Clears all timers, counters and profiler results.
+    """
+    global _profile
+    _timers.clear()
+    _counters.clear()
+    _profile = None
+
+
+@contextlib.contextmanager
+def timer(name):
+    """
+    Adds the time spent in a with-block to the timer name.
+
+    Use this function as
+
+        with instrument.timer('decode'):
+            ...
+
+    If the instrumentation is off, this does nothing.
+
+    Parameter name: The timer name
+    Precondition: name is a string
+    """
+    if not _enabled:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _timers[name] = _timers.get(name,0.0)+time.perf_counter()-start
+
+
+def count(name, amount=1):
+    """
+    Adds amount to the counter name.
+
+    If the instrumentation is off, this does nothing.
+
+    Parameter name: The counter name
+    Precondition: name is a string
+
+    Parameter amount: The amount to add
+    Precondition: amount is a number
+    """
+    if _enabled:
+        _counters[name] = _counters.get(name,0)+amount
+
+
+def report():
+    """
+    Returns a dictionary of all measurements, suitable for saving as JSON.
+
+    The dictionary has the keys 'timers' (seconds for each timer), 'counters' and,
+    if a profiler was used, 'profile'.
+    """
+    result = {'timers':dict(_timers), 'counters':dict(_counters)}
+    if _profile is not None:
+        result['profile'] = _profile
+    return result
+
+
+def merge(other):
+    """
+    Adds the timers and counters of another report to the current measurements.
+
+    This is used to combine the reports from several processes.  If the
+    instrumentation is off, this does nothing.
+
+    Parameter other: The report to add
+    Precondition: other is a dictionary returned by report
+    """
+    if _enabled:
+        for (name, value) in other['timers'].items():
+            _timers[name] = _timers.get(name,0.0)+value
+        for (name, value) in other['counters'].items():
+            _counters[name] = _counters.get(name,0)+value
+
+
+def set_progress(callback):
+    """
+    Sets the progress callback (or removes it if callback is None).
+
+    The callback is called as callback(task, fraction), where task is a string like
+    'Loading' and fraction is a number from 0 to 1 saying how far along the task is.
+
+    Parameter callback: The progress callback
+    Precondition: callback is a function of two arguments or None
+    """
+    global _progress
+    _progress = callback
+
+
+def progress(task, fraction):
+    """
+    Reports how far along a task is to the progress callback, if there is one.
+
+    Parameter task: The task name
+    Precondition: task is a string
+
+    Parameter fraction: How far along the task is
+    Precondition: fraction is a number from 0 to 1
+    """
+    if _progress is not None:
+        _progress(task,fraction)
+
+
+def _cprofile_stats(profiler, limit):
+    """
+    Returns the slowest functions from a cProfile profiler as a list of dictionaries.
+
+    Parameter profiler: The profiler
+    Precondition: profiler is a stopped cProfile.Profile
+
+    Parameter limit: The number of functions to return
+    Precondition: limit is an int > 0
+    """
+    import pstats
+    stats = pstats.Stats(profiler).stats
+    rows  = []
+    for (file, line, name), (calls, total, tottime, cumtime, callers) in stats.items():
+        rows.append({'function':name, 'file':file, 'line':line, 'calls':total,
+                     'tottime':tottime, 'cumtime':cumtime})
+    rows.sort(key=lambda row : row['tottime'],reverse=True)
+    return rows[:limit]
+
+
+@contextlib.contextmanager
+def profile(kind, limit=25, interval=0.001):
+    """
+    Profiles the code in a with-block, adding the results to the report.
+
+    If kind is 'cprofile', the block is run under cProfile and the report lists the
+    limit functions with the most time.  If kind is 'sample', the block is sampled
+    every interval seconds of CPU time, and the report lists the limit lines that
+    were running most often (this only works on Unix).  If kind is None, this does
+    nothing.
+
+    Parameter kind: The profiler to use
+    Precondition: kind is 'cprofile', 'sample' or None
+
+    Parameter limit: The number of entries to report
+    Precondition: limit is an int > 0
+
+    Parameter interval: The sampling interval in seconds
+    Precondition: interval is a float > 0
+    """
+    global _profile
+    if kind is None:
+        yield
+        return
+
+    if kind == 'cprofile':
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            _profile = {'profiler':'cprofile', 'functions':_cprofile_stats(profiler,limit)}
+        return
+
+    # A sampling profiler: count the line running at each timer signal
+    import signal
+    samples = {}
+    def sample(signum, frame):
+        if frame is not None:
+            key = (frame.f_code.co_filename,frame.f_lineno,frame.f_code.co_name)
+            samples[key] = samples.get(key,0)+1
+
+    previous = signal.signal(signal.SIGPROF,sample)
+    signal.setitimer(signal.ITIMER_PROF,interval,interval)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_PROF,0,0)
+        signal.signal(signal.SIGPROF,previous)
+        total = max(sum(samples.values()),1)
+        rows = [{'function':name, 'file':file, 'line':line, 'samples':hits,
+                 'fraction':hits/total} for ((file, line, name), hits) in samples.items()]
+        rows.sort(key=lambda row : row['samples'],reverse=True)
+        _profile = {'profiler':'sample', 'interval':interval, 'samples':total,
+                    'lines':rows[:limit]}
@@ -0,0 +1,294 @@
+"""
+Lookup tables for per-channel tone mappings in the pictool.
+
+Every color value is an int from 0 to 255, so any function of a single color value can
+be computed ahead of time for all 256 values and stored in a table.  Applying the
+function is then just looking up each value in the table, which is much faster than
+computing it for every pixel.  A table like this is called a tone curve.
+
+Some functions, like the brightness used by mono, depend on all three color values.
+They can still use tables: the brightness 0.3*red + 0.6*green + 0.1*blue is the sum of
+the contributions 0.3*red, 0.6*green and 0.1*blue, and each of those is in a table
+(see BRIGHTNESS_TABLES).  The contributions are the same floats that the formula
+computes, and they are added in the same order, so the results are identical.
+
+The result of mono is a function of the brightness, not of a single color value.  But
+the brightness is the int 3*red + 6*green + blue (the brightness index, from 0 to
+INDEX_LIMIT) divided by 10, so the new value of each channel can be looked up in a
+table with an entry for each index (see brightness_curve).  This is how mono works in
+greyscale and in sepia, with one table for each channel.
+
+The functions apply and apply_brightness work on both kinds of image buffer.  On a
+PixelBuffer they use numpy array indexing to look up a whole channel at once.
+
+Author: Michael Dickey
+Date: Oct 18 2026
+"""
+import fractions
+import numpy
+import pixelbuffer
+
+
+# The tone curve that leaves every value unchanged
+IDENTITY = tuple(range(256))
+
+
+def curve(function):
+    """
+    Returns the tone curve of function: a tuple of its values for 0 to 255.
+
+    Parameter function: The tone mapping
+    Precondition: function is a function taking an int 0..255 and returning an int 0..255
+    """
+    result = tuple([function(value) for value in range(256)])
+    for value in result:
+        assert type(value) == int and 0 <= value <= 255, repr(value)+' is not a color value'
+    return result
+
+
+def constant(value):
+    """
+    Returns the tone curve that maps every value to the given value.
+
+    Parameter value: The new color value
+    Precondition: value is an int 0..255
+    """
+    return curve(lambda old : value)
+
+
+def contributions(weight):
+    """
+    Returns a table of weight*value for every value from 0 to 255, as floats.
+
+    Parameter weight: The weight of a color channel
+    Precondition: weight is a number
+    """
+    return tuple([weight*value for value in range(256)])
+
+
+# The contribution tables to brightness for red, green and blue (see plugins.mono)
+BRIGHTNESS_TABLES = (contributions(0.3), contributions(0.6), contributions(0.1))
+
+# The same tables as numpy arrays
+_BRIGHTNESS_ARRAYS = numpy.array(BRIGHTNESS_TABLES)
+
+# The weights of red, green and blue in the brightness index
+INDEX_WEIGHTS = (3, 6, 1)
+
+# The largest brightness index
+INDEX_LIMIT = 2550
+
+# The sepia scales of the brightness for red, green and blue (see plugins.mono)
+SEPIA_SCALES = (1.0, 0.6, 0.4)
+
+
+def brightness_curve(scale):
+    """
+    Returns the brightness curve for the color value int(scale*brightness).
+
+    A brightness curve is a tuple (scale, table, marked, after).  The value table is a
+    numpy array with the color value for each brightness index, and marked is a numpy
+    array of bools, one for each index.  The value after is a tone curve applied to
+    the value int(scale*brightness), as a numpy array (or None for no tone curve).
+    The table already includes after (see compose_brightness).
+
+    The table is computed from the exact brightness (index/10, with fractions).  The
+    floats that mono adds up (see BRIGHTNESS_TABLES) are within a tiny error of it, so
+    they truncate to the same int, unless scale*brightness is exactly an int.  Then
+    the floats might be just below it, and truncate to one less.  The indices where
+    this can happen are marked, and pixels with them are computed from the floats
+    instead (see brightness_values), so the results are identical to the floats.
+
+    Parameter scale: The scale of the brightness
+    Precondition: scale is a float 0..1 with at most a few decimal places
+    """
+    weight = fractions.Fraction(repr(scale))/10
+    exact  = [weight*index for index in range(INDEX_LIMIT+1)]
+    table  = numpy.array([int(value) for value in exact],dtype=numpy.uint8)
+    marked = numpy.array([value.denominator == 1 for value in exact])
+    return (scale,table,marked,None)
+
+
+def compose_brightness(curve, tone):
+    """
+    Returns the brightness curve of the tone curve tone applied after curve.
+
+    Parameter curve: The brightness curve
+    Precondition: curve is a brightness curve (see brightness_curve)
+
+    Parameter tone: The tone curve applied after it
+    Precondition: tone is a tone curve, or a numpy array of 256 uint8 values
+    """
+    scale, table, marked, after = curve
+    tone = numpy.asarray(tone,dtype=numpy.uint8)
+    return (scale,tone[table],marked,tone if after is None else tone[after])
+
+
+# The brightness curve of greyscale, for all three channels
+GREY_CURVE = brightness_curve(1.0)
+
+# The brightness curves of red, green and blue for mono in greyscale and in sepia
+GREY_CURVES  = (GREY_CURVE, GREY_CURVE, GREY_CURVE)
+SEPIA_CURVES = tuple([brightness_curve(scale) for scale in SEPIA_SCALES])
+
+
+def apply(image, curves):
+    """
+    Returns True after applying a tone curve to each color channel of the image.
+
+    The value curves is a tuple (red, green, blue) or (red, green, blue, alpha) of
+    tone curves.  A curve that is None (or IDENTITY) leaves that channel unchanged,
+    and a constant curve simply fills its channel.
+
+    Parameter image: The image buffer
+    Precondition: image is a PixelBuffer or a 2d table of RGB objects
+
+    Parameter curves: The tone curves for each channel
+    Precondition: curves is a tuple of 3 or 4 tone curves (or None)
+    """
+    changes = []
+    for channel in range(len(curves)):
+        table = curves[channel]
+        if table is not None and table != IDENTITY:
+            assert len(table) == 256, 'a tone curve must have 256 entries'
+            changes.append((channel,table))
+
+    if isinstance(image,pixelbuffer.PixelBuffer):
+        array = image.array
+        for (channel, table) in changes:
+            if min(table) == max(table):
+                array[:,:,channel] = table[0]
+            else:
+                array[:,:,channel] = numpy.asarray(table,dtype=numpy.uint8)[array[:,:,channel]]
+        return True
+
+    names = ('red','green','blue','alpha')
+    changes = [(names[channel],table) for (channel, table) in changes]
+    for row in image:
+        for pixel in row:
+            for (name, table) in changes:
+                setattr(pixel,name,table[getattr(pixel,name)])
+    return True
+
+
+def brightness_values(array, curves, before=None):
+    """
+    Returns the new values of red, green and blue given by brightness curves.
+
+    The result is a list of three numpy arrays, with the shape of one channel of array.
+    Channels with the same curve share one array.  The pixels whose brightness index
+    is marked by a curve are computed from the floats (see brightness_curve).
+
+    Parameter array: The pixels
+    Precondition: array is a numpy array of uint8 with shape height x width x 4
+
+    Parameter curves: The brightness curves of red, green and blue
+    Precondition: curves is a tuple of three brightness curves
+
+    Parameter before: Tone curves applied to red, green and blue before the brightness
+    Precondition: before is None, or a tuple of three entries that are each None, a
+    numpy array of 256 uint8 values or a single uint8 value (a constant curve)
+    """
+    shape  = array.shape[:2]
+    colors = []
+    for channel in range(3):
+        values = array[:,:,channel]
+        if before is not None and before[channel] is not None:
+            if numpy.ndim(before[channel]) == 0:
+                values = numpy.broadcast_to(numpy.uint8(before[channel]),shape)
+            else:
+                values = before[channel][values]
+        colors.append(values)
+
+    index = colors[0]*numpy.uint16(INDEX_WEIGHTS[0])
+    index += colors[1]*numpy.uint16(INDEX_WEIGHTS[1])
+    index += colors[2]
+
+    # The marked pixels of any curve, and their brightness from the floats
+    marked = curves[0][2]
+    for curve in curves[1:]:
+        marked = marked | curve[2]
+    spots  = numpy.flatnonzero(numpy.take(marked,index))
+    bright = (_BRIGHTNESS_ARRAYS[0][colors[0].ravel()[spots]] +
+              _BRIGHTNESS_ARRAYS[1][colors[1].ravel()[spots]] +
+              _BRIGHTNESS_ARRAYS[2][colors[2].ravel()[spots]])
+    spotted = index.ravel()[spots]
+
+    result = []
+    found  = {}
+    for curve in curves:
+        if id(curve) not in found:
+            scale, table, marks, after = curve
+            values = numpy.take(table,index)
+            fixed  = (bright if scale == 1 else scale*bright).astype(numpy.uint8)
+            if after is not None:
+                fixed = numpy.take(after,fixed)
+            flat = values.ravel()
+            flat[spots] = numpy.where(numpy.take(marks,spotted),fixed,flat[spots])
+            found[id(curve)] = values
+        result.append(found[id(curve)])
+    return result
+
+
+def apply_brightness(image, curves):
+    """
+    Returns True after setting each color channel to a brightness curve of the pixel.
+
+    This is how mono works: the curves are GREY_CURVES or SEPIA_CURVES.  The alpha
+    channel is left unchanged.
+
+    Parameter image: The image buffer
+    Precondition: image is a PixelBuffer or a 2d table of RGB objects
+
+    Parameter curves: The brightness curves of red, green and blue
+    Precondition: curves is a tuple of three brightness curves (see brightness_curve)
+    """
+    if isinstance(image,pixelbuffer.PixelBuffer):
+        array  = image.array
+        values = brightness_values(array,curves)
+        if values[0] is values[1] is values[2]:
+            array[:,:,:3] = values[0][:,:,numpy.newaxis]
+        else:
+            for channel in range(3):
+                array[:,:,channel] = values[channel]
+        return True
+
+    red_index, green_index, blue_index = [tuple([weight*value for value in range(256)])
+                                          for weight in INDEX_WEIGHTS]
+    red_part, green_part, blue_part = BRIGHTNESS_TABLES
+    scales  = [curve[0] for curve in curves]
+    tables  = [curve[1].tolist() for curve in curves]
+    marked  = [curve[2].tolist() for curve in curves]
+    afters  = [None if curve[3] is None else curve[3].tolist() for curve in curves]
+
+    # Greyscale (one curve for all channels) is the common case, so it is a loop of its own
+    if curves[0] is curves[1] is curves[2]:
+        scale, table, marks, after = scales[0], tables[0], marked[0], afters[0]
+        for row in image:
+            for pixel in row:
+                red, green, blue = pixel.red, pixel.green, pixel.blue
+                index = red_index[red] + green_index[green] + blue_index[blue]
+                if marks[index]:
+                    value = int(scale*(red_part[red] + green_part[green] + blue_part[blue]))
+                    value = value if after is None else after[value]
+                else:
+                    value = table[index]
+                pixel.red = value
+                pixel.green = value
+                pixel.blue = value
+        return True
+
+    for row in image:
+        for pixel in row:
+            red, green, blue = pixel.red, pixel.green, pixel.blue
+            index = red_index[red] + green_index[green] + blue_index[blue]
+            values = []
+            for channel in range(3):
+                if marked[channel][index]:
+                    bright = red_part[red] + green_part[green] + blue_part[blue]
+                    value = int(bright if scales[channel] == 1 else scales[channel]*bright)
+                    values.append(value if afters[channel] is None else afters[channel][value])
+                else:
+                    values.append(tables[channel][index])
+            pixel.red, pixel.green, pixel.blue = values
+    return True
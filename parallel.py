@@ -0,0 +1,179 @@
+"""
+Parallel band processing for the pictool.
+
+Every plugin runs on a single core.  This module splits an image into horizontal bands
+and processes the bands at the same time in a pool of worker processes.  It is used by
+pictool.py when it is run with the option --workers.
+
+Sending an image to another process normally means pickling it, which copies every
+pixel twice.  Instead, the pixels are put in shared memory (see the module
+multiprocessing.shared_memory) that every worker can see.  The workers only receive
+the name of the shared memory and which rows to process.
+
+There are two blocks of shared memory, one for the original image and one for the
+result.  Each worker reads its band from the original, along with the extra rows
+(the halo) that commands like blur need above and below the band, and writes just its
+band to the result.  Because no worker writes to the original, every worker sees the
+same pixels that the serial code would, and the result is identical.
+
+Only commands that can be run one band of rows at a time can be run in parallel (see
+pictool.tile_halo).
+
+Author: Michael Dickey
+Date: Oct 18 2026
+"""
+import atexit
+import fusion
+import multiprocessing
+import numpy
+import pixelbuffer
+from multiprocessing import shared_memory
+
+
+# The worker pool, created the first time it is needed
+_pool = None
+
+# The number of processes in _pool
+_size = 0
+
+
+def get_pool(workers):
+    """
+    Returns a pool of the given number of worker processes.
+
+    The pool is kept and reused by later calls asking for the same number of workers,
+    since starting processes is slow.  It is closed when the program exits.
+
+    Parameter workers: The number of worker processes
+    Precondition: workers is an int > 1
+    """
+    global _pool, _size
+    if _pool is not None and _size != workers:
+        shutdown()
+    if _pool is None:
+        _pool = multiprocessing.Pool(workers)
+        _size = workers
+    return _pool
+
+
+def shutdown():
+    """
+    Closes the worker pool, if there is one.
+    """
+    global _pool, _size
+    if _pool is not None:
+        _pool.close()
+        _pool.join()
+        _pool = None
+        _size = 0
+
+
+atexit.register(shutdown)
+
+
+def split(height, count):
+    """
+    Returns a list of (start, end) row ranges dividing height rows into count bands.
+
+    The bands are as even as possible, and empty bands are left out.
+
+    Parameter height: The number of rows
+    Precondition: height is an int > 0
+
+    Parameter count: The number of bands
+    Precondition: count is an int > 0
+    """
+    bounds = [(height*pos)//count for pos in range(count+1)]
+    return [(bounds[pos],bounds[pos+1]) for pos in range(count) if bounds[pos] < bounds[pos+1]]
+
+
+def run_band(task):
+    """
+    Processes one band of a shared image, and returns True if it was modified.
+
+    The task is a tuple (source, target, shape, start, end, halo, extent, pipeline,
+    fuse).  The values source and target are the names of the shared memory for the
+    original image and the result, and shape is the shape of the image array.  The
+    worker processes the rows start to end-1, with halo extra rows on each side, and
+    writes those rows to the result.  The value extent is the position of the image
+    in the full image (see pixelbuffer.extent).  If fuse is True, the point-wise stages
+    of the pipeline are fused (see fusion.fuse).
+
+    Parameter task: The band to process
+    Precondition: task is a tuple as described above
+    """
+    source, target, shape, start, end, halo, extent, pipeline, fuse = task
+    original = shared_memory.SharedMemory(name=source)
+    result   = shared_memory.SharedMemory(name=target)
+    try:
+        before = numpy.ndarray(shape,dtype=numpy.uint8,buffer=original.buf)
+        after  = numpy.ndarray(shape,dtype=numpy.uint8,buffer=result.buf)
+
+        first = max(start-halo,0)
+        last  = min(end+halo,shape[0])
+        band  = pixelbuffer.PixelBuffer(before[first:last].copy(),(extent[0]+first,extent[1]))
+        if fuse:
+            pipeline = fusion.fuse(pipeline)
+
+        modified = False
+        for (name, command, options) in pipeline:
+            if command(band,**options):
+                modified = True
+
+        after[start:end] = band.array[start-first:end-first]
+
+        # The arrays must be released before the shared memory can be closed
+        del before, after
+        return modified
+    finally:
+        original.close()
+        result.close()
+
+
+def run(pipeline, buffer, halo, workers, fuse=False):
+    """
+    Returns True after processing buffer with the pipeline, in parallel bands.
+
+    The image is copied into shared memory and split into one band per worker.  When
+    the workers are done, the result replaces the pixels of buffer.  The function
+    returns True if any worker modified its band; False otherwise.
+
+    Parameter pipeline: The pipeline stages
+    Precondition: pipeline is a list of (name, command, options) tuples that can be
+    run one band at a time, and each command is a module-level function
+
+    Parameter buffer: The image buffer
+    Precondition: buffer is a PixelBuffer
+
+    Parameter halo: The number of extra rows each band needs above and below
+    Precondition: halo is an int >= 0
+
+    Parameter workers: The number of worker processes
+    Precondition: workers is an int > 1
+
+    Parameter fuse: Whether to fuse the point-wise stages
+    Precondition: fuse is a bool
+    """
+    shape = buffer.array.shape
+    size  = buffer.array.nbytes
+    original = shared_memory.SharedMemory(create=True,size=size)
+    result   = shared_memory.SharedMemory(create=True,size=size)
+    try:
+        before = numpy.ndarray(shape,dtype=numpy.uint8,buffer=original.buf)
+        before[:] = buffer.array
+        del before
+
+        extent = pixelbuffer.extent(buffer)
+        tasks = [(original.name,result.name,shape,start,end,halo,extent,pipeline,fuse)
+                 for (start, end) in split(shape[0],workers)]
+        modified = any(get_pool(workers).map(run_band,tasks))
+
+        after = numpy.ndarray(shape,dtype=numpy.uint8,buffer=result.buf)
+        buffer.array = after.copy()
+        del after
+        return modified
+    finally:
+        original.close()
+        original.unlink()
+        result.close()
+        result.unlink()
@@ -26,84 +26,198 @@ assuming that you would not even read this docstring.
 Author: Walker M. White
 Date: August 11, 2019
 """
-from PIL import Image as CoreImage
-import traceback
-import introcs
+import instrument
 import os.path
-import plugins
+import registry
 import sys
 
 
 # The number of periods in the "progress bar"
 PROGRESS = 10
 
+# The options that configure pictool itself (with their defaults), not the plug-in
+SETTINGS = {'buffer':'compact', 'engine':'python', 'tile':'auto', 'batch':False, 
+            'jobs':os.cpu_count() or 1, 'fuse':True, 'workers':1, 'progress':True,
+            'profile':False, 'profiler':None, 'strict-verify':False,
+            'no-cache':False, 'memo':False, 'memo-limit':None, 'memo-stats':False,
+            'mask-cache':False, 'help':False, 'socket':None, 'format':None,
+            'compress-level':None, 'png-filter':None, 'level':None, 'max-size':None}
 
-def read_image(file):
+# The supported profilers (see instrument.profile)
+PROFILERS = [None,'cprofile','sample']
+
+# The supported in-memory image formats
+BUFFERS = ['compact','table']
+
+# The (approximate) number of bytes in a band of rows when processing in bands
+TILE_BYTES = 1 << 24
+
+# The modules to search for commands, for each engine (in order of preference)
+ENGINES = {'python':['plugins'], 'numpy':['vectorized','plugins']}
+
+
+def read_image(file,compact=True,cache=False,level=0):
     """
     Returns an in-memory image buffer for the given file.
     
-    An image buffer is a 2d table of RGB objects.  This is different than the way
-    images are represented by the PIL module (which is designed for speed), but it
-    is easier for beginners.
+    By default, the image buffer is a PixelBuffer (see the module pixelbuffer).  This
+    keeps the whole image in one block of RGBA bytes, but still lets the plugins
+    access pixels as image[r][c].  If compact is False, the image buffer is instead 
+    a 2d table of RGB objects.  This is different than the way images are represented 
+    by the PIL module (which is designed for speed), but it is easier for beginners.
     
-    This function prints out a simple progress bar to indicate how far along it
-    is in loading.  The progress bar consists of several periods followed by 'done'.
+    This function reports its progress (a few times per image) to the progress hook
+    in the module instrument.  When pictool is run from the command line, this prints
+    a simple progress bar consisting of several periods followed by 'done'.  The time
+    to decode the file and to convert it to a buffer are recorded as the timers 
+    'decode' and 'convert'.
+    
+    If cache is True, the decoded pixels are kept in the cache of the module 
+    pixelcache.  When the same file is read again, its pixels are memory-mapped from
+    the cache instead of decoded (the counters 'cache hits' and 'cache misses' record
+    which happened).
+    
+    Files in the uncompressed formats of the module encoders (raw, PAM and npy) are
+    not decoded or cached at all.  Their pixels are memory-mapped straight into the 
+    PixelBuffer (copy-on-write, so the file is never changed), and are only read from
+    disk as the plugins use them.  PPM files are mapped too, but their pixels are 
+    copied once to add the alpha.  The counter 'mapped reads' records these files.
+    
+    If level is more than 0, the buffer holds that level of the image pyramid instead
+    of the image itself (see the module pyramid).  The level is memory-mapped from the
+    pyramid cache if it is there.  Otherwise the image is read as above, and all of 
+    its levels are made (and saved in the pyramid cache, if cache is True).  The 
+    counters 'pyramid hits' and 'pyramid misses' record which happened, and the time
+    to make the levels is recorded as the timer 'pyramid'.
     
     If the file does not exist, or there is an error in reading the file, then
     this function returns None.
     
     Paramater file: The image file to read
     Precondition: file is a string
+    
+    Parameter compact: Whether to return a PixelBuffer instead of a table
+    Precondition: compact is a bool
+    
+    Parameter cache: Whether to use the decoded pixel cache
+    Precondition: cache is a bool
+    
+    Parameter level: The pyramid level to read
+    Precondition: level is an int >= 0
     """
+    import encoders
+    import numpy
+    import pixelbuffer
+    import pixelcache
+    import pyramid
     try:
-        image = CoreImage.open(file)
-        print(('Loading ' + repr(file)),end='',flush=True)
+        # A cached pyramid level is mapped, so the image itself is not read at all
+        data = pyramid.lookup(file,level) if level > 0 else None
+        found = data is not None
         
-        # Extract data from PIL
-        image = image.convert("RGBA")
-        width  = image.size[0]
-        height = image.size[1]
+        # Uncompressed files are mapped directly, so there is nothing to cache
+        mapped = False
+        if not found:
+            with instrument.timer('decode'):
+                data = encoders.load(file)
+            mapped = data is not None
+        if not found and not mapped and cache:
+            data = pixelcache.lookup(file)
         
-        # Poor man's progress bar
-        size = width*height
-        block = max(size//PROGRESS,1)
+        if found:
+            print(('Loading ' + repr(file)),end='',flush=True)
+            instrument.count('pyramid hits')
+        elif mapped:
+            print(('Loading ' + repr(file)),end='',flush=True)
+            instrument.count('mapped reads')
+        elif data is not None:
+            print(('Loading ' + repr(file)),end='',flush=True)
+            instrument.count('cache hits')
+        else:
+            from PIL import Image as CoreImage
+            with instrument.timer('decode'):
+                image = CoreImage.open(file)
+                print(('Loading ' + repr(file)),end='',flush=True)
+                
+                # Extract data from PIL
+                image = image.convert("RGBA")
+                
+                # Get the raw bytes from PIL in one call, and view them as rows of pixels
+                data = numpy.frombuffer(image.tobytes(),dtype=numpy.uint8)
+                data = data.reshape(image.size[1],image.size[0],4)
+            if cache:
+                with instrument.timer('cache'):
+                    pixelcache.store(file,data)
+                instrument.count('cache misses')
         
-        # This is an iterator.  It allows us to "sync" two sequences in the loop
-        source = iter(image.getdata())
+        if level > 0 and not found:
+            with instrument.timer('pyramid'):
+                data = pyramid.build(file,data,level,cache)
+            instrument.count('pyramid misses')
         
-        # Convert PIL data to student-friendly format
-        buffer = []
-        for r in range(height):
-            row = []
-            for c in range(width):
-                # Get next PIL pixel and convert to RGB object
-                tups = next(source)
-                row.append(introcs.RGB(*tups))
-                
-                # Update progress bar every block steps
-                if (r*width+c) % block == 0:
-                    print('.',end='',flush=True)
-            
-            buffer.append(row)
+        height = data.shape[0]
+        instrument.count('pixels read',data.shape[0]*data.shape[1])
+        
+        if compact:
+            # A mapped file or cache entry is copy-on-write, and a new pyramid level is not
+            # shared, but PIL's bytes must be copied
+            with instrument.timer('convert'):
+                array = data if mapped or level > 0 or isinstance(data,numpy.memmap) else data.copy()
+                buffer = pixelbuffer.PixelBuffer(array)
+            print('..done')
+            return buffer
+        
+        # Poor man's progress bar, updated once per row
+        step = max(height//PROGRESS,1)
+        
+        import introcs
+        with instrument.timer('convert'):
+            # Convert PIL data to student-friendly format
+            buffer = []
+            for r in range(height):
+                buffer.append([introcs.RGB(*pixel) for pixel in data[r].tolist()])
+                if r % step == 0:
+                    instrument.progress('Loading',r/height)
         
         print('done')
         return buffer
     except:
         # This displays error message even though we are not technically crashing
+        import traceback
         traceback.print_exc()
         print('Could not load the file ' + repr(file))
         return None
 
 
-def verify_image(buffer):
+def verify_image(buffer,strict=False):
     """
     Returns True if buffer is the correct format for an image buffeer; False otherwise.
     
     The function is used to verify that the code in the plugins module has not 
-    corrupted an image before saving it.
+    corrupted an image before saving it.  An image buffer is either a PixelBuffer
+    or a 2d table of RGB objects.
+    
+    A PixelBuffer is checked in constant time: any uint8 array of the right shape is
+    a valid image.  A table is normally checked one row at a time, making sure that 
+    every row is a list of the same width that starts and ends with an RGB object.  
+    That catches rows that are missing, too short or replaced, but not a single bad 
+    pixel in the middle of a row.  If strict is True, every pixel of a table is 
+    checked as well.
     
     Parameter buffer: the candidate image buffer
+    
+    Parameter strict: Whether to check every pixel of a table
+    Precondition: strict is a bool
     """
+    import pixelbuffer
+    if isinstance(buffer,pixelbuffer.PixelBuffer):
+        import numpy
+        array = buffer.array
+        return (isinstance(array,numpy.ndarray) and 
+                array.dtype == numpy.uint8 and array.ndim == 3 and 
+                array.shape[0] > 0 and array.shape[1] > 0 and array.shape[2] == 4)
+    
+    import introcs
     if type(buffer) != list or len(buffer) == 0:
         return False
     
@@ -113,61 +227,801 @@ def verify_image(buffer):
     
     width = len(first)
     for row in buffer:
-        if len(row) != width:
+        if type(row) != list or len(row) != width:
+            return False
+        if type(row[0]) != introcs.RGB or type(row[-1]) != introcs.RGB:
             return False
-        for item in row:
-            if type(item) != introcs.RGB:
-                return False
+    
+    if strict:
+        for row in buffer:
+            for item in row:
+                if type(item) != introcs.RGB:
+                    return False
     
     return True
 
 
-def save_image(buffer,file):
+def save_image(buffer,file,strict=False,encoding=None):
     """
     Saves the given image buffer to the specified file.
     
     If the image cannot be written (image is corrupt, file name is invalid, etc.)
-    this function will display an error message. Otherwise this function prints out 
-    a simple progress bar to indicate how far along it is in saving. The progress bar 
-    consists of several periods followed by 'done'.
+    this function will display an error message. Otherwise this function reports its
+    progress to the progress hook in the module instrument (see read_image).  The 
+    time to verify the buffer, convert it for PIL, encode it and write the file are
+    recorded as the timers 'verify', 'convert', 'encode' and 'write'.
+    
+    The file is a PNG file unless encoding (or the suffix of file) asks for another
+    format (see the module encoders).  PNG files are encoded by PIL, which picks the 
+    best filter for each row, unless encoding asks for a particular filter.
+    
+    This function returns True if the image was saved; False otherwise.
     
     Parameter buffer: The image buffer to save
-    Precondition: buffer is a 2d table of RGB objects
+    Precondition: buffer is a PixelBuffer or a 2d table of RGB objects
     
     Parameter file: The file name to save to
     Precondition: file is a string
+    
+    Parameter strict: Whether to check every pixel before saving (see verify_image)
+    Precondition: strict is a bool
+    
+    Parameter encoding: The encoder settings (see encoders.create)
+    Precondition: encoding is a dictionary or None
     """
+    import encoders
+    import numpy
+    import pixelbuffer
+    encoding = {} if encoding is None else encoding
+    pil = (encoders.format_of(file,encoding.get('format')) == 'png' and 
+           encoding.get('filter') in [None,'adaptive'])
+    
     # Make sure the student did not damage anything
-    assert verify_image(buffer), 'A plug-in has corrupted the image data'
+    with instrument.timer('verify'):
+        assert verify_image(buffer,strict), 'A plug-in has corrupted the image data'
     try:
         height = len(buffer)
         width  = len(buffer[0])
+        print(('Saving ' + repr(file)),end='',flush=True)
         
-        # Poor man's progress bar
-        size = width*height
-        block = max(size//PROGRESS,1)
+        if isinstance(buffer,pixelbuffer.PixelBuffer):
+            if pil:
+                with instrument.timer('convert'):
+                    im = array_image(buffer.array)
+                write_image(im,file,encoding.get('level'))
+            else:
+                write_array(buffer.array,file,encoding)
+            print('..done')
+            return True
         
-        print(('Saving ' + repr(file)),end='',flush=True)
-        im = CoreImage.new('RGBA',(width,height))
+        # Poor man's progress bar, updated once per row
+        step = max(height//PROGRESS,1)
         
-        # Convert student data back to PIL format
-        output = []
-        for r in range(height):
-            for c in range(width):
-                pixel = buffer[r][c]
-                output.append(pixel.rgba())
-                
-                # Update progress bar every block steps
-                if (r*width+c) % block == 0:
-                    print('.',end='',flush=True)
-        im.putdata(output)
+        with instrument.timer('convert'):
+            # Convert student data back to raw bytes, one row at a time
+            data = numpy.empty((height,width,4),dtype=numpy.uint8)
+            for r in range(height):
+                data[r] = [pixel.rgba() for pixel in buffer[r]]
+                if r % step == 0:
+                    instrument.progress('Saving',r/height)
+            im = array_image(data) if pil else None
         
-        im.save(file,'PNG')
+        if pil:
+            write_image(im,file,encoding.get('level'))
+        else:
+            write_array(data,file,encoding)
         print('done')
+        return True
     except:
         # This displays error message even though we are not technically crashing
+        import traceback
         traceback.print_exc()
         print('Could not save the file ' + repr(file))
+        return False
+
+
+def array_image(array):
+    """
+    Returns a PIL image with the pixels of the given array.
+    
+    If the array is contiguous (not a flipped or transposed view), the image shares 
+    its memory, so no pixels are copied.  Otherwise the pixels are copied once, in 
+    order.  The array must not be changed while the image is in use.
+    
+    Parameter array: The pixel data
+    Precondition: array is a numpy array of uint8 with shape height x width x 4
+    """
+    from PIL import Image as CoreImage
+    import numpy
+    array = numpy.ascontiguousarray(array)
+    size  = (array.shape[1],array.shape[0])
+    return CoreImage.frombuffer('RGBA',size,array,'raw','RGBA',0,1)
+
+
+def write_image(image,file,level=None):
+    """
+    Encodes the PIL image as a PNG and writes it to the specified file.
+    
+    The image is encoded in memory first, so that the time to encode it and the time
+    to write the file can be recorded separately (as the timers 'encode' and 'write').
+    
+    Parameter image: The image to save
+    Precondition: image is a PIL image
+    
+    Parameter file: The file name to save to
+    Precondition: file is a string
+    
+    Parameter level: The zlib compression level (None for PIL's default)
+    Precondition: level is an int 0..9 or None
+    """
+    import io
+    with instrument.timer('encode'):
+        data = io.BytesIO()
+        if level is None:
+            image.save(data,'PNG')
+        else:
+            image.save(data,'PNG',compress_level=level)
+    with instrument.timer('write'):
+        with open(file,'wb') as stream:
+            stream.write(data.getbuffer())
+    instrument.count('bytes written',data.tell())
+
+
+def write_array(array,file,encoding):
+    """
+    Writes the pixels of the given array to the specified file, without PIL.
+    
+    The file is written with a writer from encoders.create.  Writing a PNG file is
+    recorded as the timer 'encode', since most of its time is spent compressing, and
+    writing any other file as the timer 'write'.
+    
+    The array may be memory-mapped from the file itself (see read_image), so the 
+    pixels are written to a temporary file that replaces file at the end.
+    
+    Parameter array: The pixel data
+    Precondition: array is a numpy array of uint8 with shape height x width x 4
+    
+    Parameter file: The file name to save to
+    Precondition: file is a string
+    
+    Parameter encoding: The encoder settings (see encoders.create)
+    Precondition: encoding is a dictionary
+    """
+    import encoders
+    format = encoders.format_of(file,encoding.get('format'))
+    encoding = dict(encoding,format=format)
+    temp = file+'.%d.tmp' % os.getpid()
+    try:
+        with instrument.timer('encode' if format == 'png' else 'write'):
+            writer = encoders.create(temp,array.shape[1],array.shape[0],encoding)
+            writer.write(array)
+            writer.close()
+        os.replace(temp,file)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+    instrument.count('bytes written',os.path.getsize(file))
+
+
+def show_progress(task,fraction):
+    """
+    Prints a period to show progress.  This is the progress hook used by main.
+    
+    Parameter task: The task name
+    Precondition: task is a string
+    
+    Parameter fraction: How far along the task is
+    Precondition: fraction is a number from 0 to 1
+    """
+    print('.',end='',flush=True)
+
+
+def tile_halo(command,options):
+    """
+    Returns the number of extra rows command needs around a band, or None if the 
+    command cannot be run one band at a time.
+    
+    A command can be run in bands if its name is a key of plugins.TILE_SAFE.  The value
+    for that key is either the number of extra rows, or the name of the option that
+    gives the number of extra rows (using the default value if the option is missing),
+    or a tuple of option names, where the first that is not None gives the number.
+    
+    Parameter command: The plug-in function
+    Precondition: command is a function in plugins or in an engine module
+    
+    Parameter options: The plug-in options
+    Precondition: options is a dictionary
+    """
+    import plugins
+    if not command.__name__ in plugins.TILE_SAFE:
+        return None
+    
+    halo = plugins.TILE_SAFE[command.__name__]
+    names = (halo,) if type(halo) == str else halo
+    if type(names) == tuple:
+        param = command.__code__.co_varnames[:command.__code__.co_argcount]
+        halo = None
+        for name in names:
+            if name in options:
+                halo = options[name]
+            else:
+                halo = command.__defaults__[param.index(name)-1]
+            if halo is not None:
+                break
+    
+    # Let the plug-in report its own precondition errors
+    return halo if type(halo) == int and halo >= 0 else None
+
+
+def pipeline_halo(pipeline):
+    """
+    Returns the number of extra rows a pipeline needs around a band, or None if the 
+    pipeline cannot be run one band at a time.
+    
+    A pipeline can be run in bands if every stage can (see tile_halo).  Each stage 
+    spoils its halo rows at the edge of the band, so the halo of the pipeline is the 
+    total of the halos of its stages.
+    
+    Parameter pipeline: The pipeline stages
+    Precondition: pipeline is a list of (name, command, options) tuples
+    """
+    total = 0
+    for (name, command, options) in pipeline:
+        halo = tile_halo(command,options)
+        if halo is None:
+            return None
+        total += halo
+    return total
+
+
+def run_pipeline(pipeline,buffer,workers=1,fuse=False):
+    """
+    Returns True if any stage of the pipeline modified the buffer; False otherwise.
+    
+    The stages are run in order on the same buffer.  If fuse is True, runs of 
+    point-wise stages are fused into one pass first (see fusion.fuse).
+    
+    If workers is more than 1 and buffer is a PixelBuffer, each run of consecutive 
+    stages that can be processed one band of rows at a time (see tile_halo) is split
+    into bands and processed by that many worker processes (see parallel.run).  The
+    other stages, like transpose, are run in this process.  The result is the same
+    either way.
+    
+    Parameter pipeline: The pipeline stages
+    Precondition: pipeline is a list of (name, command, options) tuples
+    
+    Parameter buffer: The image buffer
+    Precondition: buffer is a PixelBuffer or a 2d table of RGB objects
+    
+    Parameter workers: The number of worker processes
+    Precondition: workers is an int > 0
+    
+    Parameter fuse: Whether to fuse the point-wise stages
+    Precondition: fuse is a bool
+    """
+    import pixelbuffer
+    parallel_ok = workers > 1 and isinstance(buffer,pixelbuffer.PixelBuffer)
+    modified = False
+    segment  = []
+    for stage in pipeline+[None]:
+        if parallel_ok and stage is not None and tile_halo(stage[1],stage[2]) is not None:
+            segment.append(stage)
+            continue
+        
+        # Run the stages collected so far in parallel bands
+        if segment:
+            names = '+'.join([name for (name, command, options) in segment])
+            import parallel
+            with instrument.timer('plugin '+names+' (parallel)'):
+                if parallel.run(segment,buffer,pipeline_halo(segment),workers,fuse):
+                    modified = True
+            segment = []
+        
+        if stage is not None and parallel_ok:
+            with instrument.timer('plugin '+stage[0]):
+                if stage[1](buffer,**stage[2]):
+                    modified = True
+    
+    if not parallel_ok:
+        if fuse:
+            import fusion
+            pipeline = fusion.fuse(pipeline)
+        for (name, command, options) in pipeline:
+            with instrument.timer('plugin '+name):
+                if command(buffer,**options):
+                    modified = True
+            instrument.count('stages run')
+    return modified
+
+
+def open_stream(file,cache=False):
+    """
+    Returns a reader for the rows of the given PNG (or uncompressed) file.
+    
+    A file in one of the uncompressed formats of the module encoders is memory-mapped
+    (see encoders.load) and read with a pixelcache.Reader, whatever the value of cache.
+    Otherwise, if cache is False, the result is a pngstream.PNGReader.  Otherwise, if
+    the file is in the decoded pixel cache (see the module pixelcache), the rows are 
+    read from the cache instead of decoded.  If it is not, the rows are decoded and 
+    added to the cache as they are read.  All of these readers have the same 
+    attributes and methods.
+    
+    Parameter file: The image file to read
+    Precondition: file is a string naming an 8-bit non-interlaced PNG file, or a file
+    that encoders.detect recognizes
+    
+    Parameter cache: Whether to use the decoded pixel cache
+    Precondition: cache is a bool
+    """
+    import encoders
+    import pixelcache
+    import pngstream
+    array = encoders.load(file)
+    if array is not None:
+        instrument.count('mapped reads')
+        return pixelcache.Reader(array)
+    
+    if not cache:
+        return pngstream.PNGReader(file)
+    
+    array = pixelcache.lookup(file)
+    if array is not None:
+        instrument.count('cache hits')
+        return pixelcache.Reader(array)
+    
+    reader = pngstream.PNGReader(file)
+    entry  = pixelcache.create(file,reader.width,reader.height)
+    if entry is None:
+        return reader
+    instrument.count('cache misses')
+    return pixelcache.Recorder(reader,entry)
+
+
+def process_tiled(pipeline,input,output,rows=None,workers=1,fuse=False,cache=False,
+                  encoding=None):
+    """
+    Processes the input file with a pipeline one band of rows at a time.
+    
+    Rather than load the whole image, this function streams the input file through
+    a PNGReader (see the module pngstream), or through its cached pixels (see 
+    open_stream).  It processes each band of rows as a 
+    PixelBuffer, and then streams the band to the output file with a writer from 
+    encoders.create.  So the memory needed depends on the size of a band, not the size
+    of the image.
+    
+    Commands like blur need to see some rows above and below the band (the halo).
+    These rows are processed along with the band, but are not written.  Instead, they
+    are written as part of the band that they belong to.
+    
+    This function reports its progress to the progress hook in the module instrument 
+    once per band.  Decoding and encoding each band are recorded as the timers 'decode' 
+    and 'encode'.  It returns True if the image was processed and saved; False 
+    otherwise.  If there is an error, the partly written output file is removed.
+    
+    Parameter pipeline: The pipeline stages
+    Precondition: pipeline is a list of (name, command, options) tuples for which
+    pipeline_halo is not None
+    
+    Parameter input: The image file to read
+    Precondition: input is a string naming a file that open_stream can read
+    
+    Parameter output: The file name to save to
+    Precondition: output is a string, and is not the same file as input
+    
+    Parameter rows: The number of rows in a band (None to use TILE_BYTES)
+    Precondition: rows is None or an int > 0
+    
+    Parameter workers: The number of worker processes for each band (see run_pipeline)
+    Precondition: workers is an int > 0
+    
+    Parameter fuse: Whether to fuse the point-wise stages (see fusion.fuse)
+    Precondition: fuse is a bool
+    
+    Parameter cache: Whether to use the decoded pixel cache (see open_stream)
+    Precondition: cache is a bool
+    
+    Parameter encoding: The encoder settings (see encoders.create)
+    Precondition: encoding is a dictionary or None
+    """
+    import encoders
+    import numpy
+    import pixelbuffer
+    halo = pipeline_halo(pipeline)
+    reader = None
+    writer = None
+    try:
+        reader = open_stream(input,cache)
+        height = reader.height
+        if rows is None:
+            rows = max(TILE_BYTES//(reader.width*4),1)
+        
+        print('Streaming '+repr(input)+' to '+repr(output),end='',flush=True)
+        writer = encoders.create(output,reader.width,height,encoding)
+        
+        # The rows currently in memory, starting at row first of the image
+        with instrument.timer('decode'):
+            window = reader.read(min(rows+halo,height))
+        first  = 0
+        for start in range(0,height,rows):
+            end  = min(start+rows,height)
+            need = min(end+halo,height)
+            if reader.row < need:
+                with instrument.timer('decode'):
+                    window = numpy.concatenate((window,reader.read(need-reader.row)))
+            
+            # Process the band and its halo, and then write just the band
+            top = max(start-halo,0)
+            band = pixelbuffer.PixelBuffer(window[top-first:need-first].copy(),(top,height))
+            run_pipeline(pipeline,band,workers,fuse)
+            with instrument.timer('encode'):
+                writer.write(band.array[start-top:end-top])
+            instrument.count('bands')
+            
+            # Forget the rows that no later band will need
+            keep = max(end-halo,0)
+            window = window[keep-first:]
+            first  = keep
+            instrument.progress('Streaming',end/height)
+        
+        with instrument.timer('encode'):
+            writer.close()
+        writer = None
+        instrument.count('pixels read',reader.width*height)
+        instrument.count('bytes written',os.path.getsize(output))
+        print('done')
+        return True
+    except:
+        # This displays error message even though we are not technically crashing
+        import traceback
+        traceback.print_exc()
+        print('Could not process the file ' + repr(input))
+        return False
+    finally:
+        if reader is not None:
+            reader.close()
+        # Do not leave a truncated output file behind
+        if writer is not None:
+            writer.discard()
+
+
+def process_file(pipeline,settings,input,output=None):
+    """
+    Processes a single image file with the given pipeline.
+    
+    This function does the work of compute_file.  But if the setting memo is True, it 
+    first looks for a saved result of the same pipeline on the same input (see the 
+    module resultcache).  If there is one, it is copied to the output file instead.
+    Otherwise the new output file is saved as a result for next time, if the pipeline
+    wrote one (a pipeline of display or stats does not change the image, so it writes
+    nothing).  The counters 'result hits' and 'result misses' record which happened.
+    
+    This function returns True if the file was processed (and saved, if there is an
+    output file); False otherwise.
+    
+    Parameter pipeline: The pipeline stages
+    Precondition: pipeline is a list of (name, command, options) tuples
+    
+    Parameter settings: The pictool settings
+    Precondition: settings is a dictionary with the keys of SETTINGS
+    
+    Parameter input: The image file to read
+    Precondition: input is a string
+    
+    Parameter output: The file name to save to (or None)
+    Precondition: output is a string or None
+    """
+    import resultcache
+    if not settings['memo'] or output is None:
+        return compute_file(pipeline,settings,input,output)
+    
+    try:
+        key = resultcache.result_key(input,pipeline,os.path.splitext(output)[1],
+                                     file_encoding(settings),image_level(settings,input))
+    except OSError:
+        # Let compute_file report the missing file
+        return compute_file(pipeline,settings,input,output)
+    
+    if resultcache.lookup(key,output):
+        print('Copied the saved result for '+repr(input)+' to '+repr(output))
+        instrument.count('result hits')
+        return True
+    
+    instrument.count('result misses')
+    before = file_stamp(output)
+    result = compute_file(pipeline,settings,input,output)
+    after  = file_stamp(output)
+    if result and after is not None and after != before:
+        limit = settings['memo-limit']
+        resultcache.store(key,output,None if limit is None else limit*(1 << 20))
+    return result
+
+
+def file_stamp(file):
+    """
+    Returns a tuple that changes whenever file is written, or None if it does not exist.
+    
+    The tuple has the inode, modification time and size of the file.
+    
+    Parameter file: The file name
+    Precondition: file is a string
+    """
+    try:
+        info = os.stat(file)
+    except OSError:
+        return None
+    return (info.st_ino,info.st_mtime_ns,info.st_size)
+
+
+def file_encoding(settings):
+    """
+    Returns the encoder settings (see encoders.create) chosen by the pictool settings.
+    
+    Parameter settings: The pictool settings
+    Precondition: settings is a dictionary with the keys of SETTINGS
+    """
+    return {'format':settings['format'], 'level':settings['compress-level'], 
+            'filter':settings['png-filter']}
+
+
+def image_level(settings,input):
+    """
+    Returns the level of the image pyramid (see the module pyramid) to process.
+    
+    The level is the setting level if it is not None (or the last level, if the image
+    is too small to have that many).  Otherwise, if the setting max-size is not None,
+    it is the largest level that fits inside that size.  Otherwise it is 0, the image
+    itself.  It is also 0 if the size of the input cannot be read, so that reading 
+    the input reports the problem.
+    
+    Parameter settings: The pictool settings
+    Precondition: settings is a dictionary with the keys of SETTINGS
+    
+    Parameter input: The image file to read
+    Precondition: input is a string
+    """
+    if settings['level'] is None and settings['max-size'] is None:
+        return 0
+    
+    import pyramid
+    size = pyramid.image_size(input)
+    if size is None:
+        return 0
+    bound = None if settings['max-size'] is None else pyramid.parse_size(settings['max-size'])
+    return pyramid.choose(size[0],size[1],settings['level'],bound)
+
+
+def compute_file(pipeline,settings,input,output=None):
+    """
+    Processes a single image file with the given pipeline, without saved results.
+    
+    This function (1) loads the input file, (2) processes it with each stage of the
+    pipeline in turn, and (3) saves it to the output file when appropriate.  So the 
+    file is only decoded and encoded once, however many stages there are.  If the 
+    pipeline can be run one band of rows at a time (see pipeline_halo), the input is 
+    a PNG file that pngstream can read (or an uncompressed file, see encoders.detect),
+    and the output is a different file, then this function streams the image through
+    the pipeline (see process_tiled) instead.
+    
+    If the setting level or max-size is not None, the pipeline processes a smaller 
+    level of the image pyramid instead of the image itself (see image_level and the
+    module pyramid).  The levels are small, so they are never streamed.
+    
+    With the numpy engine, runs of point-wise stages are fused so that they process 
+    the image in one pass (see fusion.fuse), unless the setting fuse is False.  If the
+    setting workers is more than 1, the stages that can be run one band at a time are
+    run in that many processes (see run_pipeline).
+    
+    If the setting profiler is not None, the plug-ins are run under that profiler (see
+    instrument.profile).  Unless the setting no-cache is True, the decoded pixels of
+    the input are cached (see the module pixelcache).  If the setting mask-cache is 
+    True, vignette masks are saved to disk (see vectorized.mask_rows).  The output 
+    file is written in the format and with the compression of the settings format, 
+    compress-level and png-filter (see file_encoding).  This function does not use 
+    saved results (see process_file).
+    
+    This function returns True if the file was processed (and saved, if there is an
+    output file); False otherwise.
+    
+    Parameter pipeline: The pipeline stages
+    Precondition: pipeline is a list of (name, command, options) tuples
+    
+    Parameter settings: The pictool settings
+    Precondition: settings is a dictionary with the keys of SETTINGS
+    
+    Parameter input: The image file to read
+    Precondition: input is a string
+    
+    Parameter output: The file name to save to (or None)
+    Precondition: output is a string or None
+    """
+    import datetime
+    import encoders
+    import plugins
+    import pngstream
+    fuse = settings['fuse'] and settings['engine'] == 'numpy'
+    cache = not settings['no-cache']
+    encoding = file_encoding(settings)
+    level = image_level(settings,input)
+    if settings['mask-cache']:
+        import vectorized
+        vectorized.set_mask_folder(vectorized.MASK_DIR)
+    if (settings['tile'] != 0 and settings['buffer'] == 'compact' and output is not None and
+        level == 0 and pipeline_halo(pipeline) is not None and 
+        (pngstream.streamable(input) or encoders.detect(input) is not None) and 
+        os.path.realpath(input) != os.path.realpath(output)):
+        start = datetime.datetime.now()
+        rows = None if settings['tile'] == 'auto' else settings['tile']
+        with instrument.profile(settings['profiler']):
+            result = process_tiled(pipeline,input,output,rows,settings['workers'],fuse,cache,
+                                   encoding)
+        end = datetime.datetime.now()
+        print('Time: '+str(end-start))
+        return result
+    
+    buffer = read_image(input,settings['buffer'] == 'compact',cache,level)
+    if buffer is None:
+        return False
+    
+    start = datetime.datetime.now()
+    print('Processing '+repr(input),end='',flush=True)
+    with instrument.profile(settings['profiler']):
+        process = run_pipeline(pipeline,buffer,settings['workers'],fuse)
+    print('..done')
+    end = datetime.datetime.now()
+    # Uncomment this to see how long it is taking to process images
+    print('Time: '+str(end-start)) 
+    if process and output is not None:
+        strict = settings['strict-verify'] or any([name in plugins.NEW_ROWS for 
+                                                   (name, command, options) in pipeline])
+        return save_image(buffer,output,strict,encoding)
+    return True
+
+
+def batch_files(input,output,suffix='.png'):
+    """
+    Returns the list of (input, output) file pairs for a batch run.
+    
+    The input files are the images in the input folder (files whose extension is 
+    supported by PIL or is in encoders.SUFFIXES), in alphabetical order.  Each output 
+    file is in the output folder, with the same name as the input file but the 
+    extension suffix.
+    
+    Parameter input: The folder of images to process
+    Precondition: input is a string naming a folder
+    
+    Parameter output: The folder to save the processed images to
+    Precondition: output is a string
+    
+    Parameter suffix: The extension of the output files
+    Precondition: suffix is a string
+    """
+    from PIL import Image as CoreImage
+    import encoders
+    extensions = list(CoreImage.registered_extensions())+list(encoders.SUFFIXES)
+    result = []
+    for name in sorted(os.listdir(input)):
+        source = os.path.join(input,name)
+        base, ext = os.path.splitext(name)
+        if os.path.isfile(source) and ext.lower() in extensions:
+            result.append((source,os.path.join(output,base+suffix)))
+    return result
+
+
+def batch_worker(task):
+    """
+    Processes one file of a batch run, and returns a tuple summarizing the result.
+    
+    The task is a tuple (stages, settings, input, output), where stages is a list of 
+    (name, options) pairs.  The commands are looked up by name with lookup_command, 
+    and then the file is processed with process_file.  Anything printed while 
+    processing is captured rather than shown, since many workers run at once.
+    
+    The result is a tuple (input, output, success, log, seconds, report), where log 
+    is the captured output.  When this runs in a worker process, report is its
+    instrumentation report (see instrument.report) if the setting profile or memo is
+    set, and None otherwise.  In the main process, the measurements are recorded 
+    directly and report is always None.  This function never raises an error, so 
+    that one bad file does not stop the rest of the batch.
+    
+    Parameter task: The file to process
+    Precondition: task is a tuple (list, dictionary, string, string)
+    """
+    import contextlib
+    import io
+    import multiprocessing
+    import time
+    stages, settings, input, output = task
+    start = time.perf_counter()
+    log = io.StringIO()
+    success = False
+    profile = (settings['profile'] or settings['profiler'] or settings['memo']) and \
+              multiprocessing.parent_process() is not None
+    if profile:
+        instrument.enable()
+    with contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            pipeline = []
+            for (name, options) in stages:
+                command = lookup_command(name,options,settings['engine'])
+                if type(command) == str:
+                    raise ValueError(command)
+                pipeline.append((name,command,options))
+            success = process_file(pipeline,settings,input,output)
+        except:
+            import traceback
+            traceback.print_exc()
+    report = instrument.report() if profile else None
+    return (input,output,success,log.getvalue(),time.perf_counter()-start,report)
+
+
+def run_batch(pipeline,settings,input,output):
+    """
+    Processes every image in the input folder, saving the results in the output folder.
+    
+    The files are processed in a pool of settings['jobs'] worker processes (see 
+    batch_worker).  The output files are PNG files, unless the setting format asks for
+    another format (see the module encoders).  The setting workers is ignored, since 
+    each file is processed in a single worker.  This function prints one line for each
+    file as it finishes, followed by the error output of any file that failed, and a 
+    summary at the end.  A failed file does not stop the batch.
+    
+    This function returns the number of files that failed.
+    
+    Parameter pipeline: The pipeline stages
+    Precondition: pipeline is a list of (name, command, options) tuples
+    
+    Parameter settings: The pictool settings
+    Precondition: settings is a dictionary with the keys of SETTINGS
+    
+    Parameter input: The folder of images to process
+    Precondition: input is a string naming a folder
+    
+    Parameter output: The folder to save the processed images to
+    Precondition: output is a string
+    """
+    import encoders
+    import multiprocessing
+    import time
+    os.makedirs(output,exist_ok=True)
+    
+    # Batch workers cannot start their own pools, so files are processed serially
+    settings = dict(settings)
+    settings['workers'] = 1
+    
+    # Send the plug-in names to the workers, since functions are looked up there
+    stages = [(name,options) for (name, command, options) in pipeline]
+    suffix = encoders.suffix_of(settings['format'] or 'png')
+    files  = batch_files(input,output,suffix)
+    tasks  = [(stages,settings,source,target) for (source,target) in files]
+    jobs  = min(settings['jobs'],max(len(tasks),1))
+    print('Processing '+str(len(tasks))+' files with '+str(jobs)+' jobs')
+    
+    start  = time.perf_counter()
+    failed = 0
+    if jobs == 1:
+        results = map(batch_worker,tasks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(jobs)
+        results = pool.imap_unordered(batch_worker,tasks)
+    
+    for (source, target, success, log, seconds, report) in results:
+        if report is not None:
+            instrument.merge(report)
+        if success:
+            print('ok     '+source+' -> '+target+' (%.3fs)' % seconds)
+        else:
+            failed += 1
+            print('FAILED '+source)
+            print(log.rstrip())
+    
+    if pool is not None:
+        pool.close()
+        pool.join()
+    
+    elapsed = time.perf_counter()-start
+    print(str(len(tasks)-failed)+' processed, '+str(failed)+' failed in %.3fs' % elapsed)
+    return failed
 
 
 def parse_args(args):
@@ -176,8 +1030,17 @@ def parse_args(args):
     
     If there is an error in parsing, the returned dictionary will have the key 'error'
     refering to an error message.  Otherwise, the dictionary will contain the 
-    (1) plugin function, (2) the optional arguments to the plug-in function, and
-    (3) the input file.  It will also contain the output file if specified.
+    (1) pipeline of plug-in functions (see parse_pipeline), (2) the settings for 
+    pictool itself, and (3) the input file.  It will also contain the output file if 
+    specified.
+    
+    The settings are the options whose names are keys in SETTINGS.  They are removed
+    from the plug-in options, and any setting not given uses its value in SETTINGS.
+    If the setting batch is True, the input and output are folders, and the output is
+    required.  If the command is serve, there is no input or output, and the dictionary
+    has the key 'serve' (see the module server) instead of a pipeline.  If the setting
+    help is True, the dictionary only has the key 'help', refering to the help message
+    (see help_text).
     
     In addition to returning the argument dictionary, this function modifies args
     to remove all options from it.  So it is not a good idea to call this function
@@ -189,16 +1052,43 @@ def parse_args(args):
     # Strip out options
     options = extract_options(args)
     result = {}
+    
+    # Separate the pictool settings from the plug-in options
+    settings = {}
+    for key in SETTINGS:
+        settings[key] = options.pop(key,SETTINGS[key])
+    
+    if settings['help']:
+        result['help'] = help_text()
+        return result
+    
     usage = 'usage: python3 pictool.py command [options] input [output]'
-    if not len(args) in [3,4]:
+    if settings['batch']:
+        usage = 'usage: python3 pictool.py command [options] --batch input-folder output-folder'
+    
+    if len(args) > 1 and args[1] == 'serve':
+        error = check_settings(settings)
+        if len(args) != 2 or options:
+            result['error'] = 'usage: python3 pictool.py serve [--socket=FILE] [settings]'
+        elif settings['socket'] is not None and type(settings['socket']) != str:
+            result['error'] = 'error: --socket must be a file name'
+        elif error is not None:
+            result['error'] = error
+        else:
+            result['serve'] = True
+            result['settings'] = settings
+    elif not len(args) in [3,4] or (settings['batch'] and len(args) != 4):
         result['error'] = usage
     else:
-        command = lookup_command(args[1],options)
-        if type(command) == str:
-            result['error'] = command
+        pipeline = parse_pipeline(args[1],options,settings['engine'])
+        error = pipeline if type(pipeline) == str else check_settings(settings)
+        if error is not None:
+            result['error'] = error
+        elif settings['batch'] and not os.path.isdir(args[2]):
+            result['error'] = 'error: '+repr(args[2])+' is not a folder'
         else:
-            result['command'] = command
-            result['options'] = options
+            result['pipeline'] = pipeline
+            result['settings'] = settings
         
         result['input'] = args[2]
         if len(args) == 4:
@@ -207,15 +1097,134 @@ def parse_args(args):
     return result
 
 
-def lookup_command(command,options):
+def check_settings(settings):
     """
-    Returns the function in plugins matching command, or an error message if not found.
+    Returns an error message if any of the pictool settings is invalid; None otherwise.
+    
+    Parameter settings: The pictool settings
+    Precondition: settings is a dictionary with the keys of SETTINGS
+    """
+    import encoders
+    import pyramid
+    result = None
+    if not settings['engine'] in ENGINES:
+        result = 'error: --engine must be one of '+', '.join(ENGINES)
+    elif not settings['buffer'] in BUFFERS:
+        result = 'error: --buffer must be one of '+', '.join(BUFFERS)
+    elif settings['engine'] != 'python' and settings['buffer'] != 'compact':
+        result = 'error: --engine='+settings['engine']+' requires --buffer=compact'
+    elif settings['tile'] != 'auto' and (type(settings['tile']) != int or settings['tile'] < 0):
+        result = 'error: --tile must be auto or a number of rows'
+    elif type(settings['fuse']) != bool:
+        result = 'error: --fuse must be True or False'
+    elif type(settings['jobs']) != int or settings['jobs'] < 1:
+        result = 'error: --jobs must be an int > 0'
+    elif type(settings['workers']) != int or settings['workers'] < 1:
+        result = 'error: --workers must be an int > 0'
+    elif not settings['profiler'] in PROFILERS:
+        result = 'error: --profiler must be cprofile or sample'
+    elif type(settings['strict-verify']) != bool:
+        result = 'error: --strict-verify must be True or False'
+    elif type(settings['no-cache']) != bool or type(settings['mask-cache']) != bool:
+        result = 'error: --no-cache and --mask-cache must be True or False'
+    elif type(settings['memo']) != bool or type(settings['memo-stats']) != bool:
+        result = 'error: --memo and --memo-stats must be True or False'
+    elif settings['memo-limit'] is not None and (type(settings['memo-limit']) != int or 
+                                                 settings['memo-limit'] < 0):
+        result = 'error: --memo-limit must be a number of megabytes'
+    elif settings['format'] is not None and not settings['format'] in encoders.FORMATS:
+        result = 'error: --format must be one of '+', '.join(encoders.FORMATS)
+    elif settings['compress-level'] is not None and (type(settings['compress-level']) != int or
+                                                     not settings['compress-level'] in range(10)):
+        result = 'error: --compress-level must be an int 0..9'
+    elif settings['png-filter'] is not None and not settings['png-filter'] in encoders.PNG_FILTERS:
+        result = 'error: --png-filter must be one of '+', '.join(encoders.PNG_FILTERS)
+    elif settings['level'] is not None and (type(settings['level']) != int or settings['level'] < 0):
+        result = 'error: --level must be an int >= 0'
+    elif settings['max-size'] is not None and pyramid.parse_size(settings['max-size']) is None:
+        result = 'error: --max-size must be a size like 640x480'
+    elif settings['level'] is not None and settings['max-size'] is not None:
+        result = 'error: --level and --max-size cannot be used together'
+    return result
+
+
+def parse_pipeline(text,options,engine='python'):
+    """
+    Returns the pipeline of plug-in functions described by text, or an error message.
+    
+    The text is a list of stages separated by '|', and each stage is a command name
+    followed by the options for that command.  For example
+        
+        rotate --right=True | mono --sepia=True | vignette
+    
+    The result is a list of (name, command, options) tuples, one for each stage, where 
+    command is the plug-in function and options is its dictionary of options.  Every 
+    stage is checked with find_command, so the pipeline is known to be valid before
+    any image (or plug-in module) is loaded.  If any stage is invalid, this function 
+    returns a string with the error message instead.
+    
+    The options given outside of text are the options for the command when there is 
+    only one stage, as in 'mono --sepia=True'.  They are not allowed when there is 
+    more than one stage, because it is not clear which stage they belong to.  A dash 
+    in an option name is the same as an underscore, so '--max-cells' is the parameter 
+    max_cells.
+    
+    Parameter text: The pipeline description
+    Precondition: text is a string
     
-    The function looks for a function in plugins with the name of command.  It also 
+    Parameter options: The plug-in options given outside of text
+    Precondition: options is a dictionary
+    
+    Parameter engine: The plug-in engine
+    Precondition: engine is a string
+    """
+    stages = text.split('|')
+    if len(stages) > 1 and options:
+        flags = ', '.join(map(lambda x : '--'+x,options))
+        return 'error: options '+flags+' must be given inside a pipeline stage'
+    
+    pipeline = []
+    for stage in stages:
+        words = stage.split()
+        if len(words) == 0:
+            return 'error: empty stage in pipeline '+repr(text)
+        
+        stage_options = extract_options(words)
+        if len(stages) == 1:
+            stage_options.update(options)
+        # A plug-in option may be written with - for _, as in --max-cells
+        stage_options = dict([(key.replace('-','_'),stage_options[key]) for key in stage_options])
+        if len(words) > 1:
+            return 'error: unexpected argument '+repr(words[1])+' in stage '+repr(stage.strip())
+        
+        module = find_command(words[0],stage_options,engine)
+        if module.startswith('error: '):
+            return module
+        pipeline.append((words[0],module,stage_options))
+    
+    # Only import the plug-ins once every stage is known to be valid
+    import importlib
+    for pos in range(len(pipeline)):
+        name, module, stage_options = pipeline[pos]
+        pipeline[pos] = (name,getattr(importlib.import_module(module),name),stage_options)
+    return pipeline
+
+
+def find_command(command,options,engine='python'):
+    """
+    Returns the name of the module defining command, or an error message if not found.
+    
+    The function looks for a function in plugins with the name of command.  If engine
+    is not 'python', it first looks in the modules for that engine (see ENGINES), and
+    only uses plugins if the engine does not have that command.  It also 
     makes sure that this function has the proper signature (first parameter image,
     all later parameters optional).  If optional is not empty, it verifies that the
     keys of optional refer to valid parameters of the function.
     
+    The plug-in modules are not imported.  Their signatures are read from the source
+    (see the module registry), so a mistake on the command line is reported without 
+    loading numpy and the other modules the plug-ins need.
+    
     If there are any problems (function not found, options do not match), this function
     returns a string with the specific error message.
     
@@ -224,15 +1233,20 @@ def lookup_command(command,options):
     
     Parameter options: The function arguments
     Precondition: options is a dictionary
+    
+    Parameter engine: The plug-in engine
+    Precondition: engine is a string
     """
-    if not hasattr(plugins,command):
+    if not engine in ENGINES:
+        return 'error: --engine must be one of '+', '.join(ENGINES)
+    
+    found = registry.find(command,ENGINES[engine])
+    if found is None:
         return 'error: unrecognized command '+repr(command)
     
     error = None
-    function = getattr(plugins,command)
-    param = function.__code__.co_varnames[:function.__code__.co_argcount]
-    dsize = 0 if function.__defaults__ is None else len(function.__defaults__)
-    if len(param) != dsize+1:
+    module, param, defaults = found
+    if len(param) != len(defaults)+1:
         error = 'error: plugin '+repr(command)+' does not have default values after first parameter'
     else:
         badargs = []
@@ -243,7 +1257,60 @@ def lookup_command(command,options):
             flags = ', '.join(map(lambda x : '--'+x,badargs))
             error = 'error: plugin '+repr(command)+' does not recognize the following options: '+flags
     
-    return function if error is None else error
+    return module if error is None else error
+
+
+def lookup_command(command,options,engine='python'):
+    """
+    Returns the function in plugins matching command, or an error message if not found.
+    
+    The command is checked with find_command, and its module is only imported if 
+    there are no problems.
+    
+    Parameter command: The function name
+    Precondition: command is a string
+    
+    Parameter options: The function arguments
+    Precondition: options is a dictionary
+    
+    Parameter engine: The plug-in engine
+    Precondition: engine is a string
+    """
+    import importlib
+    module = find_command(command,options,engine)
+    if module.startswith('error: '):
+        return module
+    return getattr(importlib.import_module(module),command)
+
+
+def help_text():
+    """
+    Returns the help message listing the commands and the pictool options.
+    
+    The commands are the functions in plugins (the ones with a vectorized version are
+    marked), found without importing any plug-in module (see the module registry).
+    """
+    lines = ['usage: python3 pictool.py command [options] input [output]',
+             '       python3 pictool.py command [options] --batch input-folder output-folder',
+             '','commands (* also with --engine=numpy):']
+    commands = registry.signatures('plugins') or {}
+    faster = registry.signatures('vectorized') or {}
+    for name in commands:
+        param, defaults = commands[name]
+        if name.startswith('_') or len(param) != len(defaults)+1:
+            continue
+        flags = ['--'+param[pos+1]+'='+defaults[pos] for pos in range(len(defaults))]
+        mark = '*' if name in faster else ' '
+        lines.append('  '+mark+' '+' '.join([name]+flags))
+    
+    lines.append('')
+    lines.append('options:')
+    for key in SETTINGS:
+        lines.append('    --'+key+'='+str(SETTINGS[key]))
+    lines.append('')
+    lines.append('A command may be a pipeline of commands separated by |, as in "mono | vignette".')
+    lines.append('Use "python3 pictool.py serve [--socket=FILE]" to process requests (see server.py).')
+    return '\n'.join(lines)
 
 
 def extract_options(args):
@@ -253,7 +1320,7 @@ def extract_options(args):
     An optional argument is any that starts with '--' and has the form 'name=value'.
     This function returns this arguments as a dictionary name:value pairs.  In 
     addition, values are converted to Python types (boolean, int, float) whenever
-    possible.
+    possible.  An argument '--name' with no value is short for '--name=True'.
     
     In addition to returning the dictionary of options, this function modifies args
     to remove all options from it.  So it is not a good idea to call this function
@@ -283,6 +1350,9 @@ def extract_options(args):
         
             options[item[2:split]] = value
             del args[pos]
+        elif item.startswith('--') and len(item) > 2:
+            options[item[2:]] = True
+            del args[pos]
         else:
             pos = pos+1
     
@@ -294,27 +1364,99 @@ def main():
     Runs the image processing tool.
     
     This function parses the command line arguments to (1) load a file, (2) process it
-    and (3) save it when appropriate.
+    and (3) save it when appropriate (see process_file).  The command may be a pipeline
+    of several commands separated by '|' (see parse_pipeline).  With the option --batch, it
+    processes a whole folder of files instead, using --jobs processes (see run_batch).
+    
+    The option --tile sets the number of rows in a band for the commands that can be
+    streamed one band at a time, and --tile=0 turns streaming off.
+    
+    The option --profile records how long each step takes (see the module instrument)
+    and prints a JSON report at the end, or saves it with --profile=FILE.  The option 
+    --profiler=cprofile (or sample) also profiles the plug-ins.  The option 
+    --progress=False turns off the progress bars.
+    
+    Before an image is saved, it is checked for damage (see verify_image).  The option
+    --strict-verify checks every pixel, which is otherwise only done after plug-ins 
+    that replace the rows of the image.
+    
+    The decoded pixels of each input file are cached (see the module pixelcache), so 
+    that processing the same file again does not decode it.  The option --no-cache 
+    turns this off.  The option --mask-cache also saves the vignette masks, which only
+    depend on the image size, so they are not computed again.
+    
+    The option --memo saves each output file (see the module resultcache), and copies
+    the saved output when the same pipeline is run on the same input again.  The 
+    option --memo-limit sets the size of the saved results in megabytes.  With --memo,
+    the number of saved results found (hits) and not found (misses) is shown at the
+    end, and --memo-stats also shows the totals over all runs.
+    
+    The output file is a PNG file, unless its suffix is one of those in 
+    encoders.SUFFIXES or the option --format asks for another format.  The options 
+    --compress-level and --png-filter set the zlib level and the filter of PNG files.
+    The uncompressed formats (--format=ppm, pam, raw or npy) are much faster to write,
+    which suits files that are only read again by another step (see the module 
+    encoders).
+    
+    The option --level=N processes level N of the image pyramid, which is the image 
+    scaled down by 2**N, instead of the image itself.  The option --max-size=WxH picks
+    the largest level that fits inside W x H pixels.  The levels are made once and 
+    cached (see the module pyramid), so making several small versions of a large image
+    only reads it once.
+    
+    The command serve keeps pictool running to process requests from a Unix socket
+    (--socket=FILE) or standard input, so that each image does not have to wait for 
+    pictool to start (see the module server).
+    
+    The option --help lists the commands and options.  Modules are only imported when
+    they are needed, so that --help and mistakes on the command line are quick.
     """
-    import datetime
     args = parse_args(sys.argv[:])
-    if 'error' in args:
+    if 'help' in args:
+        print(args['help'])
+        return
+    elif 'error' in args:
         print(args['error'])
         return
-    
-    buffer = read_image(args['input'])
-    if buffer is None:
+    elif 'serve' in args:
+        import server
+        server.serve(args['settings'])
         return
     
-    start = datetime.datetime.now()
-    print('Processing '+repr(args['input']),end='',flush=True)
-    process = args['command'](buffer,**args['options'])
-    print('..done')
-    end = datetime.datetime.now()
-    # Uncomment this to see how long it is taking to process images
-    print('Time: '+str(end-start)) 
-    if process and 'output' in args:
-        save_image(buffer,args['output'])
+    settings = args['settings']
+    profile  = settings['profile'] or settings['profiler']
+    instrument.enable(bool(profile or settings['memo']))
+    if settings['progress']:
+        instrument.set_progress(show_progress)
+    
+    with instrument.timer('total'):
+        if settings['batch']:
+            run_batch(args['pipeline'],settings,args['input'],args['output'])
+        else:
+            process_file(args['pipeline'],settings,args['input'],args.get('output'))
+    
+    if settings['memo']:
+        import resultcache
+        counters = instrument.report()['counters']
+        hits   = counters.get('result hits',0)
+        misses = counters.get('result misses',0)
+        resultcache.record(hits,misses)
+        print('Saved results: %d hits, %d misses' % (hits,misses))
+        if settings['memo-stats']:
+            totals = resultcache.stats()
+            print('Saved results (all runs): %d hits, %d misses' % (totals['hits'],totals['misses']))
+    
+    if profile:
+        import json
+        report = instrument.report()
+        report['input'] = args['input']
+        report['pipeline'] = [[name,options] for (name, command, options) in args['pipeline']]
+        if type(settings['profile']) == str:
+            with open(settings['profile'],'w') as stream:
+                json.dump(report,stream,indent=1)
+            print('Saved profile to '+repr(settings['profile']))
+        else:
+            print(json.dumps(report,indent=1))
 
 
 # Script code
@@ -0,0 +1,390 @@
+"""
+Compact image buffers for the pictool.
+
+The original image buffer is a 2d table (a list of lists) of RGB objects.  That is
+easy to work with, but every pixel is a separate Python object.  A 12 megapixel photo
+becomes 12 million RGB objects and several gigabytes of memory before a plugin ever
+runs.
+
+This module contains an alternative, the class PixelBuffer.  A PixelBuffer keeps the
+whole image in one contiguous block of RGBA bytes (a numpy array of shape height x
+width x 4, so 4 bytes per pixel).  It still supports the expression image[r][c], which
+returns a Pixel.  A Pixel is a view into the byte block that acts like an RGB object:
+it has the attributes red, green, blue and alpha and the method rgba().  Assigning to
+those attributes writes straight into the buffer.  So the plugins in plugins.py work
+on a PixelBuffer without any changes.
+
+numpy is installed along with introcs, so this module does not add any new
+dependencies to the application.
+
+Author: Michael Dickey
+Date: Oct 18 2026
+"""
+import numpy
+
+
+def extent(image):
+    """
+    Returns the position of image within the full image as a tuple (top, total).
+
+    The value top is the row of the full image that is the first row of image, and 
+    total is the number of rows in the full image.  This is (0, len(image)) unless
+    image is a PixelBuffer holding a band of a larger image.
+
+    Parameter image: The image buffer
+    Precondition: image is a PixelBuffer or a 2d table of RGB objects
+    """
+    if isinstance(image,PixelBuffer) and image.band is not None:
+        return image.band
+    return (0,len(image))
+
+
+class Pixel(object):
+    """
+    An instance is a view of a single pixel in a PixelBuffer.
+
+    A Pixel has the same color attributes as an RGB object, and enforces the same
+    invariants on them.  However, it does not store the colors itself.  Reading an
+    attribute reads the byte from the buffer, and assigning to an attribute writes
+    the byte back to the buffer.
+    """
+    __slots__ = ('_data','_col')
+
+    # MUTABLE ATTRIBUTES
+    @property
+    def red(self):
+        """
+        The red channel.
+
+        Invariant: Value must be an int between 0 and 255, inclusive.
+        """
+        return self._data.item(self._col,0)
+
+    @red.setter
+    def red(self, value):
+        assert type(value) == int, repr(value)+' is not an int'
+        assert value >= 0 and value <= 255, repr(value)+' is outside of range [0,255]'
+        self._data[self._col,0] = value
+
+    @property
+    def green(self):
+        """
+        The green channel.
+
+        Invariant: Value must be an int between 0 and 255, inclusive.
+        """
+        return self._data.item(self._col,1)
+
+    @green.setter
+    def green(self, value):
+        assert type(value) == int, repr(value)+' is not an int'
+        assert value >= 0 and value <= 255, repr(value)+' is outside of range [0,255]'
+        self._data[self._col,1] = value
+
+    @property
+    def blue(self):
+        """
+        The blue channel.
+
+        Invariant: Value must be an int between 0 and 255, inclusive.
+        """
+        return self._data.item(self._col,2)
+
+    @blue.setter
+    def blue(self, value):
+        assert type(value) == int, repr(value)+' is not an int'
+        assert value >= 0 and value <= 255, repr(value)+' is outside of range [0,255]'
+        self._data[self._col,2] = value
+
+    @property
+    def alpha(self):
+        """
+        The alpha channel.
+
+        Invariant: Value must be an int between 0 and 255, inclusive.
+        """
+        return self._data.item(self._col,3)
+
+    @alpha.setter
+    def alpha(self, value):
+        assert type(value) == int, repr(value)+' is not an int'
+        assert value >= 0 and value <= 255, repr(value)+' is outside of range [0,255]'
+        self._data[self._col,3] = value
+
+    def __init__(self, data, col):
+        """
+        Initializes a view of the pixel at position col in the given row data.
+
+        Parameter data: The row of the buffer containing this pixel
+        Precondition: data is a numpy array of shape width x 4
+
+        Parameter col: The column of this pixel
+        Precondition: col is a valid column index for data
+        """
+        self._data = data
+        self._col  = col
+
+    def __eq__(self, other):
+        """
+        Returns True if other has the same color values as this pixel.
+
+        Parameter other: The object to compare
+        """
+        return hasattr(other,'rgba') and self.rgba() == other.rgba()
+
+    def __ne__(self, other):
+        """
+        Returns False if other has the same color values as this pixel.
+
+        Parameter other: The object to compare
+        """
+        return not self == other
+
+    def __str__(self):
+        """
+        Returns a readable string representation of this pixel.
+        """
+        return '('+','.join(map(str,self.rgba()))+')'
+
+    def __repr__(self):
+        """
+        Returns an unambiguous string representation of this pixel.
+        """
+        return 'Pixel'+str(self)
+
+    def rgba(self):
+        """
+        Returns a 4-element tuple with the red, green, blue and alpha values.
+        """
+        return tuple(self._data[self._col].tolist())
+
+
+class PixelRow(object):
+    """
+    An instance is a view of a single row in a PixelBuffer.
+
+    A row supports len(row), row[c] and iteration, just like a list of RGB objects.
+    It does not support the list methods that change the size of the row.
+    """
+    __slots__ = ('_data',)
+
+    def __init__(self, data):
+        """
+        Initializes a view of the given row data.
+
+        Parameter data: The row of the buffer
+        Precondition: data is a numpy array of shape width x 4
+        """
+        self._data = data
+
+    def __len__(self):
+        """
+        Returns the number of pixels in this row.
+        """
+        return self._data.shape[0]
+
+    def __getitem__(self, col):
+        """
+        Returns the Pixel at the given column.
+
+        Parameter col: The column index
+        Precondition: col is an int
+        """
+        if col < 0:
+            col += self._data.shape[0]
+        if col < 0 or col >= self._data.shape[0]:
+            raise IndexError('pixel index out of range')
+        return Pixel(self._data,col)
+
+    def __iter__(self):
+        """
+        Returns an iterator over the pixels in this row.
+        """
+        for col in range(self._data.shape[0]):
+            yield Pixel(self._data,col)
+
+
+class PixelBuffer(object):
+    """
+    An instance is an image stored as one contiguous block of RGBA bytes.
+
+    The pixel data is the attribute array, a numpy array of unsigned bytes with shape
+    height x width x 4.  The expression image[r][c] returns a Pixel view of the data
+    at row r and column c, so a PixelBuffer can be used anywhere a 2d table of RGB
+    objects is expected (except for code that adds or removes rows).
+
+    Geometric operations (flip and transpose) do not move any pixels.  They replace 
+    array with a view that remaps the row and column indices of the same data, so 
+    a chain of them costs almost nothing and the image stays a single copy.  The 
+    pixels are only put back in order when the raw bytes are needed, such as when 
+    the image is saved (see tobytes and materialize).
+
+    A PixelBuffer may also hold just a band of rows from a larger image, when pictool
+    processes an image a band at a time.  In that case the attribute band records 
+    where the rows came from, so that plugins that depend on the position of a pixel
+    (like vignette) can find it.  Use the function extent to get this information.
+
+    Attribute array: The pixel data
+    Invariant: array is a numpy array of uint8 with shape height x width x 4
+
+    Attribute band: The first row of this band and the height of the full image
+    Invariant: band is None or a tuple of two ints (top, total)
+    """
+
+    @property
+    def width(self):
+        """
+        The number of columns in this image.
+        """
+        return self.array.shape[1]
+
+    @property
+    def height(self):
+        """
+        The number of rows in this image.
+        """
+        return self.array.shape[0]
+
+    @classmethod
+    def frombytes(cls, width, height, data):
+        """
+        Returns a new PixelBuffer holding a copy of the given RGBA bytes.
+
+        Parameter width: The image width
+        Precondition: width is an int > 0
+
+        Parameter height: The image height
+        Precondition: height is an int > 0
+
+        Parameter data: The pixels in row-major order, 4 bytes per pixel
+        Precondition: data is a bytes-like object of length width*height*4
+        """
+        array = numpy.frombuffer(data,dtype=numpy.uint8).reshape(height,width,4)
+        return cls(array.copy())
+
+    @classmethod
+    def fromtable(cls, table):
+        """
+        Returns a new PixelBuffer with the same pixels as a 2d table of RGB objects.
+
+        Parameter table: The image to copy
+        Precondition: table is a 2d table of RGB objects
+        """
+        array = numpy.array([[pixel.rgba() for pixel in row] for row in table],dtype=numpy.uint8)
+        return cls(array)
+
+    def __init__(self, array, band=None):
+        """
+        Initializes a buffer wrapping the given pixel array.
+
+        The array is not copied, so changes to the buffer are visible in the array.
+
+        Parameter array: The pixel data
+        Precondition: array is a numpy array of uint8 with shape height x width x 4
+
+        Parameter band: The first row of this band and the height of the full image
+        Precondition: band is None or a tuple of two ints (top, total)
+        """
+        self.array = array
+        self.band  = band
+
+    def __len__(self):
+        """
+        Returns the number of rows in this image.
+        """
+        return self.array.shape[0]
+
+    def __getitem__(self, row):
+        """
+        Returns a view of the given row.
+
+        Parameter row: The row index
+        Precondition: row is an int
+        """
+        if row < 0:
+            row += self.array.shape[0]
+        if row < 0 or row >= self.array.shape[0]:
+            raise IndexError('row index out of range')
+        return PixelRow(self.array[row])
+
+    def __iter__(self):
+        """
+        Returns an iterator over the rows of this image.
+        """
+        for row in range(self.array.shape[0]):
+            yield PixelRow(self.array[row])
+
+    def __copy__(self):
+        """
+        Returns a copy of this buffer with its own pixel data.
+        """
+        return PixelBuffer(self.array.copy(),self.band)
+
+    def __deepcopy__(self, memo):
+        """
+        Returns a copy of this buffer with its own pixel data.
+
+        This allows plugins to call copy.deepcopy on a buffer, the same as on a table.
+
+        Parameter memo: The deepcopy memo dictionary
+        Precondition: memo is a dict
+        """
+        return self.__copy__()
+
+    def copy(self):
+        """
+        Returns a copy of this buffer with its own pixel data.
+        """
+        return self.__copy__()
+
+    def tobytes(self):
+        """
+        Returns the pixels as RGBA bytes in row-major order.
+
+        The bytes are always in order, even if the array is a flipped or transposed
+        view.
+        """
+        return self.array.tobytes()
+
+    def totable(self):
+        """
+        Returns a 2d table of RGB objects with the same pixels as this buffer.
+        """
+        import introcs
+        return [[introcs.RGB(*pixel) for pixel in row] for row in self.array.tolist()]
+
+    def flip(self, vertical=False):
+        """
+        Reflects this image horizontally, or vertically if vertical is True.
+
+        No pixels are copied.  The array becomes a view of the same data with the 
+        rows (or columns) in reverse order.
+
+        Parameter vertical: Whether to reflect the image vertically
+        Precondition: vertical is a bool
+        """
+        if vertical:
+            self.array = self.array[::-1]
+        else:
+            self.array = self.array[:,::-1]
+
+    def transpose(self):
+        """
+        Transposes this image, swapping rows and columns.
+
+        No pixels are copied.  The array becomes a view of the same data with the row
+        and column strides swapped.
+        """
+        self.array = self.array.transpose(1,0,2)
+
+    def materialize(self):
+        """
+        Rearranges the pixel data so that it is stored in row-major order.
+
+        After flip or transpose, the array is a view that remaps the indices of the 
+        original data.  This is fine for any code that reads and writes pixels, but
+        code that needs the raw bytes in order (such as tobytes) must rearrange them.
+        This method does that once, and does nothing if the data is already in order.
+        """
+        if not self.array.flags.c_contiguous:
+            self.array = numpy.ascontiguousarray(self.array)
@@ -0,0 +1,333 @@
+"""
+Decoded pixel cache for the pictool.
+
+Decoding a PNG file means inflating all of its compressed data, which is the slowest
+part of loading an image.  When the same images are processed over and over (with a
+different plugin each time), that work is repeated every time.  This module keeps the
+decoded RGBA pixels of each image in a cache folder, so that later runs can skip the
+decoding entirely.
+
+Each image is cached as a numpy .npy file, which is a small header followed by the
+raw pixels.  Instead of reading that file, a cached image is memory-mapped (see the
+module mmap): the pixels are only loaded from disk as they are used, and usually come
+straight from the operating system's file cache.  The mapping is copy-on-write, so a
+plugin can change the pixels without changing the cache.
+
+An entry is found by the path of the image along with its modification time and
+size, so changing an image makes its old entry unused.  Unused entries are removed
+when the cache grows larger than CACHE_LIMIT bytes, starting with the entries used
+least recently.
+
+Author: Michael Dickey
+Date: Oct 18 2026
+"""
+import hashlib
+import numpy
+import os
+import tempfile
+
+
+# The folder holding the cached images
+CACHE_DIR = os.path.join(os.path.expanduser('~'),'.cache','pictool','pixels')
+
+# The largest total size of the cached images, in bytes
+CACHE_LIMIT = 1 << 31
+
+
+def entry_name(file):
+    """
+    Returns the name of the cache entry for the given image file.
+
+    The name depends on the full path of the file, its modification time and its
+    size.  This function raises an OSError if the file does not exist.
+
+    Parameter file: The image file
+    Precondition: file is a string
+    """
+    info = os.stat(file)
+    key  = '%s\0%d\0%d' % (os.path.realpath(file),info.st_mtime_ns,info.st_size)
+    return os.path.join(CACHE_DIR,hashlib.sha1(key.encode()).hexdigest()+'.npy')
+
+
+def lookup(file):
+    """
+    Returns the cached pixels of the given image file, or None if they are not cached.
+
+    The result is a copy-on-write memory map of the pixels: a numpy array of uint8 with
+    shape height x width x 4.  Changing the array does not change the cache.
+
+    Parameter file: The image file
+    Precondition: file is a string
+    """
+    try:
+        name = entry_name(file)
+        array = numpy.load(name,mmap_mode='c')
+    except (OSError, ValueError):
+        return None
+
+    if array.dtype != numpy.uint8 or array.ndim != 3 or array.shape[2] != 4:
+        return None
+
+    # Mark the entry as recently used
+    try:
+        os.utime(name)
+    except OSError:
+        pass
+    return array
+
+
+class Entry(object):
+    """
+    An instance is a new cache entry that is being written.
+
+    The pixels are written to a temporary file, which only becomes the cache entry
+    when commit is called.  So a reader never sees a half-written entry, even if the
+    writer fails.
+
+    Attribute array: The pixels to fill in
+    Invariant: array is a writable numpy memory map of uint8 with shape height x width x 4
+    """
+
+    def __init__(self, file, width, height):
+        """
+        Creates a new (empty) cache entry for an image of the given size.
+
+        Parameter file: The image file
+        Precondition: file is a string naming an existing file
+
+        Parameter width: The image width
+        Precondition: width is an int > 0
+
+        Parameter height: The image height
+        Precondition: height is an int > 0
+        """
+        os.makedirs(CACHE_DIR,exist_ok=True)
+        self._name = entry_name(file)
+        handle, self._temp = tempfile.mkstemp(suffix='.tmp',dir=CACHE_DIR)
+        os.close(handle)
+        self.array = numpy.lib.format.open_memmap(self._temp,mode='w+',dtype=numpy.uint8,
+                                                  shape=(height,width,4))
+
+    def commit(self):
+        """
+        Finishes the entry, making it available to lookup.
+
+        If the cache is now larger than CACHE_LIMIT, the least recently used entries
+        are removed (see evict).
+        """
+        self.array.flush()
+        self.array = None
+        os.replace(self._temp,self._name)
+        evict(keep=self._name)
+
+    def discard(self):
+        """
+        Abandons the entry, removing its temporary file.
+        """
+        self.array = None
+        try:
+            os.remove(self._temp)
+        except OSError:
+            pass
+
+
+def create(file, width, height):
+    """
+    Returns a new cache Entry for the given image file, or None if it cannot be cached.
+
+    An image is not cached if it is larger than CACHE_LIMIT, or if the cache folder
+    cannot be written.
+
+    Parameter file: The image file
+    Precondition: file is a string
+
+    Parameter width: The image width
+    Precondition: width is an int > 0
+
+    Parameter height: The image height
+    Precondition: height is an int > 0
+    """
+    if width*height*4 > CACHE_LIMIT:
+        return None
+    try:
+        return Entry(file,width,height)
+    except OSError:
+        return None
+
+
+def store(file, array):
+    """
+    Adds the pixels of the given image file to the cache.
+
+    Parameter file: The image file
+    Precondition: file is a string
+
+    Parameter array: The decoded pixels
+    Precondition: array is a numpy array of uint8 with shape height x width x 4
+    """
+    entry = create(file,array.shape[1],array.shape[0])
+    if entry is None:
+        return
+    try:
+        entry.array[:] = array
+        entry.commit()
+    except OSError:
+        entry.discard()
+
+
+def evict(limit=None, keep=None, folder=None, suffix='.npy'):
+    """
+    Removes the least recently used entries until the cache is at most limit bytes.
+
+    An entry is used when it is created or looked up, which sets its modification
+    time.  The folder and suffix let other caches (see the module resultcache) use
+    the same policy.
+
+    Parameter limit: The largest total size of the entries (CACHE_LIMIT if None)
+    Precondition: limit is an int >= 0 or None
+
+    Parameter keep: An entry that must not be removed (or None)
+    Precondition: keep is a string or None
+
+    Parameter folder: The cache folder (CACHE_DIR if None)
+    Precondition: folder is a string or None
+
+    Parameter suffix: The file suffix of the entries
+    Precondition: suffix is a string
+    """
+    limit  = CACHE_LIMIT if limit is None else limit
+    folder = CACHE_DIR if folder is None else folder
+    entries = []
+    total = 0
+    for name in os.listdir(folder):
+        if not name.endswith(suffix):
+            continue
+        path = os.path.join(folder,name)
+        try:
+            info = os.stat(path)
+        except OSError:
+            continue
+        entries.append((info.st_mtime,path,info.st_size))
+        total += info.st_size
+
+    entries.sort()
+    for (used, path, size) in entries:
+        if total <= limit:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+class Reader(object):
+    """
+    An instance reads the rows of a cached image in order, a band at a time.
+
+    This has the same attributes and methods as pngstream.PNGReader, so that a cached
+    image can be streamed in the same way as a PNG file.
+
+    Attribute width: The image width
+    Invariant: width is an int > 0
+
+    Attribute height: The image height
+    Invariant: height is an int > 0
+
+    Attribute row: The number of rows read so far
+    Invariant: row is an int between 0 and height, inclusive
+    """
+
+    def __init__(self, array):
+        """
+        Initializes a reader for the given cached pixels.
+
+        Parameter array: The cached pixels (see lookup)
+        Precondition: array is a numpy array of uint8 with shape height x width x 4
+        """
+        self._array = array
+        self.height = array.shape[0]
+        self.width  = array.shape[1]
+        self.row = 0
+
+    def read(self, count):
+        """
+        Returns the next count rows of the image as an array of RGBA bytes.
+
+        Parameter count: The number of rows to read
+        Precondition: count is an int >= 0
+        """
+        result = numpy.array(self._array[self.row:self.row+count])
+        self.row += len(result)
+        return result
+
+    def close(self):
+        """
+        Releases the cached pixels.
+        """
+        self._array = None
+
+
+class Recorder(object):
+    """
+    An instance reads the rows of a PNG file in order, adding them to the cache.
+
+    This wraps a pngstream.PNGReader, and has the same attributes and methods.  Each
+    band that is read is also written to a cache Entry.  When the reader is closed,
+    the entry is committed if every row was read, and discarded otherwise.
+
+    Attribute width: The image width
+    Invariant: width is an int > 0
+
+    Attribute height: The image height
+    Invariant: height is an int > 0
+
+    Attribute row: The number of rows read so far
+    Invariant: row is an int between 0 and height, inclusive
+    """
+
+    def __init__(self, reader, entry):
+        """
+        Initializes a recorder for the given reader and cache entry.
+
+        Parameter reader: The PNG reader
+        Precondition: reader is a pngstream.PNGReader that has not read any rows
+
+        Parameter entry: The cache entry for the file
+        Precondition: entry is an Entry the same size as the image
+        """
+        self._reader = reader
+        self._entry  = entry
+        self.width  = reader.width
+        self.height = reader.height
+        self.row = 0
+
+    def read(self, count):
+        """
+        Returns the next count rows of the image as an array of RGBA bytes.
+
+        Parameter count: The number of rows to read
+        Precondition: count is an int >= 0
+        """
+        result = self._reader.read(count)
+        self._entry.array[self.row:self.row+len(result)] = result
+        self.row += len(result)
+        return result
+
+    def close(self):
+        """
+        Closes the file, and commits (or discards) the cache entry.
+        """
+        self._reader.close()
+        if self._entry is None:
+            return
+        try:
+            if self.row == self.height:
+                self._entry.commit()
+            else:
+                self._entry.discard()
+        except OSError:
+            self._entry.discard()
+        self._entry = None
@@ -18,115 +18,167 @@ Author: Michael Dickey
 Date: Feb 22 2022
 """
 
-import copy 
-import math
+import convolution
+import imagestats
+import lut
+import numpy
+import pixelbuffer
+import vectorized
+
+
+# The plugins that pictool may run on one band of rows at a time (see pictool.py).
+# Each value is the number of extra rows the plugin needs above and below a band to 
+# compute it, or the name of the option giving that number, or a tuple of option names
+# (the first one that is not None gives the number).  A plugin that looks at one pixel
+# at a time needs no extra rows.  A pixellate block can be cut by the edge of a band,
+# so pixellate needs a block height of extra rows.
+TILE_SAFE = {'dered':0, 'mono':0, 'vignette':0, 'blur':'radius', 'gaussian':'radius',
+             'pixellate':('step_y','step')}
+
+# The plugins that replace the rows of a table of RGB objects with new rows.  pictool 
+# checks every pixel of an image after these (see pictool.verify_image), since a new 
+# row could hold anything.
+NEW_ROWS = ('transpose', 'rotate')
 
 
 # Function useful for debugging
-def display(image):
+def display(image,region=None,max_cells=1024):
     """
-    Returns False after pretty printing the image pixels, one pixel per line.
+    Returns False after pretty printing the image pixels, one row of pixels at a time.
     
     All plug-in functions must return True or False.  This function returns False 
     because it displays information about the image, but does not modify it.
     
     You can use this function to look at the pixels of a file and see whether the 
     pixel values are what you expect them to be.  This is helpful to analyze a file
-    after you have processed it.
+    after you have processed it.  Each row of pixels is printed as four lists, with 
+    the red, green, blue and alpha values of the pixels in that row.
+    
+    A large image has far too many pixels to print.  The region picks the rows and 
+    columns to print, as two ranges 'r0:r1,c0:c1' like Python slices.  For example, 
+    '0:8,100:108' is the 8 x 8 block of pixels starting at row 0 and column 100, and
+    ':,0:1' is the first column.  At most max_cells pixels are printed: if the region
+    is larger than that, only its first rows (and columns) are printed, with a note 
+    saying so.
     
     Parameter image: The image buffer
-    Precondition: image is a 2d table of RGB objects
+    Precondition: image is a PixelBuffer or a 2d table of RGB objects
+    
+    Parameter region: The rows and columns to print (None for the whole image)
+    Precondition: region is None or a string 'r0:r1,c0:c1' with int (or empty) bounds
+    
+    Parameter max_cells: The most pixels to print
+    Precondition: max_cells is an int > 0
     """
+    assert type(max_cells) == int and max_cells > 0, 'The max cells must be an int > 0'
     height = len(image)
     width  = len(image[0])
+    window = _window(region,height,width)
+    assert type(window) != str, window
+    top, bottom, left, right = window
+    
+    # Only format the pixels that will be printed
+    shown = right-left
+    if (bottom-top)*shown > max_cells:
+        shown = min(shown,max_cells)
+        bottom = top+max(max_cells//shown,1)
+        right  = left+shown
+    
+    if isinstance(image,pixelbuffer.PixelBuffer):
+        values = image.array[top:bottom,left:right].tolist()
+    else:
+        values = [[pixel.rgba() for pixel in image[row][left:right]] for row in range(top,bottom)]
     
-    # Find the maximum string size for padding
-    maxsize = 0
-    for row in image:
-        for pixel in row:
-            text = repr(pixel)
-            if len(text) > maxsize:
-                maxsize = len(text)
-    
-    # Pretty print the pixels
+    # pretty print pixels my way
+    ## prints an output like this for each row
+    """
+    ['R255', 'R255']
+    ['G0  ', 'G0  ']
+    ['B0  ', 'B0  ']
+    ['A255', 'A0  ']
+    """
+    labels = [[letter+str(value).ljust(3) for value in range(256)] for letter in 'RGBA']
+    print()
+    if window != (top,bottom,left,right):
+        print('Showing rows %d:%d and columns %d:%d of %d:%d,%d:%d (see --max-cells)' % 
+              ((top,bottom,left,right)+window))
     print()
+    for row in values:
+        for channel in range(4):
+            print([labels[channel][pixel[channel]] for pixel in row])
+        print("")
     
+    # This function does not modify the image
+    return False
+
+
+def _window(region,height,width):
     """
-    for pos1 in range(height):
-        row = image[pos1]
-        for pos2 in range(width):
-            pixel = row[pos2]
-            
-            middle = repr(pixel)
-            padding = maxsize-len(middle)
-            
-            prefix = '      '
-            if pos1 == 0 and pos2 == 0:
-                prefix = '[  [  '
-            elif pos2 == 0:
-                prefix = '   [  '
-            
-            suffix = ','
-            if pos1 == height-1 and pos2 == width-1:
-                suffix = (' '*padding)+' ]  ]'
-            elif pos2 == width-1:
-                suffix = (' '*padding)+' ],'
-            
-            print(prefix+middle+suffix)
+    Returns the tuple (top, bottom, left, right) of the given region of an image.
+    
+    The region is two ranges 'r0:r1,c0:c1', for the rows and the columns.  As for 
+    Python slices, a missing bound is the start or end of the image, a negative bound
+    counts from the end, and the bounds are clamped to the image.  If the region is
+    not valid, or has no pixels, this function returns an error message instead.
+    
+    Parameter region: The region (None for the whole image)
+    Precondition: region is any value
+    
+    Parameter height: The image height
+    Precondition: height is an int > 0
+    
+    Parameter width: The image width
+    Precondition: width is an int > 0
     """
-
-    # pretty print pixels my way
-    ## prints an output like this for each row
+    if region is None:
+        return (0,height,0,width)
+    
+    error = 'The region must have the form r0:r1,c0:c1, not '+repr(region)
+    if type(region) != str or region.count(',') != 1:
+        return error
+    
+    result = []
+    for (text, size) in zip(region.split(','),(height,width)):
+        bounds = text.strip().split(':')
+        if len(bounds) != 2:
+            return error
+        try:
+            bounds = [None if bound.strip() == '' else int(bound) for bound in bounds]
+        except ValueError:
+            return error
+        start, stop, step = slice(*bounds).indices(size)
+        if start >= stop:
+            return 'The region '+repr(region)+' has no pixels in a '+str(height)+'x'+str(width)+' image'
+        result.extend([start,stop])
+    return tuple(result)
+
+
+def stats(image,bins=16):
     """
-    R 255   R 255
-    G 0     G 0
-    B 0     B 0
-    A 255   A 0
+    Returns False after printing statistics about the image.
+    
+    This prints the size of the image, the number of different colors, the smallest,
+    largest and average value of each channel, and a histogram of each channel (see
+    the module imagestats).  Unlike display, it works on images of any size, since it
+    does not print the pixels themselves.  Like display, it does not modify the image.
+    
+    Parameter image: The image buffer
+    Precondition: image is a PixelBuffer or a 2d table of RGB objects
+    
+    Parameter bins: The number of bars in each histogram
+    Precondition: bins is an int that divides 256 (1, 2, 4, ..., 256)
     """
+    assert type(bins) == int and bins > 0 and 256 % bins == 0, 'The bins must be an int that divides 256'
+    if isinstance(image,pixelbuffer.PixelBuffer):
+        array = image.array
+    else:
+        array = numpy.array([[pixel.rgba() for pixel in row] for row in image],dtype=numpy.uint8)
+    
     print()
-    for pos1 in range(height):
-        row = image[pos1]
-        this_row_reds = []
-        this_row_greens = []
-        this_row_blues = []
-        this_row_alphas = []  
-        for pos2 in range(width):
-            pixel = row[pos2]
-            #print(type(pixel))
-            #print(repr(pixel))
-            # get red
-            
-            # gets pixels as string, incrases length with spaces to line it all up
-            this_pixel_red = "R" + str(pixel.red)
-            while len(this_pixel_red) < 4:
-                this_pixel_red = this_pixel_red + " "
-            this_pixel_green = "G" + str(pixel.green)
-            while len(this_pixel_green) < 4:
-                this_pixel_green = this_pixel_green + " "
-            this_pixel_blue = "B" + str(pixel.blue)
-            while len(this_pixel_blue) < 4:
-                this_pixel_blue = this_pixel_blue + " "
-            this_pixel_alpha = "A" + str(pixel.alpha)
-            while len(this_pixel_alpha) < 4:
-                this_pixel_alpha = this_pixel_alpha = " "
-            
-            #print("R",this_pixel_red)
-            this_row_reds.append(this_pixel_red)
-            #print("G",this_pixel_green)
-            this_row_greens.append(this_pixel_green)
-            #print("B",this_pixel_blue)
-            this_row_blues.append(this_pixel_blue)
-            #print("A",this_pixel_alpha)
-            this_row_alphas.append(this_pixel_alpha)
-
-        print(this_row_reds)
-        print(this_row_greens)
-        print(this_row_blues)
-        print(this_row_alphas)
-        print("")
+    print(imagestats.summary(imagestats.measure(array),bins))
     
     # This function does not modify the image
-    return
+    return False
 
 
 # Example function illustrating image manipulation
@@ -136,22 +188,14 @@ def dered(image):
     
     All plug-in functions must return True or False.  This function returns True 
     because it modifies the image. This function sets the red value to 0 for every 
-    pixel in the image.
+    pixel in the image.  It does this with a tone curve that maps every red value to
+    0 (see the module lut).
     
     Parameter image: The image buffer
     Precondition: image is a 2d table of RGB objects
     """
-    # Get the image size
-    height = len(image)
-    width  = len(image[0])
-    
-    for row in range(height):
-        for col in range(width):
-            pixel = image[row][col]
-            pixel.red = 0
-    
     # This function DOES modify the image
-    return True
+    return lut.apply(image,(lut.constant(0),None,None))
 
 
 # IMPLEMENT THESE FOUR FUNCTIONS
@@ -174,6 +218,10 @@ def mono(image, sepia=False):
     If sepia is True, it makes the same computations as before but sets green to
     0.6 * brightness and blue to 0.4 * brightness.
     
+    The new values are looked up in the brightness tables of the module lut (see
+    lut.apply_brightness), indexed by 3 * red + 6 * green + blue, rather than computed.
+    The results are the same as computing them with floats.
+    
     Parameter image: The image buffer
     Precondition: image is a 2d table of RGB objects
     
@@ -189,40 +237,7 @@ def mono(image, sepia=False):
         sepia_valid = True 
     assert sepia_valid == True, "Sepia must be 'True' or 'False'"
 
-    # Get the image size
-    height = len(image)
-    width  = len(image[0])
-
-    for row in range(height):
-        for col in range(width):
-            
-            if sepia == False:
-                #print()
-                pixel = image[row][col]
-                #print("R", pixel.red, "G", pixel.green, "B", pixel.blue)
-                brightness = 0.3 * pixel.red + 0.6 * pixel.green + 0.1 * pixel.blue
-                #print("brightness is: ", brightness)
-                #update each pixel
-                pixel.red = int(brightness)
-                pixel.green = int(brightness)
-                pixel.blue = int(brightness)
-                #print("R", pixel.red, "G", pixel.green, "B", pixel.blue)
-
-            if sepia == True:
-                pixel = image[row][col]
-                brightness = 0.3 * pixel.red + 0.6 * pixel.green + 0.1 * pixel.blue
-                """
-                If sepia is True, it makes the same computations as before but sets green to
-                0.6 * brightness and blue to 0.4 * brightness.
-                """
-                pixel.red = int(brightness)
-                pixel.green = int(0.6 * brightness)
-                pixel.blue = int(0.4 * brightness)
-                
-
-
-    # Change this to return True when the function is implemented
-    return True 
+    return lut.apply_brightness(image,lut.SEPIA_CURVES if sepia else lut.GREY_CURVES)
 
 
 def flip(image,vertical=False):
@@ -249,64 +264,21 @@ def flip(image,vertical=False):
         vertical_valid = True 
     assert vertical_valid == True, "Vertical must be 'True' or 'False'"
 
+    # a PixelBuffer reflects its own pixel data in one step
+    if isinstance(image,pixelbuffer.PixelBuffer):
+        image.flip(vertical)
+        return True
 
-    # get length and width
-    height = len(image)
-    width  = len(image[0])
-   
     # flip horizontal
+    ## reversing each row moves the RGB objects, so no pixels are copied
     if vertical == False:
-
-        #print()
-        for row in range(height):
-
-            # get backup of current row
-            current_row = image[row]
-            current_row_flipped = copy.deepcopy(current_row)        
-            current_row_flipped.reverse()
-            
-            for col in range(width):
-         
-                #iterage through pixels and overwrite with values from flipped backup
-                pixel = image[row][col]
-                flip_source_pixel = current_row_flipped[col]
-                
-                #update each pixel color with color from flip source pixel backup
-                pixel.red = flip_source_pixel.red 
-                pixel.green = flip_source_pixel.green 
-                pixel.blue = flip_source_pixel.blue 
-                pixel.alpha = flip_source_pixel.alpha
+        for row in image:
+            row.reverse()
 
     #flip vertical
+    ## reversing the table moves the rows, so no pixels are copied
     if vertical == True:
-        #print()
-        #print("running flipping vertically")
-        
-        #copy image
-        image_copy = copy.deepcopy(image)
-
-        for row in range(height):
-
-            #print("processing row: ", row)
-
-            for col in range(width):
-
-                #this pixel
-                pixel = image[row][col]
-                #print("row is: ", row, "col is: ", col, "pixel is: ", pixel)
-
-                #determine what pixel should replace this one
-                replace_by_row = abs((height-1) - row)
-                replace_by_pixel = image_copy[replace_by_row][col]
-                #print(" replace_by_row is: ", replace_by_row, "replace by pixel is: ", replace_by_pixel)
-
-                #update pixel values
-                pixel.red = replace_by_pixel.red 
-                pixel.green = replace_by_pixel.green 
-                pixel.blue = replace_by_pixel.blue 
-                pixel.alpha = replace_by_pixel.alpha 
-                #print("  pixel is now, ", pixel)
-
+        image.reverse()
 
     # Change this to return True when the function is implemented
     return True
@@ -322,71 +294,25 @@ def transpose(image):
     Transposing is tricky because you cannot just change the pixel values; you have
     to change the size of the image table.  A 10x20 image becomes a 20x10 image.
     
-    The easiest way to transpose is to make a transposed copy with the pixels from
+    The easiest way to transpose is to make a transposed table with the pixels from
     the original image.  Then remove all the rows in the image and replace it with
-    the rows from the transposed copy.
+    the rows from the transposed table.  The RGB objects themselves are not copied.
     
     Parameter image: The image buffer
     Precondition: image is a 2d table of RGB objects
     """
    
-    #get height and width 
-    #print()
-    height = len(image)
-    width  = len(image[0])
-    #print("height is: ", height, "width is: ", width)
-   
-    #copy image
-    image_copy = []
-    #print("image_copy len", len(image_copy))
-
-    # populate image_copy list with transposed dimensions
-    for index in range(width):
-        image_copy.append([])
-        for count in range(height):
-            image_copy[index].append(count)
-
-    # copy the pixels to the copy list in new row + col position
-    for row_index in range(height):     
-        #print(" row_index is ", row_index)
-        for col_index in range(width):
-            #print(" col_index is: ", col_index)
+    # a PixelBuffer transposes its own pixel data in one step
+    if isinstance(image,pixelbuffer.PixelBuffer):
+        image.transpose()
+        return True
 
-            # this pixel
-            pixel = image[row_index][col_index]
-            #print("  row is: ", row_index, "col is: ", col_index, "pixel is: ", pixel)
-
-            #determine what pixel should replace this one
-            copy_to_row = col_index
-            copy_to_col = row_index
-            
-            image_copy[col_index][row_index] = image[row_index][col_index]
+    # build the transposed table from the columns of the image
+    ## this only moves references to the RGB objects, so no pixels are copied
+    transposed = [list(column) for column in zip(*image)]
 
-    #print("image_copy is ", image_copy)
-
-    # clear the original image list and populate it with the transposed copy
-    ## clear original image
-    image.clear()
-    #print("image is: ", image)
-
-    ## get new widths and heights from transposed img
-    height = len(image_copy)
-    width = len(image_copy[0])
-    #print("height is: ", height, "width is: ", width)
-    
-    # populate recreated image list with transposed dimensions
-    for index in range(height):
-        image.append([])
-        for count in range(width):
-            image[index].append(count)
-    #print("image height is: ", len(image), "image width is: ", len(image[0]))
-
-    # repopulate cleared image with all values from transposed image_copy
-    for row_index in range(height):
-        for col_index in range(width):
-            #print("row_index is: ", row_index, "col_index is: ", col_index)
-            image[row_index][col_index] = image_copy[row_index][col_index]
-            #print("image is: ", image)
+    # replace the rows in the image with the rows from the transposed table
+    image[:] = transposed
 
     # Change this to return True when the function is implemented
     return True
@@ -462,37 +388,32 @@ def vignette(image):
     vignette an image, multiply each NON-ALPHA color value by its vignette factor.
     The alpha value should be left untouched.
     
+    The vignette factors only depend on the size of the image, so they are computed
+    once for each size and kept (see vectorized.mask_rows).
+    
     Parameter image: The image buffer
     Precondition: image is a 2d table of RGB objects
     """
     
     #get image specs    
     #print()
-    height = len(image)
+    ## the image may be a band of a larger image, so measure from the full image
+    top, height = pixelbuffer.extent(image)
     width  = len(image[0])
     #print("height is: ", height, "width is: ", width)
-    center_h = height/2
-    center_w = width/2
-    #print("center_h is: ", center_h, "center_w is: ", center_w)
 
-    #compute distance from center to corner
-    distance_to_corner = math.sqrt((abs(center_h - 0)*abs(center_h - 0)) + (abs(center_w - 0)*abs(center_w - 0)))
-    #print("distance_to_corner is: ", distance_to_corner)
+    #look up the vignette factors 1 - (d / H)^2 for these rows
+    factors = vectorized.mask_rows(height,width,top,len(image))
 
-    for row_index in range(height):
+    for row_index in range(top,top+len(image)):
 
+        row_factors = factors[row_index-top].tolist()
         for col_index in range(width):
 
-            pixel = image[row_index][col_index]
+            pixel = image[row_index-top][col_index]
             #print(" row is: ", row_index, "col is: ", col_index, "pixel is: ", pixel)
 
-            #compute distance from center to current pixel
-            distance_from_center = math.sqrt((abs(center_h - row_index)*abs(center_h - row_index)) + (abs(center_w - col_index)*abs(center_w - col_index)))
-            #print("  distance_from_center is: ", distance_from_center)
-                       
-            #calculate vigette factor
-            vignette_factor = 1 - (distance_from_center / distance_to_corner)*(distance_from_center / distance_to_corner)
-            #1 - (d / H)^2
+            vignette_factor = row_factors[col_index]
             #print("  vignette_factor is: ", vignette_factor)
 
             #update each pixel by multiplying color channels by vignette factor
@@ -522,14 +443,16 @@ def blur(image,radius=1):
     at positions (0,0), (0,1), (0,2), (0,3), (1,0), (1,1), (1,2), (1,3), (2,0), (2,1), 
     (2,2), and (2,3).
     
-    This calculation MUST be done in a COPY.  Otherwise, you are using the blurred 
+    This calculation MUST be done from a COPY.  Otherwise, you are using the blurred 
     value in future pixel computations (e.g. when you try to blur the pixel to the 
-    right of it).  All averages must be computed from the original image.  Use the 
-    steps from transpose() to modify the image.
+    right of it).  All averages must be computed from the original image.
     
-    WARNING: This function is very slow (Adobe's programs use much more complicated
-    algorithms and are not written in Python).  Blurring 'Walker.png' with a radius 
-    of 30 can take up to 10 minutes.
+    Adding up every pixel in the box is very slow for large radii (blurring 'Walker.png'
+    with a radius of 30 this way can take 10 minutes).  So this function first builds a 
+    summed-area table of the original image: the entry at position (r,c) is the total 
+    of every pixel above and to the left of (r,c).  The total of any box is then the 
+    sum of its four corner entries (two added, two subtracted), and so the cost of each 
+    pixel does not depend on the radius.  The table is also the copy of the original.
     
     Parameter image: The image to blur
     Precondition: image is a 2d table of RGB objects
@@ -537,160 +460,54 @@ def blur(image,radius=1):
     Parameter radius: The blur radius
     Precondition: radius is an int > 0
     """
-    # We recommend enforcing the precondition for radius
-    # Change this to return True when the function is implemented
+    assert type(radius) == int and radius > 0, "Radius must be an int > 0"
     
     # get image specs
     height = len(image)
     width  = len(image[0])
-    print()
-    print("height is: ", height, "width is: ", width, "radius is: ", radius)
-
-    # create a copy of the image
-    image_copy = copy.deepcopy(image)
-
-    # loop over all pixels
-    print()
-
+    
+    # build the summed-area table, one table per channel (red, green, blue, alpha)
+    # each table has an extra row and column of zeros at the top and left
+    tables = [[[0]*(width+1)] for channel in range(4)]
     for row_index in range(height):
-
+        row = image[row_index]
+        running = [0,0,0,0]
+        for channel in range(4):
+            tables[channel].append([0])
+        
         for col_index in range(width):
-
-            # get the current pixel
-            pixel = image_copy[row_index][col_index]
-            print("row_index:", row_index, "col_index:", col_index, "pixel:", pixel)
-
-            #print("pixel.red is: ", pixel.red)
-            #print("pixel.green is: ", pixel.green)
-            #print("pixel.blue is: ", pixel.blue)
-            #print("pixel.alpha is: ", pixel.alpha)
-            
-            # get the average of the pixel
-            pixel_average = int((pixel.red + pixel.green + pixel.blue + pixel.alpha) / 4)
-            #print("pixel_average is: ", pixel_average)
-
-            # get the average of all the pixels in the box
-            pixel_average_box = 0
-            red_average_box = 0
-            blue_average_box = 0
-            green_average_box = 0
-            alpha_average_box = 0
-
-            # loop over postive positive radius
+            values = row[col_index].rgba()
+            for channel in range(4):
+                running[channel] += values[channel]
+                table = tables[channel]
+                table[row_index+1].append(table[row_index][col_index+1]+running[channel])
+    
+    # average each box from the corners of the table, clamping the box to the image
+    for row_index in range(height):
+        top    = max(row_index-radius,0)
+        bottom = min(row_index+radius+1,height)
+        row = image[row_index]
+        
+        for col_index in range(width):
+            left  = max(col_index-radius,0)
+            right = min(col_index+radius+1,width)
+            count = (bottom-top)*(right-left)
             
-            box = []  #the list that will be made up of the points in the box to blur values from
-            red_average = 0
-            green_average = 0
-            blue_avareage = 0
-            alpha_average = 0
-            pixel_average = 0  
-
-            #if row_index == 2 and col_index == 2:           # just for testing
+            averages = []
+            for table in tables:
+                total = table[bottom][right]-table[top][right]-table[bottom][left]+table[top][left]
+                averages.append(total//count)
             
-            for box_row in range(radius+1):
-                #print("  box_row:", box_row, "radius:", radius)
-
-                for box_col in range(radius+1):                          
-                    # minus row, minus col
-                    #print("  ",(row_index - box_row), (col_index - box_col))  
-                    box_slot_row = (row_index - box_row)
-                    box_slot_col = (col_index - box_col)                      
-                    
-                    if (box_slot_row,box_slot_col) not in box:
-                        #print("   ", "1-box_slot_row", box_slot_row, "box_slot_col", box_slot_col, "not in box, appending")
-                        if box_slot_row >= 0 and box_slot_row < height:
-                            if box_slot_col >= 0 and box_slot_col < width:
-                                box.append((box_slot_row,box_slot_col))
-
-                                
-                                # get pixel info
-                                this_pixel = image[box_slot_row][box_slot_col]
-                                print(" row:", box_slot_row, "col:",box_slot_col, "this_pixel is:", this_pixel) 
-
-                                """
-                                here, working on getting the average of each pixel color but first
-                                making sure it grabs the correct pixels, not clear why output keeps showing (0,0,0,0) pixles
-                                """
-
-                                """
-                                row_index: 0 col_index: 1 pixel: (255,0,0,255)
-                                 row: 0 col: 1 this_pixel is: (255,0,0,255)
-                                 row: 0 col: 0 this_pixel is: (0,0,0,0)  <-- this is the problem
-                                  box is:  [(0, 0), (0, 1), (0, 2), (1, 0), (1, 1), (1, 2)]
-                                """
-                                
-
-                    # minus row, plus col
-                    ##print("  ",(row_index - box_row), (col_index + box_col))  
-                    box_slot_row = (row_index - box_row)
-                    box_slot_col = (col_index + box_col)
-
-                    if (box_slot_row,box_slot_col) not in box:
-                        #print("   ", "2-box_slot_row", box_slot_row, "box_slot_col", box_slot_col, "not in box, appending")
-                        if box_slot_row >= 0 and box_slot_row < height:
-                            if box_slot_col >= 0 and box_slot_col < width:
-                                box.append((box_slot_row,box_slot_col))
-                                #print("     box is:", box)
-
-                    
-                    
-                    # plus row, minus col
-                    ##print("  ",(row_index + box_row), (col_index - box_col))
-                    box_slot_row = (row_index + box_row)
-                    box_slot_col = (col_index - box_col)
-
-                    if (box_slot_row,box_slot_col) not in box:
-                        if box_slot_row >= 0 and box_slot_row < height:
-                            if box_slot_col >= 0 and box_slot_col < width:
-                                box.append((box_slot_row,box_slot_col))
-                                #print("     box is:", box)))
-                    
-                    
-                    # plus row, plus col
-                    ##print("  ",(row_index + box_row), (col_index + box_col))
-                    box_slot_row = (row_index + box_row)
-                    box_slot_col = (col_index + box_col)
-
-                    if (box_slot_row,box_slot_col) not in box:
-                        if box_slot_row >= 0 and box_slot_row < height:
-                            if box_slot_col >= 0 and box_slot_col < width:
-                                box.append((box_slot_row,box_slot_col))
-                                #print("     box is:", box)
-
-
-            box.sort()
-            print("  box is: ", box)
-
-
-            """
-            2,2
-            [1,1][1,2][1,3]
-            [2,1][2,2][2,3]
-            [3,1][3,2][3,3]
-            """
-
-
-            # assign the average to the pixel in the original
-            pixel_master = image[row_index][col_index]
-            pixel_master.red = pixel_average
-            pixel_master.green = pixel_average
-            pixel_master.blue = pixel_average
-            pixel_master.alpha = pixel_average
-
-
-    print()
-    print(" ORIGINAL IMAGE ")    
-    #display(image_copy)
+            pixel = row[col_index]
+            pixel.red   = averages[0]
+            pixel.green = averages[1]
+            pixel.blue  = averages[2]
+            pixel.alpha = averages[3]
     
-    print()
-    print(" MODIFIED IMAGE")
-    #display(image)
-
-    return False
-
+    return True
 
 
-def pixellate(image,step=10):
+def pixellate(image,step=10,step_x=None,step_y=None):
     """
     Returns True after pixellating the image.
     
@@ -717,12 +534,123 @@ def pixellate(image,step=10):
     
     Continue the process looping over rows and columns to get a pixellated image.
     
+    The blocks do not have to be square.  If step_x is given, each block is step_x
+    columns wide, and if step_y is given, each block is step_y rows tall.  Otherwise 
+    they are step.  Averages are truncated (as with blur).
+    
+    The blocks are lined up with the top of the full image.  So when the image is a 
+    band of a larger image (see pixelbuffer.extent), the first block of the band may
+    be shorter than step_y, and the result matches the same rows of the full image as
+    long as the band has step_y extra rows around it (see TILE_SAFE).
+    
     Parameter image: The image to pixelate
     Precondition: image is a 2d table of RGB objects
     
     Parameter step: The number of pixels in a pixellated block
     Precondition: step is an int > 0
+    
+    Parameter step_x: The block width (or None to use step)
+    Precondition: step_x is None or an int > 0
+    
+    Parameter step_y: The block height (or None to use step)
+    Precondition: step_y is None or an int > 0
     """
-    # We recommend enforcing the precondition for step
-    # Change this to return True when the function is implemented
-    return False
+    assert type(step) == int and step > 0, "Step must be an int > 0"
+    step_x = step if step_x is None else step_x
+    step_y = step if step_y is None else step_y
+    assert type(step_x) == int and step_x > 0, "Step_x must be an int > 0"
+    assert type(step_y) == int and step_y > 0, "Step_y must be an int > 0"
+    
+    # get image specs
+    height = len(image)
+    width  = len(image[0])
+    first  = pixelbuffer.extent(image)[0]
+    
+    for start in range(-(first % step_y),height,step_y):
+        top    = max(start,0)
+        bottom = min(start+step_y,height)
+        for left in range(0,width,step_x):
+            right = min(left+step_x,width)
+            count = (bottom-top)*(right-left)
+            
+            # add up the block, one channel at a time
+            totals = [0,0,0,0]
+            for row_index in range(top,bottom):
+                row = image[row_index]
+                for col_index in range(left,right):
+                    values = row[col_index].rgba()
+                    for channel in range(4):
+                        totals[channel] += values[channel]
+            
+            # assign the averages to every pixel in the block
+            for row_index in range(top,bottom):
+                row = image[row_index]
+                for col_index in range(left,right):
+                    pixel = row[col_index]
+                    pixel.red   = totals[0]//count
+                    pixel.green = totals[1]//count
+                    pixel.blue  = totals[2]//count
+                    pixel.alpha = totals[3]//count
+    
+    return True
+
+
+def convolve(image,kernel='sharpen'):
+    """
+    Returns True after filtering the image with a kernel.
+    
+    Each pixel is replaced by the weighted sum of the pixels around it, with the
+    weights given by the kernel (see the module convolution).  The kernel is either
+    one of the names 'sharpen', 'edge', 'emboss' and 'box', or its rows separated by
+    '/' with the weights separated by commas.  For example, 'box' is the same as
+    '1,1,1/1,1,1/1,1,1'.  The weights are divided by their total (unless it is 0), so
+    'box' averages each pixel with its 8 neighbors.
+    
+    Like blur, every sum is computed from the original image, and only the pixels 
+    inside the image are used at the edges.  The alpha channel is not changed, since 
+    sharpening or finding the edges of it would make the image partly transparent.
+    
+    Parameter image: The image to filter
+    Precondition: image is a 2d table of RGB objects
+    
+    Parameter kernel: The kernel name or weights
+    Precondition: kernel is a string naming a kernel, or rows of numbers (an odd 
+    number of rows, each with the same odd number of weights)
+    """
+    assert type(kernel) == str, 'The kernel must be a name or a list of weights'
+    try:
+        weights = convolution.parse(kernel)
+    except ValueError as error:
+        weights = str(error)
+    assert type(weights) != str, weights
+    
+    return convolution.apply(image,weights,3)
+
+
+def gaussian(image,radius=3,sigma=None):
+    """
+    Returns True after applying a Gaussian blur to the image.
+    
+    This is like blur, except that the pixels in the box are not weighted equally.  
+    The weight of each pixel falls off smoothly with its distance from the center (as
+    the bell curve exp(-d*d/(2*sigma*sigma))), which looks more natural than a box.
+    The kernel is separable, so the image is blurred down the columns and then along 
+    the rows (see the module convolution).
+    
+    As in blur, all four values (including alpha) are blurred, the box is clamped to
+    the image edges, and every sum is computed from the original image.
+    
+    Parameter image: The image to blur
+    Precondition: image is a 2d table of RGB objects
+    
+    Parameter radius: The blur radius
+    Precondition: radius is an int > 0
+    
+    Parameter sigma: The standard deviation of the weights (None for radius/3)
+    Precondition: sigma is a number > 0, or None
+    """
+    assert type(radius) == int and radius > 0, "Radius must be an int > 0"
+    assert sigma is None or (type(sigma) in [int,float] and sigma > 0), "Sigma must be a number > 0"
+    
+    weights = convolution.gaussian_weights(radius,sigma)
+    return convolution.apply(image,(weights,weights),4)
@@ -0,0 +1,530 @@
+"""
+Streaming PNG reader and writer for the pictool.
+
+The functions read_image and save_image in pictool.py decode and encode the whole
+image at once, so the memory they need grows with the size of the image.  This module
+reads and writes PNG files a band of rows at a time instead.  A PNGReader decodes only
+as many rows as are asked for, and a PNGWriter compresses and writes each band as soon
+as it is given.  With them, the memory needed to process an image is set by the size
+of a band, not the size of the image.
+
+A PNG file is a sequence of chunks.  The pixels are in the IDAT chunks, which together
+hold one zlib stream.  Decompressed, that stream is a sequence of rows, each starting
+with a filter byte that says how the row was encoded relative to the row before it.
+Because each row only depends on the row before, the stream can be decoded in order
+one row at a time.
+
+The reader supports 8-bit non-interlaced images, which is what nearly every tool
+writes.  Other images (16-bit, fewer than 8 bits per channel, or interlaced) must be
+loaded with read_image.  The function streamable tells the two apart.
+
+The formats are described in the PNG specification:
+
+    https://www.w3.org/TR/png/
+
+Author: Michael Dickey
+Date: Oct 18 2026
+"""
+import numpy
+import os
+import struct
+import zlib
+
+
+# The 8 bytes at the start of every PNG file
+SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# The number of bytes per pixel for each supported color type (grey, RGB, palette,
+# grey-alpha and RGBA)
+CHANNELS = {0:1, 2:3, 3:1, 4:2, 6:4}
+
+# The amount of compressed data to collect before writing an IDAT chunk
+CHUNK_SIZE = 1 << 16
+
+# The names of the PNG filter types, in order (see _filter)
+FILTERS = ('none','sub','up','average','paeth')
+
+
+def streamable(file):
+    """
+    Returns True if file is a PNG image that a PNGReader can read; False otherwise.
+
+    This function only reads the header of the file.  It returns False (rather than
+    raising an error) if the file cannot be read.
+
+    Parameter file: The image file to check
+    Precondition: file is a string
+    """
+    try:
+        with open(file,'rb') as stream:
+            header = stream.read(33)
+    except OSError:
+        return False
+
+    if len(header) < 33 or header[:8] != SIGNATURE or header[12:16] != b'IHDR':
+        return False
+    depth, color, compress, method, interlace = struct.unpack('>BBBBB',header[24:29])
+    return depth == 8 and color in CHANNELS and interlace == 0
+
+
+def _unfilter(kind, line, prior, bpp):
+    """
+    Returns the row of bytes decoded from a filtered PNG row.
+
+    The filters None, Sub and Up are computed with numpy.  The filters Average and
+    Paeth depend on the decoded byte to the left, so they are decoded byte by byte.
+    That is far too slow for a whole image, so PNGReader decodes bands with these
+    filters with _unfilter_rows instead.  This function is the reference for them.
+
+    Parameter kind: The filter type
+    Precondition: kind is an int 0..4
+
+    Parameter line: The filtered row (without the filter byte)
+    Precondition: line is a numpy array of uint8
+
+    Parameter prior: The decoded row above this one (all zeros for the first row)
+    Precondition: prior is a numpy array of uint8 the same length as line
+
+    Parameter bpp: The number of bytes per pixel
+    Precondition: bpp is an int > 0
+    """
+    if kind == 0:
+        return line
+    elif kind == 1:
+        # uint8 sums wrap around at 256, exactly as the filter requires
+        return numpy.cumsum(line.reshape(-1,bpp),axis=0,dtype=numpy.uint8).reshape(-1)
+    elif kind == 2:
+        return line+prior
+
+    result = bytearray(line.tobytes())
+    above  = prior.tobytes()
+    if kind == 3:
+        for pos in range(len(result)):
+            left = result[pos-bpp] if pos >= bpp else 0
+            result[pos] = (result[pos]+((left+above[pos]) >> 1)) & 255
+    elif kind == 4:
+        for pos in range(len(result)):
+            if pos >= bpp:
+                left  = result[pos-bpp]
+                upper = above[pos-bpp]
+            else:
+                left  = 0
+                upper = 0
+            up = above[pos]
+            guess = left+up-upper
+            dleft  = abs(guess-left)
+            dup    = abs(guess-up)
+            dupper = abs(guess-upper)
+            if dleft <= dup and dleft <= dupper:
+                predict = left
+            elif dup <= dupper:
+                predict = up
+            else:
+                predict = upper
+            result[pos] = (result[pos]+predict) & 255
+    else:
+        raise ValueError('unknown PNG filter type '+repr(kind))
+    return numpy.frombuffer(bytes(result),dtype=numpy.uint8)
+
+
+def _filter(kind, rows, above, bpp):
+    """
+    Returns the given rows encoded with a PNG filter, as a 2d array of bytes.
+
+    Unlike decoding, encoding only needs the original bytes, so every filter can be
+    computed for all of the rows at once with numpy.  All of the arithmetic is on
+    uint8, which wraps around at 256 exactly as the filters require.
+
+    Parameter kind: The filter type
+    Precondition: kind is an int 0..4
+
+    Parameter rows: The rows to encode, one row of bytes each
+    Precondition: rows is a 2d numpy array of uint8
+
+    Parameter above: The row above each row (all zeros above the first row)
+    Precondition: above is a numpy array of uint8 the same shape as rows
+
+    Parameter bpp: The number of bytes per pixel
+    Precondition: bpp is an int > 0
+    """
+    if kind == 0:
+        return rows
+    elif kind == 2:
+        return rows-above
+
+    left = numpy.zeros_like(rows)
+    left[:,bpp:] = rows[:,:-bpp]
+    if kind == 1:
+        return rows-left
+    elif kind == 3:
+        return rows-((left.astype(numpy.uint16)+above) >> 1).astype(numpy.uint8)
+    elif kind == 4:
+        upper = numpy.zeros_like(rows)
+        upper[:,bpp:] = above[:,:-bpp]
+        a = left.astype(numpy.int16)
+        b = above.astype(numpy.int16)
+        c = upper.astype(numpy.int16)
+        dleft  = numpy.abs(b-c)
+        dup    = numpy.abs(a-c)
+        dupper = numpy.abs(a+b-2*c)
+        predict = numpy.where((dleft <= dup) & (dleft <= dupper),left,
+                              numpy.where(dup <= dupper,above,upper))
+        return rows-predict
+    raise ValueError('unknown PNG filter type '+repr(kind))
+
+
+def _chunk_bytes(kind, data):
+    """
+    Returns a PNG chunk with the given type and contents, as bytes.
+
+    Parameter kind: The chunk type
+    Precondition: kind is a 4 byte bytes object
+
+    Parameter data: The chunk contents
+    Precondition: data is a bytes-like object
+    """
+    return (struct.pack('>I',len(data))+kind+bytes(data)+
+            struct.pack('>I',zlib.crc32(data,zlib.crc32(kind))))
+
+
+def _unfilter_rows(data, prior, bpp):
+    """
+    Returns the rows of bytes decoded from filtered PNG rows, as a 2d array.
+
+    The rows are decoded by PIL, which removes every filter in C.  They are wrapped in
+    a small PNG file of their own, stored without compression (so making it is little
+    more than a copy), whose first row is the decoded row above them.  Removing the 
+    filters only depends on the number of bytes per pixel, so the wrapper is a grey,
+    grey-alpha, RGB or RGBA image with that many bytes per pixel, whatever the color
+    type of the original file.
+
+    Parameter data: The filtered rows, each starting with its filter byte
+    Precondition: data is a 2d numpy array of uint8
+
+    Parameter prior: The decoded row above the first row (all zeros for the first row)
+    Precondition: prior is a numpy array of uint8, one byte shorter than a row of data
+
+    Parameter bpp: The number of bytes per pixel
+    Precondition: bpp is an int 1..4
+    """
+    import io
+    from PIL import Image as CoreImage
+    count, line = data.shape
+    width = (line-1)//bpp
+    color = {1:0, 2:4, 3:2, 4:6}[bpp]
+    stored = numpy.empty((count+1,line),dtype=numpy.uint8)
+    stored[0,0] = 0
+    stored[0,1:] = prior
+    stored[1:] = data
+    wrapper = (SIGNATURE+
+               _chunk_bytes(b'IHDR',struct.pack('>IIBBBBB',width,count+1,8,color,0,0,0))+
+               _chunk_bytes(b'IDAT',zlib.compress(stored,0))+_chunk_bytes(b'IEND',b''))
+    with CoreImage.open(io.BytesIO(wrapper)) as image:
+        result = numpy.frombuffer(image.tobytes(),dtype=numpy.uint8)
+    return result.reshape(count+1,line-1)[1:]
+
+
+class PNGReader(object):
+    """
+    An instance reads the rows of a PNG file in order, a band at a time.
+
+    Rows are returned as RGBA, whatever the color type of the file, just like the
+    result of PIL's convert("RGBA").
+
+    Attribute width: The image width
+    Invariant: width is an int > 0
+
+    Attribute height: The image height
+    Invariant: height is an int > 0
+
+    Attribute row: The number of rows read so far
+    Invariant: row is an int between 0 and height, inclusive
+    """
+
+    def __init__(self, file):
+        """
+        Opens the given PNG file and reads its header.
+
+        This function raises a ValueError if the file is not a PNG image that this
+        class supports (see streamable).
+
+        Parameter file: The image file to read
+        Precondition: file is a string
+        """
+        self._stream = open(file,'rb')
+        try:
+            if self._stream.read(8) != SIGNATURE:
+                raise ValueError(repr(file)+' is not a PNG file')
+
+            palette = None
+            transparency = None
+            kind, data = self._chunk()
+            if kind != b'IHDR':
+                raise ValueError(repr(file)+' does not start with a header')
+            self.width, self.height, depth, self._color, compress, method, interlace = struct.unpack('>IIBBBBB',data)
+            if depth != 8 or not self._color in CHANNELS or interlace != 0:
+                raise ValueError(repr(file)+' is not an 8-bit non-interlaced PNG')
+
+            # Collect the palette and transparency, up to the first pixel data
+            kind, data = self._chunk()
+            while kind != b'IDAT':
+                if kind == b'PLTE':
+                    palette = data
+                elif kind == b'tRNS':
+                    transparency = data
+                elif kind == b'IEND':
+                    raise ValueError(repr(file)+' has no pixel data')
+                kind, data = self._chunk()
+        except:
+            self._stream.close()
+            raise
+
+        self._bpp = CHANNELS[self._color]
+        self._stride = self.width*self._bpp
+        self._prior = numpy.zeros(self._stride,dtype=numpy.uint8)
+        self._inflate = zlib.decompressobj()
+        self._pending = bytearray(self._inflate.decompress(data))
+        self._ended = False
+        self._convert = self._converter(palette,transparency)
+        self.row = 0
+
+    def _chunk(self):
+        """
+        Returns the next chunk in the file as a tuple (type, data).
+        """
+        header = self._stream.read(8)
+        if len(header) < 8:
+            raise ValueError('unexpected end of PNG file')
+        length, kind = struct.unpack('>I4s',header)
+        data = self._stream.read(length)
+        self._stream.read(4)    # The CRC
+        return (kind,data)
+
+    def _converter(self, palette, transparency):
+        """
+        Returns a function converting an array of decoded rows to RGBA.
+
+        Parameter palette: The contents of the PLTE chunk (or None)
+        Precondition: palette is a bytes object or None
+
+        Parameter transparency: The contents of the tRNS chunk (or None)
+        Precondition: transparency is a bytes object or None
+        """
+        color = self._color
+        if color == 6:
+            return lambda data : data
+        elif color == 4:
+            return lambda data : data[:,:,[0,0,0,1]]
+        elif color == 3:
+            # Like PIL, indices past the end of the palette are opaque black
+            table = numpy.zeros((256,4),dtype=numpy.uint8)
+            table[:,3] = 255
+            colors = numpy.frombuffer(palette,dtype=numpy.uint8).reshape(-1,3)
+            table[:len(colors),:3] = colors
+            if transparency:
+                alphas = numpy.frombuffer(transparency,dtype=numpy.uint8)
+                table[:len(alphas),3] = alphas
+            return lambda data : table[data[:,:,0]]
+
+        # Grey or RGB, opaque except for the (optional) single transparent color
+        key = None
+        if transparency:
+            values = struct.unpack('>'+'H'*(len(transparency)//2),transparency)
+            key = numpy.array(values,dtype=numpy.uint16)
+
+        def convert(data):
+            result = numpy.empty(data.shape[:2]+(4,),dtype=numpy.uint8)
+            result[:,:,:3] = data
+            result[:,:,3] = 255
+            if key is not None:
+                result[:,:,3][(data == key).all(axis=2)] = 0
+            return result
+        return convert
+
+    def _fill(self, size):
+        """
+        Decompresses pixel data until there are at least size bytes pending.
+
+        This stops early at the end of the pixel data.
+
+        Parameter size: The number of bytes needed
+        Precondition: size is an int >= 0
+        """
+        while len(self._pending) < size and not self._ended:
+            kind, data = self._chunk()
+            if kind == b'IDAT':
+                self._pending += self._inflate.decompress(data)
+            elif kind == b'IEND':
+                self._pending += self._inflate.flush()
+                self._ended = True
+
+    def read(self, count):
+        """
+        Returns the next count rows of the image as an array of RGBA bytes.
+
+        The result is a numpy array of uint8 with shape rows x width x 4.  It has fewer
+        than count rows if the end of the image is reached.
+
+        Parameter count: The number of rows to read
+        Precondition: count is an int >= 0
+        """
+        count = min(count,self.height-self.row)
+        line = self._stride+1
+        self._fill(count*line)
+        if len(self._pending) < count*line:
+            raise ValueError('PNG pixel data is truncated')
+
+        data = numpy.frombuffer(bytes(self._pending[:count*line]),dtype=numpy.uint8)
+        del self._pending[:count*line]
+        data = data.reshape(count,line)
+
+        # Average and Paeth (filters 3 and 4) are far faster to decode with PIL
+        if count and (data[:,0] >= 3).any():
+            result = _unfilter_rows(data,self._prior,self._bpp)
+        else:
+            result = numpy.empty((count,self._stride),dtype=numpy.uint8)
+            prior = self._prior
+            for pos in range(count):
+                prior = _unfilter(data[pos,0],data[pos,1:],prior,self._bpp)
+                result[pos] = prior
+        self._prior = result[-1] if count else self._prior
+        self.row += count
+        return self._convert(result.reshape(count,self.width,self._bpp))
+
+    def close(self):
+        """
+        Closes the file.
+        """
+        self._stream.close()
+
+
+class PNGWriter(object):
+    """
+    An instance writes an RGBA PNG file a band of rows at a time.
+
+    Rows must be written in order, and close must be called after the last row.  By
+    default each row is encoded with the Up filter (the difference from the row above),
+    which is fast to compute and compresses well for photographs.  Any of the other
+    FILTERS can be used instead, or 'adaptive', which tries all five on each row and
+    keeps the one with the smallest sum of differences (as most PNG encoders do).
+
+    Attribute width: The image width
+    Invariant: width is an int > 0
+
+    Attribute height: The image height
+    Invariant: height is an int > 0
+
+    Attribute row: The number of rows written so far
+    Invariant: row is an int between 0 and height, inclusive
+    """
+
+    def __init__(self, file, width, height, level=6, filter='up'):
+        """
+        Creates the given PNG file and writes its header.
+
+        Parameter file: The image file to write
+        Precondition: file is a string
+
+        Parameter width: The image width
+        Precondition: width is an int > 0
+
+        Parameter height: The image height
+        Precondition: height is an int > 0
+
+        Parameter level: The zlib compression level
+        Precondition: level is an int 0..9
+
+        Parameter filter: The PNG filter for every row
+        Precondition: filter is one of FILTERS or 'adaptive'
+        """
+        assert filter == 'adaptive' or filter in FILTERS, repr(filter)+' is not a PNG filter'
+        self._filter = filter
+        self.width  = width
+        self.height = height
+        self.row = 0
+        self._file = file
+        self._stream = open(file,'wb')
+        self._stream.write(SIGNATURE)
+        self._chunk(b'IHDR',struct.pack('>IIBBBBB',width,height,8,6,0,0,0))
+        self._deflate = zlib.compressobj(level)
+        self._pending = bytearray()
+        self._prior = numpy.zeros((width,4),dtype=numpy.uint8)
+
+    def _chunk(self, kind, data):
+        """
+        Writes a chunk to the file.
+
+        Parameter kind: The chunk type
+        Precondition: kind is a 4 byte bytes object
+
+        Parameter data: The chunk contents
+        Precondition: data is a bytes-like object
+        """
+        self._stream.write(_chunk_bytes(kind,data))
+
+    def write(self, rows):
+        """
+        Encodes and writes the given rows.
+
+        Parameter rows: The next rows of the image
+        Precondition: rows is a numpy array of uint8 with shape rows x width x 4
+        """
+        count = rows.shape[0]
+        assert self.row+count <= self.height, 'too many rows written to PNG'
+        if count == 0:
+            return
+
+        data  = rows.reshape(count,-1)
+        above = numpy.concatenate((self._prior.reshape(1,-1),data[:-1]))
+        lines = numpy.empty((count,self.width*4+1),dtype=numpy.uint8)
+        if self._filter != 'adaptive':
+            kind = FILTERS.index(self._filter)
+            lines[:,0] = kind
+            lines[:,1:] = _filter(kind,data,above,4)
+        else:
+            # Pick the filter with the smallest sum of (signed) differences on each row
+            best = None
+            for kind in range(len(FILTERS)):
+                encoded = _filter(kind,data,above,4)
+                score = numpy.abs(encoded.view(numpy.int8).astype(numpy.int32)).sum(axis=1)
+                if best is None:
+                    best = score
+                    lines[:,0] = kind
+                    lines[:,1:] = encoded
+                else:
+                    better = score < best
+                    best = numpy.where(better,score,best)
+                    lines[better,0] = kind
+                    lines[better,1:] = encoded[better]
+
+        self._pending += self._deflate.compress(lines.tobytes())
+        while len(self._pending) >= CHUNK_SIZE:
+            self._chunk(b'IDAT',self._pending[:CHUNK_SIZE])
+            del self._pending[:CHUNK_SIZE]
+
+        self._prior = rows[-1].copy()
+        self.row += count
+
+    def close(self):
+        """
+        Finishes the pixel data and closes the file.
+        """
+        assert self.row == self.height, 'PNG closed before all rows were written'
+        self._pending += self._deflate.flush()
+        if self._pending:
+            self._chunk(b'IDAT',self._pending)
+        self._chunk(b'IEND',b'')
+        self._stream.close()
+
+    def discard(self):
+        """
+        Closes and removes the file, without finishing it.
+
+        This is for when the rows cannot all be written, so that an unfinished file
+        is not left behind.
+        """
+        self._stream.close()
+        try:
+            os.remove(self._file)
+        except OSError:
+            pass
@@ -0,0 +1,277 @@
+"""
+Image pyramids for the pictool.
+
+A user interface often shows the same image at several small sizes, and runs plugins
+on those small versions.  Loading the full image (and processing all of its pixels)
+for each of them wastes nearly all of that work.  This module makes a pyramid of the
+image instead: level 0 is the image itself, and each later level is half the width
+and half the height of the one before, down to a single pixel.  Every pixel of a
+level is the average of the 2x2 block of pixels it covers in the level before (the
+area average), rounded to the nearest int.  When a width or height is odd, the last
+block only has the pixels inside the image, as in plugins.blur.
+
+All of the levels are made at once, each from the one before, so the full image is
+only read once.  They are saved in a cache folder as numpy .npy files, and are
+memory-mapped when they are used again (as in the module pixelcache).  An entry is
+found by the path of the image along with its modification time and size, so
+changing the image makes its old levels unused.  The least recently used levels are
+removed once the folder is larger than PYRAMID_LIMIT bytes.  The levels together
+are a third of the size of the image, so they are cheap to keep.
+
+Author: Michael Dickey
+Date: Oct 18 2026
+"""
+import hashlib
+import numpy
+import os
+
+
+# The folder holding the cached levels
+PYRAMID_DIR = os.path.join(os.path.expanduser('~'),'.cache','pictool','pyramid')
+
+# The largest total size of the cached levels, in bytes
+PYRAMID_LIMIT = 1 << 30
+
+
+def parse_size(text):
+    """
+    Returns the tuple (width, height) given by text, or None if text is not a size.
+
+    A size is two positive ints separated by an 'x', as in '640x480'.
+
+    Parameter text: The size to parse
+    Precondition: text is any value
+    """
+    if type(text) != str:
+        return None
+    parts = text.lower().split('x')
+    if len(parts) != 2 or not parts[0].isdigit() or not parts[1].isdigit():
+        return None
+    width, height = int(parts[0]), int(parts[1])
+    if width == 0 or height == 0:
+        return None
+    return (width,height)
+
+
+def level_size(width, height, level):
+    """
+    Returns the tuple (width, height) of the given level of an image.
+
+    Parameter width: The image width
+    Precondition: width is an int > 0
+
+    Parameter height: The image height
+    Precondition: height is an int > 0
+
+    Parameter level: The pyramid level
+    Precondition: level is an int >= 0
+    """
+    scale = 1 << level
+    return (-(-width//scale),-(-height//scale))
+
+
+def level_count(width, height):
+    """
+    Returns the number of levels in the pyramid of an image, including level 0.
+
+    The last level is a single pixel.
+
+    Parameter width: The image width
+    Precondition: width is an int > 0
+
+    Parameter height: The image height
+    Precondition: height is an int > 0
+    """
+    return max(width-1,height-1,0).bit_length()+1
+
+
+def choose(width, height, level=None, bound=None):
+    """
+    Returns the pyramid level to use for an image of the given size.
+
+    If level is not None, the result is that level, or the last level if the pyramid
+    does not have that many.  Otherwise, if bound is not None, the result is the first
+    (largest) level that fits inside bound.  Otherwise the result is 0, the image
+    itself.
+
+    Parameter width: The image width
+    Precondition: width is an int > 0
+
+    Parameter height: The image height
+    Precondition: height is an int > 0
+
+    Parameter level: The level asked for (or None)
+    Precondition: level is an int >= 0 or None
+
+    Parameter bound: The largest size allowed, as (width, height) (or None)
+    Precondition: bound is a tuple of two ints > 0, or None
+    """
+    last = level_count(width,height)-1
+    if level is not None:
+        return min(level,last)
+    if bound is None:
+        return 0
+    for pos in range(last+1):
+        size = level_size(width,height,pos)
+        if size[0] <= bound[0] and size[1] <= bound[1]:
+            return pos
+    return last
+
+
+def image_size(file):
+    """
+    Returns the tuple (width, height) of the given image file, or None if it cannot be read.
+
+    Only the header of the file is read, not its pixels.
+
+    Parameter file: The image file
+    Precondition: file is a string
+    """
+    import encoders
+    info = encoders.detect(file)
+    if info is not None:
+        return (info[1],info[2])
+
+    from PIL import Image as CoreImage
+    try:
+        with CoreImage.open(file) as image:
+            return image.size
+    except OSError:
+        return None
+
+
+def downsample(array):
+    """
+    Returns the next level of the pyramid after array.
+
+    The result is half the width and height of array (rounded up), and each pixel is
+    the average of the 2x2 block of array that it covers.  An odd last row or column
+    is repeated to fill its blocks, which averages just the pixels inside the image.
+
+    Parameter array: The pixels of a level
+    Precondition: array is a numpy array of uint8 with shape height x width x 4
+    """
+    height, width = array.shape[:2]
+    if height % 2:
+        array = numpy.concatenate((array,array[-1:]),0)
+    if width % 2:
+        array = numpy.concatenate((array,array[:,-1:]),1)
+
+    # Adding the pairs of rows and then columns is much faster than summing 2x2 blocks
+    total  = array[0::2].astype(numpy.uint16)
+    total += array[1::2]
+    total  = total[:,0::2]+total[:,1::2]
+    total += 2
+    total //= 4
+    return total.astype(numpy.uint8)
+
+
+def entry_name(file, level):
+    """
+    Returns the name of the cache entry for the given level of an image file.
+
+    The name depends on the full path of the file, its modification time and its
+    size.  This function raises an OSError if the file does not exist.
+
+    Parameter file: The image file
+    Precondition: file is a string
+
+    Parameter level: The pyramid level
+    Precondition: level is an int > 0
+    """
+    info = os.stat(file)
+    key  = '%s\0%d\0%d' % (os.path.realpath(file),info.st_mtime_ns,info.st_size)
+    return os.path.join(PYRAMID_DIR,hashlib.sha1(key.encode()).hexdigest()+'-%d.npy' % level)
+
+
+def lookup(file, level):
+    """
+    Returns the cached pixels of a level of the given image file, or None if not cached.
+
+    The result is a copy-on-write memory map of the pixels: a numpy array of uint8 with
+    shape height x width x 4.  Changing the array does not change the cache.
+
+    Parameter file: The image file
+    Precondition: file is a string
+
+    Parameter level: The pyramid level
+    Precondition: level is an int > 0
+    """
+    try:
+        name = entry_name(file,level)
+        array = numpy.load(name,mmap_mode='c')
+    except (OSError, ValueError):
+        return None
+
+    if array.dtype != numpy.uint8 or array.ndim != 3 or array.shape[2] != 4:
+        return None
+
+    # Mark the entry as recently used
+    try:
+        os.utime(name)
+    except OSError:
+        pass
+    return array
+
+
+def store(file, levels):
+    """
+    Adds the given levels of an image file to the cache.
+
+    Each level is written to a temporary file first, so a reader never sees a level
+    that is half written.  Levels that cannot be written are not cached.
+
+    Parameter file: The image file
+    Precondition: file is a string
+
+    Parameter levels: The levels after level 0, in order
+    Precondition: levels is a list of numpy arrays of uint8 with shape height x width x 4
+    """
+    import pixelcache
+    try:
+        os.makedirs(PYRAMID_DIR,exist_ok=True)
+        names = [entry_name(file,pos+1) for pos in range(len(levels))]
+    except OSError:
+        return
+
+    for pos in range(len(levels)):
+        temp = names[pos]+'.%d.tmp' % os.getpid()
+        try:
+            with open(temp,'wb') as stream:
+                numpy.save(stream,levels[pos])
+            os.replace(temp,names[pos])
+        except OSError:
+            if os.path.exists(temp):
+                os.remove(temp)
+    pixelcache.evict(PYRAMID_LIMIT,names[0] if names else None,PYRAMID_DIR)
+
+
+def build(file, array, level, cache=True):
+    """
+    Returns the given level of the pyramid of array, making every level at once.
+
+    All of the levels after level 0 are made from array (see downsample).  If cache is
+    True, they are saved for the image file (see store), so later calls to lookup find
+    them.  If level is past the last level, the result is the last level.
+
+    Parameter file: The image file that array was read from
+    Precondition: file is a string
+
+    Parameter array: The pixels of the image
+    Precondition: array is a numpy array of uint8 with shape height x width x 4
+
+    Parameter level: The pyramid level to return
+    Precondition: level is an int > 0
+
+    Parameter cache: Whether to save the levels
+    Precondition: cache is a bool
+    """
+    levels = []
+    last = level_count(array.shape[1],array.shape[0])-1
+    for pos in range(last):
+        array = downsample(array)
+        levels.append(array)
+
+    if cache:
+        store(file,levels)
+    return levels[min(level,last)-1] if levels else array
@@ -0,0 +1,141 @@
+"""
+Plugin signature registry for the pictool.
+
+Before pictool runs a command, it checks that the command exists and that every option
+on the command line is a parameter of the plugin.  Importing the plugin modules to do
+that also imports numpy (and everything else they need), which takes longer than the
+rest of pictool's startup put together.  That is wasted when the command line has a
+mistake, or when the user only asks for --help.
+
+This module finds the signatures of the plugins without importing them.  It reads the
+source code of a plugin module with the module ast, and records each top-level
+function's parameters and default values.  The signatures are saved in a small cache
+file (with the module marshal, which Python can read very quickly), and are only read
+from the source again when the module changes.
+
+Author: Michael Dickey
+Date: Oct 18 2026
+"""
+import marshal
+import os
+
+
+# The folder holding the saved signatures
+REGISTRY_DIR = os.path.join(os.path.expanduser('~'),'.cache','pictool','registry')
+
+# The folder containing the plugin modules
+HOME = os.path.dirname(os.path.abspath(__file__))
+
+# The signatures read so far in this process, by module name
+_modules = {}
+
+
+def source_file(name):
+    """
+    Returns the source file of the module name, or None if it cannot be found.
+
+    Modules next to this one are found without searching sys.path.
+
+    Parameter name: The module name
+    Precondition: name is a string
+    """
+    path = os.path.join(HOME,name+'.py')
+    if os.path.isfile(path):
+        return path
+
+    import importlib.util
+    try:
+        spec = importlib.util.find_spec(name)
+    except (ImportError, ValueError):
+        return None
+    if spec is None or spec.origin is None or not spec.origin.endswith('.py'):
+        return None
+    return spec.origin
+
+
+def parse(path):
+    """
+    Returns the signatures of the top-level functions in the given source file.
+
+    The result is a dictionary mapping each function name to a tuple (params,
+    defaults), where params is a tuple of the positional parameter names and defaults
+    is a tuple of the source code of their default values (for the last parameters).
+
+    Parameter path: The source file
+    Precondition: path is a string naming a Python file
+    """
+    import ast
+    with open(path,'rb') as stream:
+        tree = ast.parse(stream.read(),path)
+
+    result = {}
+    for node in tree.body:
+        if isinstance(node,ast.FunctionDef):
+            params = tuple([arg.arg for arg in node.args.posonlyargs+node.args.args])
+            defaults = tuple([ast.unparse(value) for value in node.args.defaults])
+            result[node.name] = (params,defaults)
+    return result
+
+
+def signatures(name):
+    """
+    Returns the signatures of the top-level functions in the module name.
+
+    The result is a dictionary as described in parse, or None if the module source
+    cannot be found.  The module is not imported.
+
+    Parameter name: The module name
+    Precondition: name is a string
+    """
+    if name in _modules:
+        return _modules[name]
+
+    path = source_file(name)
+    if path is None:
+        return None
+
+    info  = os.stat(path)
+    stamp = (path,info.st_mtime_ns,info.st_size)
+    cache = os.path.join(REGISTRY_DIR,name+'.marshal')
+    try:
+        with open(cache,'rb') as stream:
+            saved, result = marshal.load(stream)
+        if saved != stamp:
+            result = None
+    except (OSError, EOFError, ValueError, TypeError):
+        result = None
+
+    if result is None:
+        result = parse(path)
+        try:
+            os.makedirs(REGISTRY_DIR,exist_ok=True)
+            temp = cache+'.%d.tmp' % os.getpid()
+            with open(temp,'wb') as stream:
+                marshal.dump((stamp,result),stream)
+            os.replace(temp,cache)
+        except OSError:
+            pass
+
+    _modules[name] = result
+    return result
+
+
+def find(command, modules):
+    """
+    Returns a tuple (module, params, defaults) for the first module defining command.
+
+    The value module is the name of the module, and params and defaults are as
+    described in parse.  If no module defines command, this function returns None.
+
+    Parameter command: The function name
+    Precondition: command is a string
+
+    Parameter modules: The module names to search, in order
+    Precondition: modules is a list of strings
+    """
+    for name in modules:
+        found = signatures(name)
+        if found is not None and command in found:
+            params, defaults = found[command]
+            return (name,params,defaults)
+    return None
@@ -0,0 +1,207 @@
+"""
+Saved results for the pictool.
+
+Batch jobs often run the same image through the same plugins with the same options
+more than once.  This module saves each output file in a cache folder, so that when
+the same work is asked for again, pictool can copy the saved output instead of
+processing the image.
+
+A result is found by a key that is a hash (see the module hashlib) of the contents of
+the input file, the name and options of every stage of the pipeline, the source code
+of every module of the pictool, and the type of output file.  So editing the input,
+the options, any of the code or the output format all give a new key.  The plugins
+call on many other modules (vectorized, lut, convolution, fusion, pixelbuffer, and
+pictool itself to read and save the image), so a change to any of them can change
+the output.  Unused results are removed when the folder grows larger than RESULT_LIMIT
+bytes, starting with the results used least recently (see pixelcache.evict).
+
+The number of results found (hits) and not found (misses) over all runs is kept in
+the file STATS in the cache folder.
+
+Author: Michael Dickey
+Date: Oct 18 2026
+"""
+import hashlib
+import json
+import os
+import pixelcache
+import shutil
+import tempfile
+
+
+# The folder holding the saved results
+RESULT_DIR = os.path.join(os.path.expanduser('~'),'.cache','pictool','results')
+
+# The largest total size of the saved results, in bytes
+RESULT_LIMIT = 1 << 30
+
+# The file (in RESULT_DIR) recording the hits and misses
+STATS = 'stats.json'
+
+# The suffix added to every result, so that eviction ignores other files
+SUFFIX = '.result'
+
+# The folder containing the pictool modules
+HOME = os.path.dirname(os.path.abspath(__file__))
+
+# The hash of the pictool modules, computed the first time it is needed
+_sources = None
+
+
+def file_digest(file):
+    """
+    Returns the SHA-256 hash of the contents of the given file, as bytes.
+
+    Parameter file: The file to hash
+    Precondition: file is a string naming an existing file
+    """
+    digest = hashlib.sha256()
+    with open(file,'rb') as stream:
+        block = stream.read(1 << 20)
+        while block:
+            digest.update(block)
+            block = stream.read(1 << 20)
+    return digest.digest()
+
+
+def source_digest():
+    """
+    Returns the hash of the source code of every pictool module, as bytes.
+
+    The modules are the Python files in HOME, hashed in order of their names.  The 
+    hash is only computed once in each process.
+    """
+    global _sources
+    if _sources is None:
+        digest = hashlib.sha256()
+        for name in sorted(os.listdir(HOME)):
+            if name.endswith('.py'):
+                digest.update(name.encode()+b'\0')
+                try:
+                    digest.update(file_digest(os.path.join(HOME,name)))
+                except OSError:
+                    pass
+        _sources = digest.digest()
+    return _sources
+
+
+def result_key(input, pipeline, suffix, encoding=None, level=0):
+    """
+    Returns the key of the result of processing input with pipeline.
+
+    Parameter input: The image file to read
+    Precondition: input is a string naming an existing file
+
+    Parameter pipeline: The pipeline stages
+    Precondition: pipeline is a list of (name, command, options) tuples, and every
+    option value can be saved as JSON
+
+    Parameter suffix: The suffix of the output file (e.g. '.png')
+    Precondition: suffix is a string
+
+    Parameter encoding: The encoder settings (see encoders.create)
+    Precondition: encoding is a dictionary that can be saved as JSON, or None
+
+    Parameter level: The level of the image pyramid processed (see the module pyramid)
+    Precondition: level is an int >= 0
+    """
+    digest = hashlib.sha256(file_digest(input))
+    digest.update(source_digest())
+    for (name, command, options) in pipeline:
+        digest.update(json.dumps([name,command.__module__,options],sort_keys=True).encode())
+    digest.update(suffix.lower().encode())
+    if encoding is not None:
+        digest.update(json.dumps(encoding,sort_keys=True).encode())
+    if level > 0:
+        digest.update(b'level %d' % level)
+    return digest.hexdigest()
+
+
+def lookup(key, output):
+    """
+    Returns True after copying the saved result for key to output; False if there is
+    no saved result.
+
+    Parameter key: The result key (see result_key)
+    Precondition: key is a string
+
+    Parameter output: The file name to copy the result to
+    Precondition: output is a string
+    """
+    path = os.path.join(RESULT_DIR,key+SUFFIX)
+    try:
+        shutil.copyfile(path,output)
+    except OSError:
+        return False
+
+    # Mark the result as recently used
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return True
+
+
+def store(key, output, limit=None):
+    """
+    Saves a copy of the file output as the result for key.
+
+    If the folder is now larger than limit, the least recently used results are
+    removed.  Errors (such as a full disk) are ignored, since the result is only a
+    copy.
+
+    Parameter key: The result key (see result_key)
+    Precondition: key is a string
+
+    Parameter output: The output file to save
+    Precondition: output is a string naming an existing file
+
+    Parameter limit: The largest size of the folder in bytes (RESULT_LIMIT if None)
+    Precondition: limit is an int >= 0 or None
+    """
+    limit = RESULT_LIMIT if limit is None else limit
+    path  = os.path.join(RESULT_DIR,key+SUFFIX)
+    try:
+        if os.path.getsize(output) > limit:
+            return
+        os.makedirs(RESULT_DIR,exist_ok=True)
+        handle, temp = tempfile.mkstemp(suffix='.tmp',dir=RESULT_DIR)
+        os.close(handle)
+        shutil.copyfile(output,temp)
+        os.replace(temp,path)
+        pixelcache.evict(limit,path,RESULT_DIR,SUFFIX)
+    except OSError:
+        pass
+
+
+def stats():
+    """
+    Returns a dictionary with the total 'hits' and 'misses' over all runs.
+    """
+    try:
+        with open(os.path.join(RESULT_DIR,STATS)) as stream:
+            result = json.load(stream)
+        return {'hits':int(result['hits']), 'misses':int(result['misses'])}
+    except (OSError, ValueError, KeyError, TypeError):
+        return {'hits':0, 'misses':0}
+
+
+def record(hits, misses):
+    """
+    Adds the given numbers of hits and misses to the totals in the file STATS.
+
+    Parameter hits: The number of results found
+    Precondition: hits is an int >= 0
+
+    Parameter misses: The number of results not found
+    Precondition: misses is an int >= 0
+    """
+    totals = stats()
+    totals['hits'] += hits
+    totals['misses'] += misses
+    try:
+        os.makedirs(RESULT_DIR,exist_ok=True)
+        with open(os.path.join(RESULT_DIR,STATS),'w') as stream:
+            json.dump(totals,stream)
+    except OSError:
+        pass
@@ -0,0 +1,407 @@
+"""
+Server mode for the pictool.
+
+Running pictool once for every image means paying for Python to start, for the
+plugins (and numpy) to be imported and for the commands to be looked up, every time.
+For a small image that is nearly all of the time.  This module keeps pictool running
+instead, so that those costs are only paid once.  It is used by pictool.py when it is
+run with the command serve:
+
+    python3 pictool.py serve --socket=/tmp/pictool.sock --engine=numpy
+
+Requests are read from the Unix socket (or from standard input if there is no
+--socket), and the responses are written back to the same connection (or standard
+output).  Each request and each response is a JSON object on a line of its own.  A
+request has the keys
+
+    command     The command or pipeline to run (as on the command line)
+    options     The plug-in options (optional; only for a single command)
+    input       The image file to read, or
+    data        The image file itself, encoded with base64
+    output      The file to save to (optional)
+    format      The type of file to send back when there is no output (default png)
+    level       The level of the image pyramid to process (optional; see --level)
+    max-size    The largest size to process, like '640x480' (optional; see --max-size)
+    id          Any value, which is sent back in the response (optional)
+
+The format is spelled as with --format on the command line (png, ppm, pam, raw or
+npy), or as the suffix of the file (.png, .ppm, .pam, .rgba or .npy, with or without
+the dot).  It takes the place of the --format of the server for that request.
+
+The response has the keys id, ok (True or False), seconds (the processing time) and
+either error (with the log of the failure) or output (or data, encoded with base64,
+if the request had no output).
+
+A client does not need to wait for one response before sending the next request.
+The requests are processed in a pool of --jobs worker processes that have already
+imported the plugins, and the responses are sent in the same order as the requests.
+With --jobs=1 (the default on a single core) the requests are processed in this
+process, one at a time, which avoids the cost of sending them to another process.
+
+Author: Michael Dickey
+Date: Oct 18 2026
+"""
+import base64
+import encoders
+import json
+import os
+import pictool
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+
+
+# The default type of file to send back for requests without an output file
+FORMAT = 'png'
+
+# The largest number of requests from one connection that may be waiting at once
+PENDING = 64
+
+
+def format_suffix(format):
+    """
+    Returns the file suffix for the format of a request, or None if it is not a format.
+
+    The format may be a name in encoders.FORMATS, like 'npy' (as with --format), or a
+    key of encoders.SUFFIXES, like '.npy'.  The dot of a suffix may be left out.
+
+    Parameter format: The format of a request
+    Precondition: format is any value
+    """
+    if type(format) != str:
+        return None
+    if format in encoders.FORMATS:
+        return encoders.suffix_of(format)
+    suffix = format if format.startswith('.') else '.'+format
+    return suffix if suffix in encoders.SUFFIXES else None
+
+
+def warm(engine):
+    """
+    Imports the modules needed to process images with the given engine.
+
+    This is the initializer of the worker processes, so that the first request does
+    not have to wait for the imports.
+
+    Parameter engine: The plug-in engine
+    Precondition: engine is a key of pictool.ENGINES
+    """
+    import importlib
+    for name in pictool.ENGINES[engine]+['pixelbuffer','pixelcache','pngstream']:
+        importlib.import_module(name)
+    from PIL import Image as CoreImage
+    CoreImage.init()
+
+
+class Server(object):
+    """
+    An instance processes requests with a pool of warm workers.
+
+    Each request is checked and turned into a task for pictool.batch_worker, which
+    processes the file just like a batch run.  The pipelines are only looked up the
+    first time they are used.
+
+    Attribute settings: The pictool settings used for every request
+    Invariant: settings is a dictionary with the keys of pictool.SETTINGS
+    """
+
+    def __init__(self, settings):
+        """
+        Initializes a server with the given settings, starting its worker pool.
+
+        Parameter settings: The pictool settings
+        Precondition: settings is a dictionary with the keys of pictool.SETTINGS
+        """
+        import multiprocessing.pool
+        self.settings = dict(settings)
+        self._folder = tempfile.mkdtemp(prefix='pictool-serve-')
+        self._pipelines = {}
+        self._lock = threading.Lock()
+        self._count = 0
+        warm(settings['engine'])
+        if settings['jobs'] == 1:
+            self._pool = multiprocessing.pool.ThreadPool(1)
+        else:
+            # Pool workers cannot start their own pools
+            self.settings['workers'] = 1
+            self._pool = multiprocessing.Pool(settings['jobs'],warm,(settings['engine'],))
+
+    def close(self):
+        """
+        Stops the worker pool and removes the temporary files.
+        """
+        self._pool.close()
+        self._pool.join()
+        shutil.rmtree(self._folder,ignore_errors=True)
+
+    def stages(self, command, options):
+        """
+        Returns the pipeline stages for command as a list of (name, options) pairs.
+
+        If the command is not valid, this function returns the error message instead
+        (see pictool.parse_pipeline).
+
+        Parameter command: The command or pipeline
+        Precondition: command is a string
+
+        Parameter options: The plug-in options given outside of command
+        Precondition: options is a dictionary
+        """
+        key = (command,json.dumps(options,sort_keys=True))
+        with self._lock:
+            if not key in self._pipelines:
+                pipeline = pictool.parse_pipeline(command,dict(options),self.settings['engine'])
+                if type(pipeline) != str:
+                    pipeline = [(name,stage) for (name, function, stage) in pipeline]
+                self._pipelines[key] = pipeline
+            return self._pipelines[key]
+
+    def temporary(self, suffix):
+        """
+        Returns the name of a new temporary file with the given suffix.
+
+        Parameter suffix: The file suffix
+        Precondition: suffix is a string
+        """
+        with self._lock:
+            self._count += 1
+            count = self._count
+        return os.path.join(self._folder,str(count)+suffix)
+
+    def submit(self, request):
+        """
+        Returns a function that waits for the request to finish and returns its response.
+
+        The request is started right away, so that several requests can be processed
+        at once.  A request with an error is not started, and its response is ready
+        immediately.
+
+        Parameter request: The request (see the module docstring)
+        Precondition: request is a dictionary, or a string with the error in the request
+        """
+        if type(request) == str:
+            return lambda : {'id':None, 'ok':False, 'error':request}
+        ident = request.get('id')
+        if type(request.get('command')) != str or type(request.get('options',{})) != dict:
+            return lambda : {'id':ident, 'ok':False, 'error':'error: a request needs a command'}
+
+        stages = self.stages(request['command'],request.get('options',{}))
+        if type(stages) == str:
+            return lambda : {'id':ident, 'ok':False, 'error':stages}
+
+        # A request may ask for a smaller level of the image (see the module pyramid)
+        settings = self.settings
+        if 'level' in request or 'max-size' in request:
+            settings = dict(settings)
+            settings['level'] = request.get('level')
+            settings['max-size'] = request.get('max-size')
+            error = pictool.check_settings(settings)
+            if error is not None:
+                return lambda : {'id':ident, 'ok':False, 'error':error}
+        
+        # Files sent with the request are written to (and read from) temporary files
+        cleanup = []
+        input = request.get('input')
+        if input is None and 'data' in request:
+            try:
+                data = base64.b64decode(request['data'],validate=True)
+            except (ValueError, TypeError):
+                return lambda : {'id':ident, 'ok':False, 'error':'error: data is not base64'}
+            input = self.temporary('.input')
+            with open(input,'wb') as stream:
+                stream.write(data)
+            cleanup.append(input)
+            # A temporary file is never read again, so there is no point caching it
+            settings = dict(settings)
+            settings['no-cache'] = True
+        if type(input) != str:
+            return lambda : {'id':ident, 'ok':False, 'error':'error: a request needs an input'}
+        output = request.get('output')
+        reply = output is None
+        if reply:
+            suffix = format_suffix(request.get('format',FORMAT))
+            if suffix is None:
+                error = 'error: format must be one of '+', '.join(encoders.FORMATS)
+                return lambda : {'id':ident, 'ok':False, 'error':error}
+            if 'format' in request:
+                settings = dict(settings)
+                settings['format'] = encoders.SUFFIXES[suffix]
+            output = self.temporary(suffix)
+            cleanup.append(output)
+
+        task = (stages,settings,input,output)
+        result = self._pool.apply_async(pictool.batch_worker,(task,))
+
+        def finish():
+            try:
+                source, target, success, log, seconds, report = result.get()
+                response = {'id':ident, 'ok':bool(success), 'seconds':seconds}
+                if not success:
+                    response['error'] = log.strip()
+                elif reply:
+                    with open(output,'rb') as stream:
+                        response['data'] = base64.b64encode(stream.read()).decode()
+                else:
+                    response['output'] = output
+                return response
+            except Exception as error:
+                return {'id':ident, 'ok':False, 'error':repr(error)}
+            finally:
+                for file in cleanup:
+                    try:
+                        os.remove(file)
+                    except OSError:
+                        pass
+        return finish
+
+    def serve_stream(self, reader, writer):
+        """
+        Answers the requests read from reader, writing the responses to writer.
+
+        The requests are read and started as they arrive, while a second thread writes
+        each response as soon as it and every earlier response are ready.  This
+        function returns at the end of the input.
+
+        Parameter reader: The stream to read requests from
+        Precondition: reader is a binary file object open for reading
+
+        Parameter writer: The stream to write responses to
+        Precondition: writer is a binary file object open for writing
+        """
+        pending = queue.Queue(PENDING)
+
+        def respond():
+            finish = pending.get()
+            while finish is not None:
+                response = finish()
+                try:
+                    writer.write(json.dumps(response).encode()+b'\n')
+                    writer.flush()
+                except OSError:
+                    pass
+                finish = pending.get()
+
+        thread = threading.Thread(target=respond,daemon=True)
+        thread.start()
+        for line in reader:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if type(request) != dict:
+                    request = 'error: a request must be a JSON object'
+            except ValueError:
+                request = 'error: a request must be a JSON object on one line'
+            pending.put(self.submit(request))
+        pending.put(None)
+        thread.join()
+
+    def serve_socket(self, path):
+        """
+        Answers requests on a Unix socket at path, until interrupted.
+
+        Each connection is answered by its own thread (see serve_stream), so several
+        clients can send requests at once.
+
+        Parameter path: The file name of the socket
+        Precondition: path is a string
+        """
+        import socket
+        if os.path.exists(path):
+            os.remove(path)
+        listener = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+        listener.bind(path)
+        listener.listen()
+        try:
+            while True:
+                connection, address = listener.accept()
+                thread = threading.Thread(target=self.serve_connection,args=(connection,),
+                                          daemon=True)
+                thread.start()
+        finally:
+            listener.close()
+            os.remove(path)
+
+    def serve_connection(self, connection):
+        """
+        Answers the requests on one socket connection, then closes it.
+
+        Parameter connection: The connection
+        Precondition: connection is a connected socket
+        """
+        with connection:
+            reader = connection.makefile('rb')
+            writer = connection.makefile('wb')
+            try:
+                self.serve_stream(reader,writer)
+            finally:
+                reader.close()
+                writer.close()
+
+
+def stop(signum, frame):
+    """
+    Stops the server when it receives the signal SIGTERM, as for an interrupt.
+
+    Parameter signum: The signal number
+    Precondition: signum is an int
+
+    Parameter frame: The current stack frame
+    Precondition: frame is a frame object or None
+    """
+    raise KeyboardInterrupt()
+
+
+def serve(settings):
+    """
+    Runs pictool as a server with the given settings, until interrupted (or stopped
+    with SIGTERM).
+
+    If the setting socket is None, the requests are read from standard input and the
+    responses written to standard output, and the server stops at the end of the
+    input.  Otherwise they use a Unix socket with that file name.
+
+    Parameter settings: The pictool settings
+    Precondition: settings is a dictionary with the keys of pictool.SETTINGS
+    """
+    import signal
+    signal.signal(signal.SIGTERM,stop)
+    server = Server(settings)
+    try:
+        if settings['socket'] is None:
+            print('Serving on standard input',file=sys.stderr,flush=True)
+            server.serve_stream(sys.stdin.buffer,sys.stdout.buffer)
+        else:
+            print('Serving on '+repr(settings['socket']),file=sys.stderr,flush=True)
+            server.serve_socket(settings['socket'])
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+def request(path, requests):
+    """
+    Returns the responses to a list of requests sent to the server at path.
+
+    All of the requests are sent before any response is read.  This is meant for
+    clients written in Python, and for testing the server.
+
+    Parameter path: The file name of the server's socket
+    Precondition: path is a string
+
+    Parameter requests: The requests (see the module docstring)
+    Precondition: requests is a list of dictionaries
+    """
+    import socket
+    with socket.socket(socket.AF_UNIX,socket.SOCK_STREAM) as connection:
+        connection.connect(path)
+        data = b''.join([json.dumps(item).encode()+b'\n' for item in requests])
+        sender = threading.Thread(target=connection.sendall,args=(data,))
+        sender.start()
+        with connection.makefile('rb') as reader:
+            result = [json.loads(reader.readline()) for item in requests]
+        sender.join()
+    return result
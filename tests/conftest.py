@@ -0,0 +1,58 @@
+"""
+Shared setup for the tests of the pictool.
+
+The tests import the modules in the folder above this one (the folder containing
+pictool.py), so that folder is put first on the module search path.  Run the tests
+with python3 -m pytest from that folder.  The fixture home keeps the caches of the
+pictool out of the real home folder, and the fixture counters turns on the counters
+of the module instrument.
+
+Author: Michael Dickey
+Date: Oct 18 2026
+"""
+import os
+import sys
+
+import pytest
+
+
+# The folder containing pictool.py
+HOME = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0,HOME)
+
+
+@pytest.fixture
+def home(tmp_path, monkeypatch):
+    """
+    Returns a temporary home folder, holding every cache of the pictool.
+
+    The cache folders are found from the home folder when their modules are imported,
+    so they are moved into the temporary folder as well.
+    """
+    import pixelcache
+    import pyramid
+    import registry
+    import resultcache
+    import vectorized
+    monkeypatch.setenv('HOME',str(tmp_path))
+    folder = os.path.join(str(tmp_path),'.cache','pictool')
+    monkeypatch.setattr(pixelcache,'CACHE_DIR',os.path.join(folder,'pixels'))
+    monkeypatch.setattr(pyramid,'PYRAMID_DIR',os.path.join(folder,'pyramid'))
+    monkeypatch.setattr(registry,'REGISTRY_DIR',os.path.join(folder,'registry'))
+    monkeypatch.setattr(resultcache,'RESULT_DIR',os.path.join(folder,'results'))
+    monkeypatch.setattr(vectorized,'MASK_DIR',os.path.join(folder,'masks'))
+    return str(tmp_path)
+
+
+@pytest.fixture
+def counters():
+    """
+    Returns a function giving the counters of the module instrument, which are reset
+    and turned on for the test.
+    """
+    import instrument
+    instrument.enable()
+    yield lambda : instrument.report()['counters']
+    instrument.enable(False)
+    instrument.reset()
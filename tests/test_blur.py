@@ -0,0 +1,127 @@
+"""
+Tests for the blur plugins.
+
+The plugins plugins.blur and vectorized.blur compute every box from a summed-area 
+table.  These tests compare them to the definition in the docstring of plugins.blur:
+the average (rounded down) of all four values of every pixel in the box, with the 
+box clamped to the image edges.  The reference adds up every pixel in every box, 
+which is only fast enough for the small block_small_* images.
+
+Author: Michael Dickey
+Date: Oct 18 2026
+"""
+import glob
+import os
+
+import numpy
+import pytest
+from PIL import Image as CoreImage
+
+import introcs
+import pixelbuffer
+import plugins
+import vectorized
+
+
+# The images to blur
+IMAGES = sorted(glob.glob(os.path.join(os.path.dirname(plugins.__file__),'images',
+                                        'block_small_*.png')))
+
+# The radii to blur with (the last ones are larger than every image)
+RADII = [1, 2, 3, 5, 50]
+
+
+def load(file):
+    """
+    Returns the pixels of the given image file.
+
+    Parameter file: The image file
+    Precondition: file is a string naming an image file
+    """
+    with CoreImage.open(file) as image:
+        return numpy.array(image.convert('RGBA'),dtype=numpy.uint8)
+
+
+def reference(array, radius):
+    """
+    Returns the blurred pixels, adding up every pixel in every box.
+
+    Parameter array: The pixels to blur
+    Precondition: array is a numpy array of uint8 with shape height x width x 4
+
+    Parameter radius: The blur radius
+    Precondition: radius is an int > 0
+    """
+    height, width = array.shape[:2]
+    values = array.tolist()
+    result = numpy.empty_like(array)
+    for row in range(height):
+        for col in range(width):
+            totals = [0,0,0,0]
+            count = 0
+            for r in range(max(row-radius,0),min(row+radius+1,height)):
+                for c in range(max(col-radius,0),min(col+radius+1,width)):
+                    for channel in range(4):
+                        totals[channel] += values[r][c][channel]
+                    count += 1
+            result[row,col] = [total//count for total in totals]
+    return result
+
+
+def test_images_found():
+    """
+    Checks that there are images to test with.
+    """
+    assert len(IMAGES) > 0
+
+
+@pytest.mark.parametrize('file',IMAGES,ids=os.path.basename)
+@pytest.mark.parametrize('radius',RADII)
+def test_blur_table(file, radius):
+    """
+    Checks plugins.blur on a table of RGB objects.
+    """
+    array = load(file)
+    table = [[introcs.RGB(*pixel) for pixel in row] for row in array.tolist()]
+    assert plugins.blur(table,radius)
+    result = numpy.array([[pixel.rgba() for pixel in row] for row in table],dtype=numpy.uint8)
+    assert (result == reference(array,radius)).all()
+
+
+@pytest.mark.parametrize('file',IMAGES,ids=os.path.basename)
+@pytest.mark.parametrize('radius',RADII)
+def test_blur_buffer(file, radius):
+    """
+    Checks plugins.blur on a PixelBuffer.
+    """
+    array = load(file)
+    buffer = pixelbuffer.PixelBuffer(array.copy())
+    assert plugins.blur(buffer,radius)
+    assert (buffer.array == reference(array,radius)).all()
+
+
+@pytest.mark.parametrize('file',IMAGES,ids=os.path.basename)
+@pytest.mark.parametrize('radius',RADII)
+def test_blur_vectorized(file, radius):
+    """
+    Checks vectorized.blur on a PixelBuffer.
+    """
+    array = load(file)
+    buffer = pixelbuffer.PixelBuffer(array.copy())
+    assert vectorized.blur(buffer,radius)
+    assert (buffer.array == reference(array,radius)).all()
+
+
+@pytest.mark.parametrize('radius',[1, 4, 10])
+def test_blur_random(radius):
+    """
+    Checks both blurs on a random image that is not square, with varied alpha.
+    """
+    array = numpy.random.default_rng(radius).integers(0,256,(9,14,4),dtype=numpy.uint8)
+    expected = reference(array,radius)
+    buffer = pixelbuffer.PixelBuffer(array.copy())
+    plugins.blur(buffer,radius)
+    assert (buffer.array == expected).all()
+    buffer = pixelbuffer.PixelBuffer(array.copy())
+    vectorized.blur(buffer,radius)
+    assert (buffer.array == expected).all()
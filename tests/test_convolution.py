@@ -0,0 +1,42 @@
+"""
+Tests for the convolution engine.
+
+The module convolution can compute the same sums the direct way, the separable way or
+with the FFT.  Each way has its own float errors, but the results are snapped before
+they are rounded, so these tests check that every way gives exactly the same pixels.
+
+Author: Michael Dickey
+Date: Oct 18 2026
+"""
+
+import numpy
+import pytest
+
+import convolution
+
+
+# The kernels to compare, by name (the last ones are large enough to use the FFT)
+KERNELS = dict([(name,convolution.parse(name)) for name in convolution.KERNELS]+
+               [('binomial',convolution.parse('1,2,1/2,4,2/1,2,1')),
+                ('halves',convolution.parse('0.25,0.5,0.25')),
+                ('box9',numpy.ones((9,9))),
+                ('ints',numpy.random.default_rng(2).integers(-3,6,(5,5)).astype(float))])
+
+
+@pytest.mark.parametrize('name',sorted(KERNELS))
+def test_methods(name):
+    """
+    Tests that the direct, separable and FFT ways give the same pixels.
+    """
+    kernel = KERNELS[name]
+    methods = ['direct','fft']
+    if convolution.separate(kernel) is not None:
+        methods.append('separable')
+
+    source = numpy.random.default_rng(4).integers(0,256,(61,47,4),dtype=numpy.uint8)
+    expected = source.copy()
+    convolution.filter_array(expected,kernel)
+    for method in methods:
+        actual = source.copy()
+        convolution.filter_array(actual,kernel,4,method)
+        assert (actual == expected).all(), method
@@ -0,0 +1,250 @@
+"""
+Tests for the output encoders.
+
+The module encoders writes images as PNG, PPM, PAM, raw RGBA or npy files, a band of
+rows at a time.  These tests check that every format reads back (with encoders.load
+and with a reader of its own) as exactly the pixels that were written, and that the
+PNG files use the filter and compression level they are asked for.  An uncompressed
+input is memory-mapped copy-on-write, so they also check that processing it, even into
+the same file, never changes the file before the output is saved.
+
+Author: Michael Dickey
+Date: Oct 18 2026
+"""
+import os
+import struct
+import zlib
+
+import numpy
+import pytest
+from PIL import Image as CoreImage
+
+import encoders
+import pictool
+import pixelbuffer
+import plugins
+import pngstream
+
+
+# The size of the test image
+SHAPE = (37,26,4)
+
+# The uncompressed formats
+RAW_FORMATS = ['ppm','pam','raw','npy']
+
+# The number of rows in each band written
+BAND = 5
+
+
+def source():
+    """
+    Returns a random image with varied alpha, part noise and part smooth.
+    """
+    array = numpy.random.default_rng(12).integers(0,256,SHAPE,dtype=numpy.uint8)
+    rows, cols = numpy.indices(SHAPE[:2])
+    array[SHAPE[0]//2:,:,:3] = ((rows+2*cols) % 256)[SHAPE[0]//2:,:,numpy.newaxis]
+    return array
+
+
+def write(file, array, encoding=None):
+    """
+    Writes array to file with a writer from encoders.create, BAND rows at a time.
+
+    Parameter file: The image file to write
+    Precondition: file is a string
+
+    Parameter array: The pixels
+    Precondition: array is a numpy array of uint8 with shape height x width x 4
+
+    Parameter encoding: The encoder settings
+    Precondition: encoding is a dictionary or None
+    """
+    writer = encoders.create(file,array.shape[1],array.shape[0],encoding)
+    for start in range(0,array.shape[0],BAND):
+        writer.write(array[start:start+BAND])
+    writer.close()
+
+
+def read_raw(file, format):
+    """
+    Returns the pixels of an uncompressed file, read without the module encoders.
+
+    The pixels of a PPM file have an alpha of 255.
+
+    Parameter file: The image file to read
+    Precondition: file is a string naming a file in the given format
+
+    Parameter format: The format
+    Precondition: format is one of RAW_FORMATS
+    """
+    if format == 'npy':
+        return numpy.load(file)
+    elif format == 'ppm':
+        with CoreImage.open(file) as image:
+            return numpy.asarray(image.convert('RGBA'))
+
+    with open(file,'rb') as stream:
+        data = stream.read()
+    height, width = SHAPE[:2]
+    if format == 'raw':
+        assert data[:12] == b'RGBA'+struct.pack('<II',width,height)
+    else:
+        start = b'P7\nWIDTH %d\nHEIGHT %d\nDEPTH 4\nMAXVAL 255\n' % (width,height)
+        assert data.startswith(start) and b'ENDHDR\n' in data
+    return numpy.frombuffer(data[len(data)-width*height*4:],dtype=numpy.uint8).reshape(SHAPE)
+
+
+def png_stream(file):
+    """
+    Returns the decompressed pixel data of a PNG file, and the first byte after zlib's CMF.
+
+    The byte (FLG) records the compression level in its top two bits.
+
+    Parameter file: The PNG file
+    Precondition: file is a string naming a PNG file
+    """
+    with open(file,'rb') as stream:
+        data = stream.read()
+    pos = len(pngstream.SIGNATURE)
+    compressed = b''
+    while pos < len(data):
+        length, kind = struct.unpack('>I4s',data[pos:pos+8])
+        if kind == b'IDAT':
+            compressed += data[pos+8:pos+8+length]
+        pos += length+12
+    return (zlib.decompress(compressed),compressed[1])
+
+
+@pytest.mark.parametrize('format',RAW_FORMATS)
+def test_raw(format, tmp_path):
+    """
+    Tests that an uncompressed file reads back as the pixels that were written.
+    """
+    array = source()
+    file  = str(tmp_path / ('image'+encoders.suffix_of(format)))
+    write(file,array)
+    assert encoders.format_of(file) == format
+    assert encoders.detect(file) is not None
+
+    expected = array.copy()
+    if format == 'ppm':
+        expected[:,:,3] = 255
+    assert (read_raw(file,format) == expected).all()
+    assert (encoders.load(file) == expected).all()
+
+
+@pytest.mark.parametrize('format',RAW_FORMATS)
+def test_format(format, tmp_path):
+    """
+    Tests that the format setting takes the place of the suffix.
+    """
+    array = source()
+    file  = str(tmp_path / 'image.png')
+    write(file,array,{'format':format})
+    assert encoders.detect(file) is not None
+    assert (encoders.load(file)[:,:,:3] == array[:,:,:3]).all()
+
+
+@pytest.mark.parametrize('filter',encoders.PNG_FILTERS)
+def test_png_filter(filter, tmp_path):
+    """
+    Tests that a PNG file uses the filter it is asked for, and decodes to the same pixels.
+    """
+    array = source()
+    file  = str(tmp_path / 'image.png')
+    write(file,array,{'filter':filter})
+    with CoreImage.open(file) as image:
+        assert (numpy.asarray(image) == array).all()
+
+    data, flags = png_stream(file)
+    kinds = numpy.frombuffer(data,dtype=numpy.uint8).reshape(SHAPE[0],-1)[:,0]
+    if filter == 'adaptive':
+        assert len(set(kinds.tolist())) > 1
+    else:
+        assert (kinds == pngstream.FILTERS.index(filter)).all()
+
+
+@pytest.mark.parametrize('level',[0, 1, 6, 9])
+def test_png_level(level, tmp_path):
+    """
+    Tests that a PNG file is compressed with the level it is asked for.
+    """
+    array = source()
+    file  = str(tmp_path / 'image.png')
+    write(file,array,{'level':level})
+    with CoreImage.open(file) as image:
+        assert (numpy.asarray(image) == array).all()
+
+    # zlib records the level as 0 (for 0 and 1), 1 (2 to 5), 2 (6) or 3 (7 to 9)
+    data, flags = png_stream(file)
+    assert flags >> 6 == [0,0,1,1,1,1,2,3,3,3][level]
+    if level == 0:
+        assert os.path.getsize(file) > array.size
+
+
+@pytest.mark.parametrize('tile',['auto',0],ids=['tiled','whole'])
+def test_settings(tile, tmp_path, counters):
+    """
+    Tests that --compress-level, --png-filter and --format reach the encoder.
+    """
+    input = str(tmp_path / 'input.png')
+    CoreImage.fromarray(source(),'RGBA').save(input)
+    pipeline = pictool.parse_pipeline('mono',{})
+    settings = dict(pictool.SETTINGS,tile=tile)
+    settings['no-cache'] = True
+    settings['compress-level'] = 9
+    settings['png-filter'] = 'none'
+    output = str(tmp_path / 'output.png')
+    assert pictool.compute_file(pipeline,settings,input,output)
+    data, flags = png_stream(output)
+    assert flags >> 6 == 3
+    assert (numpy.frombuffer(data,dtype=numpy.uint8).reshape(SHAPE[0],-1)[:,0] == 0).all()
+
+    settings['format'] = 'pam'
+    assert pictool.compute_file(pipeline,settings,input,output)
+    assert read_raw(output,'pam').shape == SHAPE
+    assert (counters().get('bands') is not None) == (tile == 'auto')
+
+
+@pytest.mark.parametrize('format',RAW_FORMATS)
+def test_mapped(format, tmp_path, counters):
+    """
+    Tests that an uncompressed input is mapped, and that changing its pixels leaves the file alone.
+    """
+    array = source()
+    file  = str(tmp_path / ('image'+encoders.suffix_of(format)))
+    write(file,array)
+    with open(file,'rb') as stream:
+        before = stream.read()
+
+    buffer = pictool.read_image(file)
+    assert counters().get('mapped reads') == 1
+    assert isinstance(buffer.array,numpy.memmap) == (format != 'ppm')
+    assert (buffer.array[:,:,:3] == array[:,:,:3]).all()
+    assert (buffer.array[:,:,3] == (255 if format == 'ppm' else array[:,:,3])).all()
+
+    plugins.mono(buffer)
+    plugins.flip(buffer,True)
+    with open(file,'rb') as stream:
+        assert stream.read() == before
+
+
+@pytest.mark.parametrize('engine',['python','numpy'])
+@pytest.mark.parametrize('command',['flip','flip --vertical=True','mono','blur --radius=2'])
+@pytest.mark.parametrize('format',['pam','npy'])
+def test_in_place(format, command, engine, tmp_path):
+    """
+    Tests that processing a mapped file into itself gives the same pixels as a copy.
+    """
+    array = source()
+    file  = str(tmp_path / ('image'+encoders.suffix_of(format)))
+    write(file,array)
+    pipeline = pictool.parse_pipeline(command,{},engine)
+    expected = pixelbuffer.PixelBuffer(array.copy())
+    pictool.run_pipeline(pipeline,expected)
+
+    settings = dict(pictool.SETTINGS,engine=engine)
+    settings['no-cache'] = True
+    assert pictool.compute_file(pipeline,settings,file,file)
+    assert (read_raw(file,format) == expected.array).all()
+    assert not [name for name in os.listdir(str(tmp_path)) if name.endswith('.tmp')]
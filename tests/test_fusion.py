@@ -0,0 +1,65 @@
+"""
+Tests for the fused point-wise stages.
+
+The module fusion composes the tone curves of a chain (like dered) with each other and
+with the mono stages around them.  These tests check that every chain of up to three
+point-wise stages gives exactly the same pixels fused as it does one stage at a time,
+and that the tone curves really are composed into a single step.
+
+Author: Michael Dickey
+Date: Oct 18 2026
+"""
+import itertools
+
+import numpy
+import pytest
+
+import fusion
+import pixelbuffer
+import vectorized
+
+
+# The stages to chain
+STAGES = [('mono',vectorized.mono,{}), ('mono',vectorized.mono,{'sepia':True}),
+          ('dered',vectorized.dered,{}), ('vignette',vectorized.vignette,{})]
+
+# Every chain of one to three stages
+CHAINS = [list(chain) for length in range(1,4)
+          for chain in itertools.product(STAGES,repeat=length)]
+
+
+def chain_id(chain):
+    """
+    Returns the name of a chain for the test report.
+
+    Parameter chain: The stages
+    Precondition: chain is a list of (name, command, options) tuples
+    """
+    return '|'.join([name+('-sepia' if options else '') for (name, command, options) in chain])
+
+
+@pytest.mark.parametrize('chain',CHAINS,ids=chain_id)
+def test_fused(chain, monkeypatch):
+    """
+    Tests that a fused chain gives the same pixels as running its stages in order.
+    """
+    # Small blocks, so that vignette runs on several bands
+    monkeypatch.setattr(fusion,'BLOCK_PIXELS',500)
+    source = numpy.random.default_rng(7).integers(0,256,(37,53,4),dtype=numpy.uint8)
+
+    expected = pixelbuffer.PixelBuffer(source.copy())
+    for (name, command, options) in chain:
+        command(expected,**options)
+
+    actual = pixelbuffer.PixelBuffer(source.copy())
+    assert fusion.compile_chain(chain)(actual)
+    assert (actual.array == expected.array).all()
+
+
+def test_composed():
+    """
+    Tests that a chain of mono and dered stages is a single step.
+    """
+    chain = [STAGES[2],STAGES[0],STAGES[2],STAGES[1],STAGES[0],STAGES[2]]
+    assert len(fusion.compile_chain(chain).steps) == 1
+    assert len(fusion.compile_chain(chain+[STAGES[3]]+chain).steps) == 3
@@ -0,0 +1,82 @@
+"""
+Tests for the brightness curves of mono.
+
+The module lut looks up the new colors of mono in tables indexed by the brightness
+index, and computes the few pixels whose exact value is an int from the floats
+instead.  These tests compare the results to the float formula of plugins.mono for
+every possible color, and on both kinds of image buffer.
+
+Author: Michael Dickey
+Date: Oct 18 2026
+"""
+import numpy
+import pytest
+
+import introcs
+import lut
+import pixelbuffer
+
+
+# The sepia setting and the scales of red, green and blue for each kind of mono
+MODES = [(False,(1.0,1.0,1.0)), (True,lut.SEPIA_SCALES)]
+
+
+def expected(array, scales):
+    """
+    Returns the pixels after mono, computed with the float formula of plugins.mono.
+
+    Parameter array: The pixels
+    Precondition: array is a numpy array of uint8 with shape height x width x 4
+
+    Parameter scales: The scales of the brightness for red, green and blue
+    Precondition: scales is a tuple of three floats
+    """
+    bright = (0.3*array[:,:,0] + 0.6*array[:,:,1]) + 0.1*array[:,:,2]
+    result = array.copy()
+    for channel in range(3):
+        result[:,:,channel] = bright if scales[channel] == 1 else scales[channel]*bright
+    return result
+
+
+@pytest.mark.parametrize('sepia,scales',MODES)
+def test_every_color(sepia, scales):
+    """
+    Tests the brightness curves on a PixelBuffer with every RGB color.
+    """
+    values = numpy.arange(256,dtype=numpy.uint8)
+    array  = numpy.empty((256*256,256,4),dtype=numpy.uint8)
+    array[:,:,0] = numpy.repeat(values,256)[:,numpy.newaxis]
+    array[:,:,1] = numpy.tile(values,256)[:,numpy.newaxis]
+    array[:,:,2] = values
+    array[:,:,3] = values[::-1]
+
+    buffer = pixelbuffer.PixelBuffer(array.copy())
+    assert lut.apply_brightness(buffer,lut.SEPIA_CURVES if sepia else lut.GREY_CURVES)
+    assert (buffer.array == expected(array,scales)).all()
+
+
+@pytest.mark.parametrize('sepia,scales',MODES)
+def test_table(sepia, scales):
+    """
+    Tests the brightness curves on a table of RGB objects, including marked indices.
+    """
+    array = numpy.random.default_rng(5).integers(0,256,(40,50,4),dtype=numpy.uint8)
+    # Colors like (1,1,1) have an int brightness that the floats put just below it
+    array[0,:8,:3] = [[1,1,1],[2,2,2],[3,3,3],[0,0,10],[5,0,5],[255,255,255],[0,0,0],[10,5,0]]
+
+    table = [[introcs.RGB(*pixel) for pixel in row] for row in array.tolist()]
+    assert lut.apply_brightness(table,lut.SEPIA_CURVES if sepia else lut.GREY_CURVES)
+    result = numpy.array([[pixel.rgba() for pixel in row] for row in table],dtype=numpy.uint8)
+    assert (result == expected(array,scales)).all()
+
+
+def test_compose():
+    """
+    Tests that a tone curve composed after a brightness curve is applied to every pixel.
+    """
+    array = numpy.random.default_rng(6).integers(0,256,(30,30,4),dtype=numpy.uint8)
+    array[0,0,:3] = [1,1,1]
+    tone  = numpy.arange(256,dtype=numpy.uint8)[::-1]
+    curve = lut.compose_brightness(lut.GREY_CURVE,tone)
+    values = lut.brightness_values(array,(curve,curve,curve))
+    assert (values[0] == tone[expected(array,(1.0,1.0,1.0))[:,:,0]]).all()
@@ -0,0 +1,135 @@
+"""
+Tests for running plugins in bands of rows.
+
+With --workers, the stages in plugins.TILE_SAFE are split into bands with extra halo
+rows and run in worker processes (see parallel.run), and with --tile they are streamed
+through the file one band at a time (see pictool.process_tiled).  These tests check
+that both give exactly the same pixels as running the stages on the whole image, with
+bands that cut across blur boxes and pixellate blocks.
+
+Author: Michael Dickey
+Date: Oct 18 2026
+"""
+import numpy
+import pytest
+from PIL import Image as CoreImage
+
+import parallel
+import pictool
+import pixelbuffer
+import plugins
+import vectorized
+
+
+# The stages to split into bands, as (name, options)
+STAGES = [('blur',{'radius':1}), ('blur',{'radius':3}), ('blur',{'radius':25}),
+          ('gaussian',{'radius':2}), ('gaussian',{'radius':5,'sigma':1.0}),
+          ('pixellate',{}), ('pixellate',{'step':4}), ('pixellate',{'step_x':5,'step_y':7}),
+          ('pixellate',{'step_x':9,'step_y':3}), ('vignette',{}), ('mono',{'sepia':True})]
+
+# The plug-in engines
+ENGINES = {'python':plugins, 'numpy':vectorized}
+
+# The numbers of workers (so the bands start at different rows)
+WORKERS = [2, 3, 5]
+
+
+def stage_id(stage):
+    """
+    Returns the name of a stage for the test report.
+
+    Parameter stage: The stage
+    Precondition: stage is a (name, options) tuple
+    """
+    name, options = stage
+    return name+''.join(['-%s=%s' % (key,options[key]) for key in sorted(options)])
+
+
+def make_pipeline(stages, engine):
+    """
+    Returns the pipeline for the given stages, using the plugins of engine.
+
+    A stage missing from the engine uses the function in plugins.
+
+    Parameter stages: The stages
+    Precondition: stages is a list of (name, options) tuples
+
+    Parameter engine: The plug-in engine
+    Precondition: engine is a key of ENGINES
+    """
+    result = []
+    for (name, options) in stages:
+        command = getattr(ENGINES[engine],name,getattr(plugins,name))
+        result.append((name,command,options))
+    return result
+
+
+def source():
+    """
+    Returns a random 61 x 43 image with varied alpha.
+    """
+    return numpy.random.default_rng(11).integers(0,256,(61,43,4),dtype=numpy.uint8)
+
+
+def serial(pipeline):
+    """
+    Returns the pixels of source() after running pipeline on the whole image.
+
+    Parameter pipeline: The pipeline
+    Precondition: pipeline is a list of (name, command, options) tuples
+    """
+    buffer = pixelbuffer.PixelBuffer(source())
+    pictool.run_pipeline(pipeline,buffer)
+    return buffer.array
+
+
+@pytest.fixture(scope='module',autouse=True)
+def pool():
+    """
+    Closes the worker pool after the tests.
+    """
+    yield
+    parallel.shutdown()
+
+
+@pytest.mark.parametrize('workers',WORKERS)
+@pytest.mark.parametrize('engine',sorted(ENGINES))
+@pytest.mark.parametrize('stage',STAGES,ids=stage_id)
+def test_workers(stage, engine, workers):
+    """
+    Tests that a stage run by worker processes matches the serial result.
+    """
+    pipeline = make_pipeline([stage],engine)
+    assert pictool.tile_halo(pipeline[0][1],pipeline[0][2]) is not None
+    buffer = pixelbuffer.PixelBuffer(source())
+    pictool.run_pipeline(pipeline,buffer,workers)
+    assert buffer.array.tobytes() == serial(pipeline).tobytes()
+
+
+@pytest.mark.parametrize('workers',WORKERS)
+@pytest.mark.parametrize('engine',sorted(ENGINES))
+def test_workers_chain(engine, workers):
+    """
+    Tests that a chain of stages with halos run by worker processes matches the serial result.
+    """
+    stages   = [('blur',{'radius':3}),('pixellate',{'step_x':4,'step_y':9}),
+                ('vignette',{}),('blur',{'radius':2})]
+    pipeline = make_pipeline(stages,engine)
+    buffer = pixelbuffer.PixelBuffer(source())
+    pictool.run_pipeline(pipeline,buffer,workers,engine == 'numpy')
+    assert buffer.array.tobytes() == serial(pipeline).tobytes()
+
+
+@pytest.mark.parametrize('rows',[1, 8, 13])
+@pytest.mark.parametrize('stage',STAGES,ids=stage_id)
+def test_tiled(stage, rows, tmp_path):
+    """
+    Tests that a stage streamed through a file in bands matches the serial result.
+    """
+    pipeline = make_pipeline([stage],'numpy')
+    input  = str(tmp_path / 'input.png')
+    output = str(tmp_path / 'output.npy')
+    CoreImage.fromarray(source(),'RGBA').save(input)
+
+    assert pictool.process_tiled(pipeline,input,output,rows)
+    assert numpy.load(output).tobytes() == serial(pipeline).tobytes()
@@ -0,0 +1,141 @@
+"""
+Tests for the decoded pixel cache.
+
+The module pixelcache keeps the decoded pixels of each image, found by its path,
+modification time and size.  These tests check that changing the time or the size of
+an image makes its entry unused, that --no-cache neither reads nor writes the cache,
+and that the least recently used entries are removed to keep the cache under
+CACHE_LIMIT.
+
+Author: Michael Dickey
+Date: Oct 18 2026
+"""
+import os
+
+import numpy
+import pytest
+from PIL import Image as CoreImage
+
+import pictool
+import pixelcache
+
+
+def make_image(file, seed):
+    """
+    Saves a random 20 x 30 PNG image, and returns its pixels.
+
+    Parameter file: The image file to write
+    Precondition: file is a string
+
+    Parameter seed: The random seed
+    Precondition: seed is an int
+    """
+    array = numpy.random.default_rng(seed).integers(0,256,(20,30,4),dtype=numpy.uint8)
+    CoreImage.fromarray(array,'RGBA').save(file)
+    return array
+
+
+def entries():
+    """
+    Returns the names of the entries in the cache, in alphabetical order.
+    """
+    if not os.path.isdir(pixelcache.CACHE_DIR):
+        return []
+    return sorted([name for name in os.listdir(pixelcache.CACHE_DIR) if name.endswith('.npy')])
+
+
+def test_lookup(home):
+    """
+    Tests that a stored image is found, with the same pixels.
+    """
+    file = os.path.join(home,'image.png')
+    array = make_image(file,1)
+    assert pixelcache.lookup(file) is None
+    pixelcache.store(file,array)
+    assert (pixelcache.lookup(file) == array).all()
+    assert len(entries()) == 1
+
+
+def test_mtime(home):
+    """
+    Tests that changing the modification time of an image makes its entry unused.
+    """
+    file = os.path.join(home,'image.png')
+    pixelcache.store(file,make_image(file,2))
+    info = os.stat(file)
+    os.utime(file,ns=(info.st_atime_ns,info.st_mtime_ns+1000))
+    assert pixelcache.lookup(file) is None
+
+    os.utime(file,ns=(info.st_atime_ns,info.st_mtime_ns))
+    assert pixelcache.lookup(file) is not None
+
+
+def test_size(home):
+    """
+    Tests that changing the size of an image (but not its time) makes its entry unused.
+    """
+    file = os.path.join(home,'image.png')
+    pixelcache.store(file,make_image(file,3))
+    info = os.stat(file)
+    with open(file,'ab') as stream:
+        stream.write(b'extra')      # Ignored after the end of the image
+    os.utime(file,ns=(info.st_atime_ns,info.st_mtime_ns))
+    assert os.stat(file).st_size != info.st_size
+    assert pixelcache.lookup(file) is None
+
+
+@pytest.mark.parametrize('tile',['auto',0],ids=['tiled','whole'])
+def test_no_cache(tile, home, counters):
+    """
+    Tests that --no-cache does not use or add cache entries, and that the cache is used otherwise.
+    """
+    input  = os.path.join(home,'image.png')
+    output = os.path.join(home,'output.png')
+    make_image(input,4)
+    pipeline = pictool.parse_pipeline('mono',{})
+    settings = dict(pictool.SETTINGS,tile=tile)
+    settings['no-cache'] = True
+    assert pictool.compute_file(pipeline,settings,input,output)
+    assert entries() == []
+
+    settings['no-cache'] = False
+    assert pictool.compute_file(pipeline,settings,input,output)
+    assert len(entries()) == 1
+    assert counters().get('cache misses') == 1
+
+    settings['no-cache'] = True
+    assert pictool.compute_file(pipeline,settings,input,output)
+    assert counters().get('cache hits') is None
+
+    settings['no-cache'] = False
+    assert pictool.compute_file(pipeline,settings,input,output)
+    assert counters().get('cache hits') == 1
+
+
+def test_evict(home, monkeypatch):
+    """
+    Tests that the least recently used entries are removed to keep the cache under CACHE_LIMIT.
+    """
+    files = [os.path.join(home,'image%d.png' % pos) for pos in range(4)]
+    arrays = [make_image(file,pos) for (pos, file) in enumerate(files)]
+    pixelcache.store(files[0],arrays[0])
+    size = os.path.getsize(os.path.join(pixelcache.CACHE_DIR,entries()[0]))
+    monkeypatch.setattr(pixelcache,'CACHE_LIMIT',2*size)
+
+    # Entries 0 and 1, with 0 used long ago and 1 used less long ago
+    pixelcache.store(files[1],arrays[1])
+    for pos in range(2):
+        os.utime(pixelcache.entry_name(files[pos]),(1000*(pos+1),1000*(pos+1)))
+    assert len(entries()) == 2
+
+    # Using entry 0 makes 1 the least recently used
+    assert pixelcache.lookup(files[0]) is not None
+    pixelcache.store(files[2],arrays[2])
+    assert pixelcache.lookup(files[1]) is None
+    assert pixelcache.lookup(files[0]) is not None
+    assert pixelcache.lookup(files[2]) is not None
+
+    pixelcache.store(files[3],arrays[3])
+    total = sum([os.path.getsize(os.path.join(pixelcache.CACHE_DIR,name)) for name in entries()])
+    assert len(entries()) == 2 and total <= pixelcache.CACHE_LIMIT
+    assert pixelcache.lookup(files[3]) is not None
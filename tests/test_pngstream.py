@@ -0,0 +1,168 @@
+"""
+Tests for the streaming PNG reader.
+
+A PNGReader decodes a PNG file a band of rows at a time (see the module pngstream).
+These tests check that the rows it returns are exactly those of a full PIL decode, for
+every filter type and every color type it reads, at several band heights.  They also
+check that a streamed run that fails part way does not leave an output file behind.
+
+Author: Michael Dickey
+Date: Oct 18 2026
+"""
+import os
+import struct
+import zlib
+
+import numpy
+import pytest
+from PIL import Image as CoreImage
+
+import pictool
+import plugins
+import pngstream
+
+
+# The color types, as (PNG color type, bytes per pixel, has tRNS)
+COLORS = {'L':(0,1,False), 'L-tRNS':(0,1,True), 'RGB':(2,3,False), 'RGB-tRNS':(2,3,True),
+          'P':(3,1,False), 'P-tRNS':(3,1,True), 'LA':(4,2,False), 'RGBA':(6,4,False)}
+
+# The filters for the rows (mixed cycles through all five, one row at a time)
+FILTERS = list(pngstream.FILTERS)+['mixed']
+
+# The numbers of rows to read at a time
+BANDS = [1, 7, 64]
+
+# The image size
+WIDTH  = 23
+HEIGHT = 29
+
+
+def write_png(file, color, filter):
+    """
+    Writes a small PNG file of the given color type, with every row using filter.
+
+    The pixels are random, but use only a few values, so that some of them match the
+    transparent color of the tRNS chunk.  The pixel data is split into several IDAT
+    chunks.
+
+    Parameter file: The image file to write
+    Precondition: file is a string
+
+    Parameter color: The color type
+    Precondition: color is a key of COLORS
+
+    Parameter filter: The row filter
+    Precondition: filter is an element of FILTERS
+    """
+    kind, bpp, transparent = COLORS[color]
+    random = numpy.random.default_rng(len(color)+FILTERS.index(filter))
+    values = numpy.array([0,17,128,200,255],dtype=numpy.uint8)
+    data   = values[random.integers(0,len(values),(HEIGHT,WIDTH*bpp))]
+
+    chunks = [(b'IHDR',struct.pack('>IIBBBBB',WIDTH,HEIGHT,8,kind,0,0,0))]
+    if kind == 3:
+        data = random.integers(0,12,(HEIGHT,WIDTH),dtype=numpy.uint8)
+        chunks.append((b'PLTE',random.integers(0,256,36,dtype=numpy.uint8).tobytes()))
+        if transparent:
+            chunks.append((b'tRNS',bytes([0,90,255,30])))
+    elif transparent:
+        chunks.append((b'tRNS',struct.pack('>'+'H'*bpp,*data[0,:bpp])))
+
+    above = numpy.zeros_like(data)
+    above[1:] = data[:-1]
+    lines = numpy.empty((HEIGHT,WIDTH*bpp+1),dtype=numpy.uint8)
+    for row in range(HEIGHT):
+        code = row % 5 if filter == 'mixed' else FILTERS.index(filter)
+        lines[row,0] = code
+        lines[row,1:] = pngstream._filter(code,data[row:row+1],above[row:row+1],bpp)[0]
+    compressed = zlib.compress(lines.tobytes())
+    chunks.extend([(b'IDAT',compressed[pos:pos+100]) for pos in range(0,len(compressed),100)])
+    chunks.append((b'IEND',b''))
+
+    with open(file,'wb') as stream:
+        stream.write(pngstream.SIGNATURE)
+        for (name, contents) in chunks:
+            stream.write(pngstream._chunk_bytes(name,contents))
+
+
+def stream(file, rows):
+    """
+    Returns the pixels of file read by a PNGReader, rows at a time.
+
+    Parameter file: The image file to read
+    Precondition: file is a string naming a file that a PNGReader can read
+
+    Parameter rows: The number of rows to read at a time
+    Precondition: rows is an int > 0
+    """
+    reader = pngstream.PNGReader(file)
+    try:
+        bands = []
+        while reader.row < reader.height:
+            bands.append(reader.read(rows))
+        assert reader.read(rows).shape[0] == 0
+        return numpy.concatenate(bands)
+    finally:
+        reader.close()
+
+
+def decode(file):
+    """
+    Returns the pixels of file decoded by PIL, as RGBA.
+
+    Parameter file: The image file to read
+    Precondition: file is a string naming a PNG file
+    """
+    with CoreImage.open(file) as image:
+        return numpy.asarray(image.convert('RGBA'))
+
+
+@pytest.mark.parametrize('rows',BANDS)
+@pytest.mark.parametrize('filter',FILTERS)
+@pytest.mark.parametrize('color',sorted(COLORS))
+def test_filters(color, filter, rows, tmp_path):
+    """
+    Tests that a PNGReader matches PIL for each color type and filter.
+    """
+    file = str(tmp_path / 'image.png')
+    write_png(file,color,filter)
+    assert pngstream.streamable(file)
+    assert (stream(file,rows) == decode(file)).all()
+
+
+@pytest.mark.parametrize('rows',BANDS)
+@pytest.mark.parametrize('mode',['L','LA','RGB','RGBA','P'])
+def test_pil(mode, rows, tmp_path):
+    """
+    Tests that a PNGReader matches PIL on a file saved by PIL, which picks the filters.
+    """
+    file = str(tmp_path / 'image.png')
+    pixels = numpy.random.default_rng(5).integers(0,256,(HEIGHT,WIDTH,4),dtype=numpy.uint8)
+    pixels[HEIGHT//2:] //= 16     # Flat enough that some rows use other filters
+    image = CoreImage.fromarray(pixels,'RGBA')
+    image = image.convert('RGB').quantize(40) if mode == 'P' else image.convert(mode)
+    image.save(file)
+    assert (stream(file,rows) == decode(file)).all()
+
+
+def fail(image):
+    """
+    Raises a RuntimeError (a plugin that fails on the second band).
+
+    Parameter image: The image to process
+    Precondition: image is a PixelBuffer
+    """
+    if image.band[0] > 0:
+        raise RuntimeError('the plugin failed')
+
+
+@pytest.mark.parametrize('suffix',['png','npy','pam'])
+def test_failed(suffix, tmp_path, monkeypatch):
+    """
+    Tests that a streamed run that fails part way leaves no output file.
+    """
+    monkeypatch.setitem(plugins.TILE_SAFE,'fail',0)
+    input  = os.path.join(os.path.dirname(plugins.__file__),'images','Walker.png')
+    output = str(tmp_path / ('output.'+suffix))
+    assert not pictool.process_tiled([('fail',fail,{})],input,output,16)
+    assert not os.path.exists(output)
@@ -0,0 +1,136 @@
+"""
+Tests for the image pyramids.
+
+Each level of a pyramid is half the size of the one before, and each of its pixels is
+the rounded average of the 2x2 block it covers (see the module pyramid).  These tests
+check the exact pixels of downsample, including odd edges, the sizes and the levels
+chosen for --level and --max-size, and that levels are found again in the cache.
+
+Author: Michael Dickey
+Date: Oct 18 2026
+"""
+import os
+
+import numpy
+import pytest
+from PIL import Image as CoreImage
+
+import pictool
+import pyramid
+
+
+def reference(array):
+    """
+    Returns the next level after array, computed one block at a time.
+
+    Each pixel is the average of the pixels of its block that are inside the image,
+    rounded to the nearest int (with halves rounded up).
+
+    Parameter array: The pixels of a level
+    Precondition: array is a numpy array of uint8 with shape height x width x 4
+    """
+    height, width = array.shape[:2]
+    result = numpy.zeros(((height+1)//2,(width+1)//2,4),dtype=numpy.uint8)
+    for row in range(result.shape[0]):
+        for col in range(result.shape[1]):
+            block = array[2*row:2*row+2,2*col:2*col+2].reshape(-1,4).astype(int)
+            count = block.shape[0]
+            result[row,col] = (2*block.sum(axis=0)+count)//(2*count)
+    return result
+
+
+def test_downsample_values():
+    """
+    Tests downsample on a 3 x 3 image, worked out by hand.
+    """
+    array = numpy.zeros((3,3,4),dtype=numpy.uint8)
+    array[:,:,0] = [[0,1,10],[1,0,11],[7,8,255]]
+    array[:,:,1] = [[0,0,3],[1,1,0],[0,1,0]]
+    array[:,:,2] = 255
+    array[:,:,3] = [[255,255,0],[255,254,0],[1,2,3]]
+    result = pyramid.downsample(array)
+    assert result.shape == (2,2,4)
+
+    # (0+1+1+0)/4 = 0.5 rounds up, (10+11)/2 = 10.5 rounds up, (7+8)/2 = 7.5 rounds up
+    assert result[:,:,0].tolist() == [[1,11],[8,255]]
+    # 2/4 = 0.5, 3/2 = 1.5, 1/2 = 0.5 and 0
+    assert result[:,:,1].tolist() == [[1,2],[1,0]]
+    assert result[:,:,2].tolist() == [[255,255],[255,255]]
+    # 1019/4 = 254.75, 0, 3/2 = 1.5 and 3
+    assert result[:,:,3].tolist() == [[255,0],[2,3]]
+
+
+@pytest.mark.parametrize('shape',[(1,1), (1,2), (2,1), (2,2), (3,5), (8,8), (17,30), (31,9)])
+def test_downsample(shape):
+    """
+    Tests downsample against the block by block reference, for even and odd sizes.
+    """
+    array = numpy.random.default_rng(sum(shape)).integers(0,256,shape+(4,),dtype=numpy.uint8)
+    assert (pyramid.downsample(array) == reference(array)).all()
+
+
+def test_sizes():
+    """
+    Tests level_size and level_count, which round odd sizes up.
+    """
+    assert [pyramid.level_size(5,3,level) for level in range(4)] == [(5,3),(3,2),(2,1),(1,1)]
+    assert pyramid.level_count(5,3) == 4
+    assert pyramid.level_count(512,512) == 10
+    assert pyramid.level_count(513,2) == 11
+    assert pyramid.level_count(1,1) == 1
+    assert pyramid.level_size(512,384,9) == (1,1)
+
+
+def test_choose():
+    """
+    Tests the level chosen for a level or a largest size.
+    """
+    assert pyramid.choose(512,384) == 0
+    assert pyramid.choose(512,384,3) == 3
+    assert pyramid.choose(512,384,50) == 9
+    assert pyramid.choose(512,384,0,(1,1)) == 0
+    assert pyramid.choose(512,384,None,(512,384)) == 0
+    assert pyramid.choose(512,384,None,(511,384)) == 1
+    assert pyramid.choose(512,384,None,(256,1000)) == 1
+    assert pyramid.choose(512,384,None,(100,100)) == 3
+    assert pyramid.choose(512,384,None,(64,48)) == 3
+    assert pyramid.choose(512,384,None,(63,48)) == 4
+    assert pyramid.choose(512,384,None,(1,1)) == 9
+
+
+@pytest.mark.parametrize('text,size',[('640x480',(640,480)), ('1X1',(1,1)), ('007x3',(7,3)),
+                                      ('640',None), ('0x480',None), ('640x0',None),
+                                      ('-640x480',None), ('640x480x3',None), (' 640x480',None),
+                                      ('640.5x480',None), ('x',None), ('',None), (640,None),
+                                      (None,None)])
+def test_parse_size(text, size):
+    """
+    Tests that parse_size accepts only two positive ints separated by an x.
+    """
+    assert pyramid.parse_size(text) == size
+
+
+def test_cache(home, counters):
+    """
+    Tests that the levels are made once, saved, and then found in the cache.
+    """
+    file  = os.path.join(home,'image.png')
+    array = numpy.random.default_rng(3).integers(0,256,(21,38,4),dtype=numpy.uint8)
+    CoreImage.fromarray(array,'RGBA').save(file)
+
+    expected = [array]
+    while expected[-1].shape[:2] != (1,1):
+        expected.append(reference(expected[-1]))
+    assert len(expected) == pyramid.level_count(38,21)
+
+    first = pictool.read_image(file,True,True,2)
+    assert (first.array == expected[2]).all()
+    assert counters().get('pyramid misses') == 1
+    for level in range(1,len(expected)):
+        buffer = pictool.read_image(file,True,True,level)
+        assert (buffer.array == expected[level]).all()
+    assert counters().get('pyramid misses') == 1
+    assert counters().get('pyramid hits') == len(expected)-1
+
+    # A level past the last is the last (pictool asks for it through choose)
+    assert (pyramid.build(file,array,len(expected)+3,False) == expected[-1]).all()
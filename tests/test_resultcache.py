@@ -0,0 +1,142 @@
+"""
+Tests for the saved results.
+
+With --memo, the pictool copies a saved output instead of processing the same input
+with the same pipeline again (see pictool.process_file and the module resultcache).
+These tests check that a saved result gives exactly the bytes of the original output,
+and that changing the pipeline, the options, the encoding, the input or the source
+code of the pictool means the result is not used.
+
+Author: Michael Dickey
+Date: Oct 18 2026
+"""
+import os
+
+import numpy
+import pytest
+from PIL import Image as CoreImage
+
+import pictool
+import resultcache
+
+
+# The changes that must not use the saved result of 'mono' saved as PNG, as (pipeline, settings)
+CHANGES = {'pipeline':('dered',{}), 'options':('mono --sepia=True',{}),
+           'chain':('mono|flip',{}), 'level':('mono',{'compress-level':1}),
+           'filter':('mono',{'png-filter':'paeth'}), 'format':('mono',{'format':'pam'}),
+           'pyramid':('mono',{'level':1})}
+
+
+def make_input(home):
+    """
+    Returns the name of a random 40 x 30 PNG image saved in the folder home.
+
+    Parameter home: The folder to save to
+    Precondition: home is a string naming a folder
+    """
+    file = os.path.join(home,'input.png')
+    array = numpy.random.default_rng(8).integers(0,256,(30,40,4),dtype=numpy.uint8)
+    CoreImage.fromarray(array,'RGBA').save(file)
+    return file
+
+
+def run(text, input, output, **changes):
+    """
+    Returns True after running the pipeline text on input with --memo.
+
+    Parameter text: The pipeline
+    Precondition: text is a pipeline that pictool.parse_pipeline accepts
+
+    Parameter input: The image file to read
+    Precondition: input is a string naming an image file
+
+    Parameter output: The file name to save to
+    Precondition: output is a string
+
+    Parameter changes: The settings to change from the defaults
+    Precondition: changes is a dictionary of pictool settings
+    """
+    settings = dict(pictool.SETTINGS,memo=True)
+    settings.update(changes)
+    return pictool.process_file(pictool.parse_pipeline(text,{}),settings,input,output)
+
+
+def read_bytes(file):
+    """
+    Returns the contents of file.
+
+    Parameter file: The file to read
+    Precondition: file is a string naming an existing file
+    """
+    with open(file,'rb') as stream:
+        return stream.read()
+
+
+def test_hit(home, counters):
+    """
+    Tests that a saved result is copied to the output with exactly the same bytes.
+    """
+    input  = make_input(home)
+    output = os.path.join(home,'output.png')
+    assert run('mono',input,output)
+    assert counters().get('result misses') == 1
+    expected = read_bytes(output)
+
+    other = os.path.join(home,'other.png')
+    assert run('mono',input,other)
+    assert counters().get('result hits') == 1
+    assert counters().get('result misses') == 1
+    assert read_bytes(other) == expected
+
+
+@pytest.mark.parametrize('change',sorted(CHANGES))
+def test_miss(change, home, counters):
+    """
+    Tests that a changed pipeline, options or encoding does not use the saved result.
+    """
+    input = make_input(home)
+    assert run('mono',input,os.path.join(home,'output.png'))
+
+    text, settings = CHANGES[change]
+    suffix = '.'+settings.get('format','png')
+    assert run(text,input,os.path.join(home,'changed'+suffix),**settings)
+    assert counters().get('result hits') is None
+    assert counters().get('result misses') == 2
+
+
+def test_input(home, counters):
+    """
+    Tests that changing the contents of the input does not use the saved result.
+    """
+    input  = make_input(home)
+    output = os.path.join(home,'output.png')
+    assert run('mono',input,output)
+    expected = read_bytes(output)
+
+    CoreImage.open(input).transpose(CoreImage.Transpose.FLIP_LEFT_RIGHT).save(input)
+    assert run('mono',input,output)
+    assert counters().get('result hits') is None
+    assert read_bytes(output) != expected
+
+
+def test_sources(home, monkeypatch):
+    """
+    Tests that changing a source file of the pictool gives a new key.
+    """
+    input = make_input(home)
+    folder = os.path.join(home,'source')
+    os.mkdir(folder)
+    module = os.path.join(folder,'plugins.py')
+    with open(module,'w') as stream:
+        stream.write('VERSION = 1\n')
+    monkeypatch.setattr(resultcache,'HOME',folder)
+
+    pipeline = pictool.parse_pipeline('mono',{})
+    monkeypatch.setattr(resultcache,'_sources',None)
+    before = resultcache.result_key(input,pipeline,'.png')
+    assert resultcache.result_key(input,pipeline,'.png') == before
+
+    with open(module,'w') as stream:
+        stream.write('VERSION = 2\n')
+    monkeypatch.setattr(resultcache,'_sources',None)
+    assert resultcache.result_key(input,pipeline,'.png') != before
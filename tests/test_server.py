@@ -0,0 +1,155 @@
+"""
+Tests for the server mode of the pictool.
+
+These tests run pictool.py serve as a separate process, sending it requests on
+standard input and reading the responses from standard output (see the module server).
+They check that pipelined responses come back in the order of the requests, that bad
+requests get an error response, that images sent as data come back in the requested
+format, and that level and max-size process a smaller level of the image.
+
+Author: Michael Dickey
+Date: Oct 18 2026
+"""
+import base64
+import io
+import json
+import os
+import subprocess
+import sys
+
+import numpy
+import pytest
+from PIL import Image as CoreImage
+
+import pictool
+import pixelbuffer
+import plugins
+import server
+
+
+# The bundled image for the requests
+IMAGE = os.path.join(os.path.dirname(plugins.__file__),'images','Walker.png')
+
+# The small bundled image for the requests
+SMALL = os.path.join(os.path.dirname(plugins.__file__),'images','block_small_1.png')
+
+
+def serve(requests, jobs):
+    """
+    Returns the responses of a server to the given requests, sent all at once.
+
+    Parameter requests: The request lines (dictionaries are sent as JSON)
+    Precondition: requests is a list of dictionaries or strings
+
+    Parameter jobs: The number of worker processes of the server
+    Precondition: jobs is an int > 0
+    """
+    lines = [item if type(item) == str else json.dumps(item) for item in requests]
+    result = subprocess.run([sys.executable,pictool.__file__,'serve','--jobs=%d' % jobs],
+                            input=('\n'.join(lines)+'\n').encode(),capture_output=True,
+                            timeout=120)
+    assert result.returncode == 0, result.stderr.decode()
+    return [json.loads(line) for line in result.stdout.splitlines()]
+
+
+def decode(response):
+    """
+    Returns the npy file sent back in a response, as an array.
+
+    Parameter response: The response
+    Precondition: response is a successful response with the key data
+    """
+    return numpy.load(io.BytesIO(base64.b64decode(response['data'])))
+
+
+def expected(text, input, **changes):
+    """
+    Returns the pixels of input after pictool runs the pipeline text on it.
+
+    Parameter text: The pipeline
+    Precondition: text is a pipeline that pictool.parse_pipeline accepts
+
+    Parameter input: The image file to read
+    Precondition: input is a string naming an image file
+
+    Parameter changes: The settings to change from the defaults
+    Precondition: changes is a dictionary of pictool settings
+    """
+    level  = pictool.image_level(dict(pictool.SETTINGS,**changes),input)
+    buffer = pictool.read_image(input,True,False,level)
+    pictool.run_pipeline(pictool.parse_pipeline(text,{}),buffer)
+    return buffer.array
+
+
+@pytest.mark.parametrize('jobs',[1, 2])
+def test_order(jobs, home):
+    """
+    Tests that pipelined responses are in the order of the requests, slow or fast.
+    """
+    requests = [{'command':'blur --radius=4','input':IMAGE,'id':'slow'}]
+    requests += [{'command':'mono','input':SMALL,'id':pos} for pos in range(6)]
+    requests.append({'command':'flip','input':IMAGE,'id':'last'})
+    responses = serve(requests,jobs)
+    assert [response['id'] for response in responses] == [item['id'] for item in requests]
+    assert all([response['ok'] for response in responses])
+
+
+def test_errors(home):
+    """
+    Tests that bad requests get an error response, without stopping the server.
+    """
+    data = base64.b64encode(open(SMALL,'rb').read()).decode()
+    requests = ['{"command": "mono", "input"', '[1, 2]',
+                {'command':'nonsense','input':SMALL,'id':3},
+                {'command':'mono','data':'not base64!','id':4},
+                {'command':'mono','id':5},
+                {'command':'mono','data':data,'format':'gif','id':6},
+                {'command':'mono','input':SMALL,'level':-1,'id':7},
+                {'command':'mono','input':SMALL,'max-size':'big','id':8},
+                {'command':'mono','input':SMALL,'id':9}]
+    responses = serve(requests,1)
+    assert [response['id'] for response in responses] == [None,None,3,4,5,6,7,8,9]
+    assert [response['ok'] for response in responses] == [False]*8+[True]
+    for response in responses[:-1]:
+        assert response['error'].startswith('error:')
+    assert 'base64' in responses[3]['error']
+    assert 'nonsense' in responses[2]['error']
+
+
+@pytest.mark.parametrize('format',['png', 'npy', '.pam', 'raw', 'rgba', 'ppm'])
+def test_data(format, home):
+    """
+    Tests that an image sent as data comes back processed, in the requested format.
+    """
+    array = numpy.random.default_rng(9).integers(0,256,(21,34,4),dtype=numpy.uint8)
+    stream = io.BytesIO()
+    CoreImage.fromarray(array,'RGBA').save(stream,'PNG')
+    request = {'command':'mono','data':base64.b64encode(stream.getvalue()).decode()}
+    if format != 'png':
+        request['format'] = format
+    response = serve([request],1)[0]
+    assert response['ok'], response
+
+    file = os.path.join(home,'result'+server.format_suffix(format))
+    with open(file,'wb') as stream:
+        stream.write(base64.b64decode(response['data']))
+    result = pictool.read_image(file).array
+    buffer = pixelbuffer.PixelBuffer(array.copy())
+    plugins.mono(buffer)
+    channels = 3 if format == 'ppm' else 4
+    assert (result[:,:,:channels] == buffer.array[:,:,:channels]).all()
+
+
+@pytest.mark.parametrize('key,value,shape',[('level',1,(256,256)),('level',3,(64,64)),
+                                            ('max-size','100x300',(64,64)),
+                                            ('max-size','512x512',(512,512))])
+def test_level(key, value, shape, home):
+    """
+    Tests that level and max-size process a smaller level of the image.
+    """
+    request = {'command':'mono','input':IMAGE,'format':'npy',key:value}
+    response = serve([request],1)[0]
+    assert response['ok'], response
+    result = decode(response)
+    assert result.shape == shape+(4,)
+    assert (result == expected('mono',IMAGE,**{key:value})).all()
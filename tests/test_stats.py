@@ -0,0 +1,149 @@
+"""
+Tests for the plugins that look at an image without changing it.
+
+The plugin stats prints the measurements of the module imagestats, and display prints
+the pixels of a region of the image, up to --max-cells of them.  These tests check the
+exact values that measure returns, the output of stats, and which rows and columns
+display prints.
+
+Author: Michael Dickey
+Date: Oct 18 2026
+"""
+import introcs
+import numpy
+import pytest
+
+import imagestats
+import pixelbuffer
+import plugins
+
+
+def small():
+    """
+    Returns a 2 x 3 image whose statistics are worked out by hand.
+
+    The pixels (0,0), (1,0) and (1,2) only differ in alpha, so there are 4 different colors.
+    """
+    return numpy.array([[[10,0,255,255],[20,0,255,0],[30,5,0,255]],
+                        [[10,0,255,128],[40,5,0,255],[10,0,255,7]]],dtype=numpy.uint8)
+
+
+def table(array):
+    """
+    Returns the pixels of array as a 2d table of RGB objects.
+
+    Parameter array: The pixels
+    Precondition: array is a numpy array of uint8 with shape height x width x 4
+    """
+    return [[introcs.RGB(*pixel) for pixel in row] for row in array.tolist()]
+
+
+def shown(output):
+    """
+    Returns the red values printed by display, as a list of rows.
+
+    Parameter output: The printed text
+    Precondition: output is a string printed by display
+    """
+    rows = [line for line in output.split('\n') if line.startswith("['R")]
+    return [[int(label.strip(" R'")) for label in row[1:-1].split(',')] for row in rows]
+
+
+def test_measure():
+    """
+    Tests measure on a small image, worked out by hand.
+    """
+    result = imagestats.measure(small())
+    assert (result['width'], result['height']) == (3,2)
+    assert result['min'] == [10,0,0,0]
+    assert result['max'] == [40,5,255,255]
+    assert result['mean'] == [120/6,10/6,1020/6,(255*3+128+7)/6]
+    assert result['colors'] == 4
+    assert result['alphas'] == 4
+
+    expected = numpy.zeros((4,256),dtype=numpy.int64)
+    for pixel in small().reshape(-1,4):
+        for channel in range(4):
+            expected[channel,pixel[channel]] += 1
+    assert (result['histogram'] == expected).all()
+    assert result['histogram'][0,10] == 3 and result['histogram'][3,255] == 3
+
+
+@pytest.mark.parametrize('band',[1, 7, 1 << 20])
+def test_measure_bands(band, monkeypatch):
+    """
+    Tests that measure gives the same values whatever the size of its bands.
+    """
+    monkeypatch.setattr(imagestats,'BAND_PIXELS',band)
+    array = numpy.random.default_rng(6).integers(0,4,(23,17,4),dtype=numpy.uint8)*85
+    result = imagestats.measure(array)
+    pixels = array.reshape(-1,4)
+    assert result['colors'] == len(numpy.unique(pixels[:,:3],axis=0))
+    assert result['alphas'] == len(numpy.unique(pixels[:,3]))
+    assert result['min'] == pixels.min(axis=0).tolist()
+    assert result['max'] == pixels.max(axis=0).tolist()
+    assert numpy.allclose(result['mean'],pixels.mean(axis=0))
+    for channel in range(4):
+        counts = numpy.bincount(pixels[:,channel],minlength=256)
+        assert (result['histogram'][channel] == counts).all()
+
+
+@pytest.mark.parametrize('kind',['compact','table'])
+def test_stats(kind, capsys):
+    """
+    Tests that stats prints the statistics, and does not change the image.
+    """
+    image = pixelbuffer.PixelBuffer(small()) if kind == 'compact' else table(small())
+    assert plugins.stats(image,4) == False
+    output = capsys.readouterr().out
+    assert 'Size: 3 x 2 (6 pixels)' in output
+    assert 'RGB colors: 4 different' in output
+    assert 'Alpha values: 4 different' in output
+    assert 'red       10    40    20.00' in output
+    assert 'alpha      0   255   150.00' in output
+    # Values 0-63, 64-127, 128-191 and 192-255
+    assert 'alpha   33.3   0.0  16.7  50.0' in output
+    if kind == 'table':
+        image = pixelbuffer.PixelBuffer(numpy.array([[pixel.rgba() for pixel in row]
+                                                     for row in image],dtype=numpy.uint8))
+    assert (image.array == small()).all()
+
+    with pytest.raises(AssertionError):
+        plugins.stats(image,3)
+
+
+@pytest.mark.parametrize('region,cells,rows,cols,note',
+                         [(None,1024,(0,10),(0,12),False),
+                          (None,24,(0,2),(0,12),True),
+                          (None,25,(0,2),(0,12),True),
+                          (None,5,(0,1),(0,5),True),
+                          ('2:5,3:9',1024,(2,5),(3,9),False),
+                          ('2:5,3:9',18,(2,5),(3,9),False),
+                          ('2:5,3:9',17,(2,4),(3,9),True),
+                          ('2:5,3:9',4,(2,3),(3,7),True),
+                          ('-2:,:-9',1024,(8,10),(0,3),False),
+                          (':,11:',1024,(0,10),(11,12),False),
+                          ('5:100,-100:2',1024,(5,10),(0,2),False),
+                          (' 1 : 3 , 4 : 6 ',1024,(1,3),(4,6),False)])
+def test_display(region, cells, rows, cols, note, capsys):
+    """
+    Tests the rows and columns that display prints for a region and --max-cells.
+    """
+    array = numpy.zeros((10,12,4),dtype=numpy.uint8)
+    array[:,:,0] = numpy.arange(120).reshape(10,12)
+    for image in (pixelbuffer.PixelBuffer(array.copy()),table(array)):
+        assert plugins.display(image,region,cells) == False
+        output = capsys.readouterr().out
+        assert shown(output) == array[rows[0]:rows[1],cols[0]:cols[1],0].tolist()
+        assert ('see --max-cells' in output) == note
+
+
+@pytest.mark.parametrize('region',['2:5', '1:2,3', '1:2:1,0:1', 'a:b,0:1', '5:5,0:1', '0:1,12:',
+                                   '-1:-2,:', 3])
+def test_display_errors(region):
+    """
+    Tests that display rejects a region that is not valid or has no pixels.
+    """
+    image = pixelbuffer.PixelBuffer(numpy.zeros((10,12,4),dtype=numpy.uint8))
+    with pytest.raises(AssertionError):
+        plugins.display(image,region)
@@ -0,0 +1,81 @@
+"""
+Tests for the numpy versions of the point-wise plugins.
+
+The module vectorized computes mono, dered and vignette for a whole PixelBuffer at
+once.  These tests check that they give exactly the same pixels as the functions in
+plugins on a table of RGB objects, on the bundled images: the same truncation of every
+float to an int, and the alpha channel left alone.
+
+Author: Michael Dickey
+Date: Oct 18 2026
+"""
+import glob
+import os
+
+import introcs
+import numpy
+import pytest
+from PIL import Image as CoreImage
+
+import pixelbuffer
+import plugins
+import vectorized
+
+
+# The bundled images, leaving out the results of other plugins (like Walker-flipH)
+IMAGES = sorted([file for file in glob.glob(os.path.join(os.path.dirname(plugins.__file__),'images','*.png'))
+                 if not '-' in os.path.basename(file)])
+
+# The stages to compare, by name
+STAGES = {'mono':('mono',{}), 'sepia':('mono',{'sepia':True}), 'dered':('dered',{}),
+          'vignette':('vignette',{})}
+
+
+def source(file):
+    """
+    Returns the pixels of file as RGBA, with an alpha channel that varies.
+
+    Parameter file: The image file to read
+    Precondition: file is a string naming an image file
+    """
+    with CoreImage.open(file) as image:
+        array = numpy.array(image.convert('RGBA'))
+    rows, cols = numpy.indices(array.shape[:2])
+    array[:,:,3] = (rows*7+cols*3) % 256
+    return array
+
+
+def run_table(array, name, options):
+    """
+    Returns the pixels after running the plugin name on a table of RGB objects.
+
+    Parameter array: The pixels to process
+    Precondition: array is a numpy array of uint8 with shape rows x cols x 4
+
+    Parameter name: The plugin name
+    Precondition: name is the name of a function in plugins
+
+    Parameter options: The plugin options
+    Precondition: options is a dictionary
+    """
+    table = [[introcs.RGB(*pixel) for pixel in row] for row in array.tolist()]
+    getattr(plugins,name)(table,**options)
+    return numpy.array([[[pixel.red,pixel.green,pixel.blue,pixel.alpha] for pixel in row]
+                        for row in table],dtype=numpy.uint8)
+
+
+@pytest.mark.parametrize('stage',sorted(STAGES))
+@pytest.mark.parametrize('file',IMAGES,ids=os.path.basename)
+def test_plugins(file, stage):
+    """
+    Tests that vectorized and plugins give the same pixels, and leave alpha alone.
+    """
+    name, options = STAGES[stage]
+    array = source(file)
+    expected = run_table(array,name,options)
+    assert (expected[:,:,3] == array[:,:,3]).all()
+
+    for engine in (vectorized,plugins):
+        buffer = pixelbuffer.PixelBuffer(array.copy())
+        getattr(engine,name)(buffer,**options)
+        assert (buffer.array == expected).all(), engine.__name__
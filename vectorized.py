@@ -0,0 +1,322 @@
+"""
+Vectorized plugin utilities for the pictool.
+
+This module contains numpy versions of some of the commands in plugins.py.  They are
+used instead of the plugins when pictool is run with the option --engine=numpy.  Each
+function has the same name, parameters and results as the plugin it replaces, but
+instead of looping over the pixels in Python, it processes the whole image array in
+a handful of numpy operations.
+
+These functions only work on a PixelBuffer (see the module pixelbuffer), because they
+need the pixels in a single array.  Their results are identical to the plugins: color
+values are truncated with int() and the alpha channel is left untouched.
+
+Author: Michael Dickey
+Date: Oct 18 2026
+"""
+import collections
+import lut
+import numpy
+import os
+import pixelbuffer
+
+
+# The brightness weights for red, green and blue
+BRIGHTNESS = (0.3, 0.6, 0.1)
+
+# The sepia weights (relative to brightness) for red, green and blue
+SEPIA = lut.SEPIA_SCALES
+
+# The functions that only look at one pixel at a time.  They give the same results on
+# any block of rows as on the whole image, so they may be fused (see fusion.py).
+POINTWISE = ('dered','mono','vignette')
+
+# The largest total size of the vignette masks kept in memory, in bytes
+MASK_BYTES = 1 << 28
+
+# The vignette masks kept in memory by (height, width), least recently used first
+_masks = collections.OrderedDict()
+
+# The folder for vignette masks when they are saved to disk (see set_mask_folder)
+MASK_DIR = os.path.join(os.path.expanduser('~'),'.cache','pictool','masks')
+
+# The folder where vignette masks are saved (None to keep them in memory only)
+_mask_folder = None
+
+
+def dered(image):
+    """
+    Returns True after removing all red values from the given image.
+
+    Parameter image: The image buffer
+    Precondition: image is a PixelBuffer
+    """
+    return lut.apply(image,(lut.constant(0),None,None))
+
+
+def mono(image, sepia=False):
+    """
+    Returns True after converting the image to monochrome.
+
+    This is a vectorized version of plugins.mono.  The brightness is computed for all
+    pixels at once as a weighted sum of the color channels, and then scaled for each
+    channel if sepia is True.  The brightness curves of lut (see lut.apply_brightness)
+    give the same result, but on a whole array numpy multiplies faster than it indexes:
+    computing the brightness index alone takes about half as long as the products, and
+    the lookups then make it slower overall.
+
+    Parameter image: The image buffer
+    Precondition: image is a PixelBuffer
+
+    Parameter sepia: Whether to use sepia tone instead of greyscale
+    Precondition: sepia is a bool
+    """
+    assert sepia == True or sepia == False, "Sepia must be 'True' or 'False'"
+
+    array = image.array
+
+    # Same order of operations as the plugin, so the floats are identical
+    brightness = (BRIGHTNESS[0]*array[:,:,0] + BRIGHTNESS[1]*array[:,:,1]
+                  + BRIGHTNESS[2]*array[:,:,2])
+    if sepia:
+        array[:,:,0] = brightness
+        array[:,:,1] = SEPIA[1]*brightness
+        array[:,:,2] = SEPIA[2]*brightness
+    else:
+        array[:,:,:3] = brightness[:,:,numpy.newaxis]
+
+    return True
+
+
+def vignette_mask(height, width, top=0, rows=None):
+    """
+    Returns the vignette factor of every pixel in an image of the given size.
+
+    The result is a rows x width array of floats for the rows top to top+rows-1 of the
+    image (by default, all of them).  The factor for the pixel at row r and column c 
+    is 1 - (d / H)^2, where d is the distance from the pixel to the center of the 
+    image and H is the distance from the center to a corner.
+
+    Parameter height: The image height
+    Precondition: height is an int > 0
+
+    Parameter width: The image width
+    Precondition: width is an int > 0
+
+    Parameter top: The first row of the mask
+    Precondition: top is an int in 0..height-1
+
+    Parameter rows: The number of rows in the mask (None for the rest of the image)
+    Precondition: rows is None or an int in 1..height-top
+    """
+    if rows is None:
+        rows = height-top
+
+    center_h = height/2
+    center_w = width/2
+    corner = numpy.sqrt(center_h*center_h + center_w*center_w)
+
+    # Distances are separable, so compute one column and one row and broadcast
+    down = center_h - numpy.arange(top,top+rows,dtype=numpy.float64)
+    across = center_w - numpy.arange(width,dtype=numpy.float64)
+    ratio = numpy.sqrt((down*down)[:,numpy.newaxis] + (across*across)[numpy.newaxis,:])/corner
+    return 1 - ratio*ratio
+
+
+def set_mask_folder(folder):
+    """
+    Sets the folder where vignette masks are saved (or stops saving them if None).
+
+    Saved masks are loaded by later runs instead of being computed (see mask_rows).
+
+    Parameter folder: The folder for the masks
+    Precondition: folder is a string or None
+    """
+    global _mask_folder
+    _mask_folder = folder
+
+
+def _load_mask(height, width):
+    """
+    Returns the vignette mask for an image of the given size from the mask folder.
+
+    The mask is computed and saved if it is not in the folder yet.  The result is
+    memory-mapped and read-only.
+
+    Parameter height: The image height
+    Precondition: height is an int > 0
+
+    Parameter width: The image width
+    Precondition: width is an int > 0
+    """
+    path = os.path.join(_mask_folder,'vignette-%dx%d.npy' % (height,width))
+    try:
+        return numpy.load(path,mmap_mode='r')
+    except (OSError, ValueError):
+        pass
+
+    mask = vignette_mask(height,width)
+    try:
+        os.makedirs(_mask_folder,exist_ok=True)
+        temp = path+'.%d.tmp' % os.getpid()
+        with open(temp,'wb') as stream:
+            numpy.save(stream,mask)
+        os.replace(temp,path)
+    except OSError:
+        pass
+    return mask
+
+
+def mask_rows(height, width, top=0, rows=None):
+    """
+    Returns the vignette factors for some rows of an image of the given size.
+
+    This gives the same result as vignette_mask, but the mask for the whole image is 
+    only computed once for each size.  Up to MASK_BYTES of masks are kept in memory,
+    and the least recently used masks are forgotten first.  If a mask folder has been 
+    set (see set_mask_folder), masks are also saved to disk for later runs.  A mask 
+    too large to keep is computed for just the given rows each time.
+
+    The result is read-only.
+
+    Parameter height: The image height
+    Precondition: height is an int > 0
+
+    Parameter width: The image width
+    Precondition: width is an int > 0
+
+    Parameter top: The first row of the mask
+    Precondition: top is an int in 0..height-1
+
+    Parameter rows: The number of rows in the mask (None for the rest of the image)
+    Precondition: rows is None or an int in 1..height-top
+    """
+    if rows is None:
+        rows = height-top
+
+    key = (height,width)
+    if key in _masks:
+        _masks.move_to_end(key)
+        return _masks[key][top:top+rows]
+
+    if height*width*8 > MASK_BYTES:
+        if _mask_folder is None:
+            return vignette_mask(height,width,top,rows)
+        return _load_mask(height,width)[top:top+rows]
+
+    mask = vignette_mask(height,width) if _mask_folder is None else _load_mask(height,width)
+    mask = numpy.asarray(mask)
+    mask.flags.writeable = False
+    _masks[key] = mask
+
+    total = sum([item.nbytes for item in _masks.values()])
+    while total > MASK_BYTES:
+        oldest = _masks.popitem(last=False)[1]
+        total -= oldest.nbytes
+    return mask[top:top+rows]
+
+
+def vignette(image):
+    """
+    Returns True after vignetting (corner darkening) the current image.
+
+    This is a vectorized version of plugins.vignette.  It multiplies the color
+    channels by the vignette factor of every pixel, which only depends on the size
+    of the image (see mask_rows).  The alpha value is left untouched.
+
+    Parameter image: The image buffer
+    Precondition: image is a PixelBuffer
+    """
+    array = image.array
+    top, height = pixelbuffer.extent(image)
+    mask  = mask_rows(height,array.shape[1],top,array.shape[0])
+    array[:,:,:3] = array[:,:,:3]*mask[:,:,numpy.newaxis]
+    return True
+
+
+def blur(image, radius=1):
+    """
+    Returns True after bluring the image.
+
+    This is a vectorized version of plugins.blur.  It builds the summed-area table of
+    the image with two cumulative sums, and then computes the total of every box from
+    the four corners of the table at once.  Boxes are clamped to the image edges, and
+    all four channels (including alpha) are averaged, exactly as in the plugin.
+
+    Parameter image: The image to blur
+    Precondition: image is a PixelBuffer
+
+    Parameter radius: The blur radius
+    Precondition: radius is an int > 0
+    """
+    assert type(radius) == int and radius > 0, "Radius must be an int > 0"
+
+    array  = image.array
+    height = array.shape[0]
+    width  = array.shape[1]
+
+    # The table has an extra row and column of zeros at the top and left
+    table = numpy.zeros((height+1,width+1,4),dtype=numpy.int64)
+    numpy.cumsum(array,axis=0,dtype=numpy.int64,out=table[1:,1:])
+    numpy.cumsum(table[1:,1:],axis=1,out=table[1:,1:])
+
+    # The clamped box edges for every row and column
+    rows   = numpy.arange(height)
+    top    = numpy.maximum(rows-radius,0)
+    bottom = numpy.minimum(rows+radius+1,height)
+    cols   = numpy.arange(width)
+    left   = numpy.maximum(cols-radius,0)
+    right  = numpy.minimum(cols+radius+1,width)
+
+    total  = table[bottom][:,right]-table[top][:,right]-table[bottom][:,left]+table[top][:,left]
+    count  = (bottom-top)[:,numpy.newaxis]*(right-left)[numpy.newaxis,:]
+    array[:,:,:] = total//count[:,:,numpy.newaxis]
+    return True
+
+
+def pixellate(image, step=10, step_x=None, step_y=None):
+    """
+    Returns True after pixellating the image.
+
+    This is a vectorized version of plugins.pixellate.  The block totals are computed
+    with two calls to numpy.add.reduceat, which sums the slices of an array starting
+    at the given positions.  The last slice runs to the edge of the image, so blocks
+    clipped by the edges need no extra work.  The truncated averages are then copied
+    back over each block with numpy.repeat.  As in the plugin, the blocks are lined up
+    with the top of the full image when the image is a band of it.
+
+    Parameter image: The image to pixelate
+    Precondition: image is a PixelBuffer
+
+    Parameter step: The number of pixels in a pixellated block
+    Precondition: step is an int > 0
+
+    Parameter step_x: The block width (or None to use step)
+    Precondition: step_x is None or an int > 0
+
+    Parameter step_y: The block height (or None to use step)
+    Precondition: step_y is None or an int > 0
+    """
+    assert type(step) == int and step > 0, "Step must be an int > 0"
+    step_x = step if step_x is None else step_x
+    step_y = step if step_y is None else step_y
+    assert type(step_x) == int and step_x > 0, "Step_x must be an int > 0"
+    assert type(step_y) == int and step_y > 0, "Step_y must be an int > 0"
+
+    array  = image.array
+    height = array.shape[0]
+    width  = array.shape[1]
+
+    # The first row and column of each block, and the (clipped) block sizes
+    first  = pixelbuffer.extent(image)[0]
+    tops   = numpy.maximum(numpy.arange(-(first % step_y),height,step_y),0)
+    lefts  = numpy.arange(0,width,step_x)
+    tall   = numpy.diff(numpy.append(tops,height))
+    wide   = numpy.diff(numpy.append(lefts,width))
+
+    totals = numpy.add.reduceat(array,tops,axis=0,dtype=numpy.int64)
+    totals = numpy.add.reduceat(totals,lefts,axis=1)
+    counts = tall[:,numpy.newaxis]*wide[numpy.newaxis,:]
+    blocks = (totals//counts[:,:,numpy.newaxis]).astype(numpy.uint8)
+    array[:,:,:] = numpy.repeat(numpy.repeat(blocks,tall,axis=0),wide,axis=1)
+    return True